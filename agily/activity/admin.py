@@ -0,0 +1,17 @@
+from django.contrib import admin
+
+from agily.activity.models import ChangeEvent
+
+
+@admin.register(ChangeEvent)
+class ChangeEventAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "workspace", "object_repr", "action", "user")
+    list_filter = ("action", "content_type")
+    list_select_related = ("workspace", "user")
+    readonly_fields = [field.name for field in ChangeEvent._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class ActivityConfig(AppConfig):
+    name = "agily.activity"
+    verbose_name = "Activity"
+
+    def ready(self):
+        from agily.activity import tracking
+
+        tracking.connect()
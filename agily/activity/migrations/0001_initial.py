@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:20
+
+import django.core.serializers.json
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('workspaces', '0007_workspace_deleted_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('object_repr', models.CharField(max_length=255)),
+                ('action', models.CharField(choices=[('created', 'created'), ('changed', 'changed'), ('deleted', 'deleted'), ('restored', 'restored')], max_length=16)),
+                ('changes', models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('workspace', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='change_events', to='workspaces.workspace')),
+            ],
+            options={
+                'verbose_name': 'change event',
+                'verbose_name_plural': 'change events',
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['workspace', 'created_at', 'id'], name='activity_ch_workspa_f2480a_idx'), models.Index(fields=['content_type', 'object_id', 'created_at', 'id'], name='activity_ch_content_ce8073_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,107 @@
+import base64
+import binascii
+
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+PAGE_SIZE = 50
+
+
+def encode_cursor(event):
+    value = f"{event.created_at.isoformat()},{event.pk}"
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """(created_at, pk) of the last event of the previous page, or None for a missing/garbled cursor."""
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit(",", 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (AttributeError, ValueError, UnicodeDecodeError, binascii.Error):
+        return None
+
+
+class ChangeEventQuerySet(models.QuerySet):
+    def for_object(self, obj):
+        return self.filter(content_type=ContentType.objects.get_for_model(obj), object_id=obj.pk)
+
+    def page(self, cursor=None, size=PAGE_SIZE):
+        """One page of events, newest first, and the cursor of the next page (None on the last one).
+
+        Pages are cut on (created_at, id) instead of OFFSET, so every page is the same range scan over the
+        (workspace, created_at, id) or (content_type, object_id, created_at, id) index.
+        """
+        queryset = self.order_by("-created_at", "-id")
+        position = decode_cursor(cursor) if cursor else None
+
+        if position is not None:
+            created_at, pk = position
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+        events = list(queryset[: size + 1])
+        next_cursor = encode_cursor(events[size - 1]) if len(events) > size else None
+
+        return events[:size], next_cursor
+
+
+class ChangeEvent(models.Model):
+    """One create, change or removal of a story, epic or sprint.
+
+    Rows are only ever inserted, at save time, with the changed fields and their old and new values, so the
+    activity of a workspace or an object is a single indexed range query instead of a diff of history rows.
+    """
+
+    ACTION_CREATED = "created"
+    ACTION_CHANGED = "changed"
+    ACTION_DELETED = "deleted"
+    ACTION_RESTORED = "restored"
+
+    ACTION_CHOICES = (
+        (ACTION_CREATED, "created"),
+        (ACTION_CHANGED, "changed"),
+        (ACTION_DELETED, "deleted"),
+        (ACTION_RESTORED, "restored"),
+    )
+
+    workspace = models.ForeignKey("workspaces.Workspace", on_delete=models.CASCADE, related_name="change_events")
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name="+")
+    object_id = models.PositiveIntegerField()
+    object_repr = models.CharField(max_length=255)
+
+    action = models.CharField(max_length=16, choices=ACTION_CHOICES)
+    # field name -> [old value, new value]
+    changes = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name="+"
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    objects = ChangeEventQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            models.Index(fields=["workspace", "created_at", "id"]),
+            models.Index(fields=["content_type", "object_id", "created_at", "id"]),
+        ]
+        verbose_name = "change event"
+        verbose_name_plural = "change events"
+
+    def __str__(self):
+        return f"{self.object_repr} {self.action}"
+
+    @property
+    def fields(self):
+        return list(self.changes)
+
+    @property
+    def object_type(self):
+        return ContentType.objects.get_for_id(self.content_type_id).name
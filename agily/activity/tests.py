@@ -0,0 +1,55 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from agily.activity.models import ChangeEvent
+from agily.stories.factories import StoryFactory
+from agily.stories.models import Story
+from agily.stories.tasks import remove_stories
+from agily.users.tests.factories import UserFactory
+from agily.workspaces.factories import WorkspaceFactory
+
+
+class ChangeEventTest(TestCase):
+    def setUp(self):
+        self.workspace = WorkspaceFactory.create()
+        self.story = StoryFactory.create(workspace=self.workspace, title="First", points=1)
+
+    def test_save_records_changed_fields(self):
+        story = Story.objects.get(pk=self.story.pk)
+        story.title = "Second"
+        story.save()
+        story.save()
+
+        events = ChangeEvent.objects.for_object(story)
+        self.assertEqual([event.action for event in events], [ChangeEvent.ACTION_CHANGED, ChangeEvent.ACTION_CREATED])
+        self.assertEqual(events[0].changes, {"title": ["First", "Second"]})
+
+    def test_soft_delete_is_recorded(self):
+        remove_stories([self.story.pk])
+
+        self.assertEqual(ChangeEvent.objects.for_object(self.story).first().action, ChangeEvent.ACTION_DELETED)
+
+    def test_cursor_pagination(self):
+        for points in range(2, 7):
+            self.story.points = points
+            self.story.save()
+
+        events = ChangeEvent.objects.filter(workspace=self.workspace)
+        first, cursor = events.page(size=4)
+        second, last = events.page(cursor, size=4)
+
+        self.assertEqual(len(first), 4)
+        self.assertEqual(len(second), 2)
+        self.assertIsNone(last)
+        self.assertEqual([e.pk for e in first + second], list(events.values_list("pk", flat=True)))
+
+    def test_story_timeline(self):
+        user = UserFactory.create()
+        self.workspace.members.add(user)
+        self.client.force_login(user)
+
+        response = self.client.get(reverse("stories:story-detail", args=[self.workspace.slug, self.story.pk]))
+        self.assertContains(response, "Timeline")
+
+        response = self.client.get(reverse("activity:workspace-activity", args=[self.workspace.slug]))
+        self.assertContains(response, "First")
@@ -0,0 +1,132 @@
+"""
+Writes a ``ChangeEvent`` for every save, removal and bulk insert of the tracked models.
+
+Tracked models inherit ``TrackedModel``, which keeps the field values an instance was loaded with so the
+post_save handler can tell what changed without reading the row (or its history) again.
+"""
+
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import DEFERRED, signals as model_signals
+
+from simple_history.models import HistoricalRecords
+
+from agily import signals
+from agily.activity.models import ChangeEvent
+from agily.history import ROLLUP_FIELDS
+
+TRACKED_MODELS = ("stories.Epic", "stories.Story", "sprints.Sprint")
+
+# rollup counters churn on every story change and tombstones get their own deleted/restored events
+IGNORED_FIELDS = ROLLUP_FIELDS | {"deleted_at"}
+
+MAX_VALUE_LENGTH = 255
+
+
+class TrackedModel:
+    """Mixin remembering the values an instance was loaded with."""
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def remember_values(self):
+        self._loaded_values = {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields}
+
+
+def _value(value):
+    if isinstance(value, str) and len(value) > MAX_VALUE_LENGTH:
+        return value[: MAX_VALUE_LENGTH - 1] + "…"
+    return value
+
+
+def changed_fields(instance):
+    """{field name: [old, new]} of the fields changed since the instance was loaded."""
+    loaded = getattr(instance, "_loaded_values", None)
+
+    if loaded is None:
+        return {}
+
+    changes = {}
+
+    for field in instance._meta.concrete_fields:
+        old = loaded.get(field.attname, DEFERRED)
+
+        if field.attname in IGNORED_FIELDS or old is DEFERRED:
+            continue
+
+        new = getattr(instance, field.attname)
+        if old != new:
+            changes[field.name] = [_value(old), _value(new)]
+
+    return changes
+
+
+def current_user():
+    # the request simple_history's HistoryRequestMiddleware keeps around for its own history_user
+    request = getattr(HistoricalRecords.context, "request", None)
+    user = getattr(request, "user", None)
+
+    return user if user is not None and user.is_authenticated else None
+
+
+def build_event(instance, action, changes=None, user=None):
+    return ChangeEvent(
+        workspace_id=instance.workspace_id,
+        content_type=ContentType.objects.get_for_model(instance),
+        object_id=instance.pk,
+        object_repr=str(instance)[:255],
+        action=action,
+        changes=changes or {},
+        user=user,
+    )
+
+
+def record_bulk(instances, action):
+    user = current_user()
+    events = [build_event(instance, action, user=user) for instance in instances]
+    ChangeEvent.objects.bulk_create(events, batch_size=500)
+
+
+def handle_post_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    if created:
+        build_event(instance, ChangeEvent.ACTION_CREATED, user=current_user()).save()
+    else:
+        changes = changed_fields(instance)
+        if changes:
+            build_event(instance, ChangeEvent.ACTION_CHANGED, changes, user=current_user()).save()
+
+    instance.remember_values()
+
+
+def handle_post_delete(sender, instance, **kwargs):
+    build_event(instance, ChangeEvent.ACTION_DELETED, user=current_user()).save()
+
+
+def handle_post_bulk_create(sender, instances, **kwargs):
+    record_bulk(instances, ChangeEvent.ACTION_CREATED)
+
+
+def handle_post_soft_delete(sender, pks, **kwargs):
+    record_bulk(sender._base_manager.filter(pk__in=pks), ChangeEvent.ACTION_DELETED)
+
+
+def handle_post_restore(sender, pks, **kwargs):
+    record_bulk(sender._base_manager.filter(pk__in=pks), ChangeEvent.ACTION_RESTORED)
+
+
+def connect():
+    for label in TRACKED_MODELS:
+        model = apps.get_model(label)
+        uid = f"activity-{label}"
+
+        model_signals.post_save.connect(handle_post_save, sender=model, dispatch_uid=uid)
+        model_signals.post_delete.connect(handle_post_delete, sender=model, dispatch_uid=uid)
+        signals.post_bulk_create.connect(handle_post_bulk_create, sender=model, dispatch_uid=uid)
+        signals.post_soft_delete.connect(handle_post_soft_delete, sender=model, dispatch_uid=uid)
+        signals.post_restore.connect(handle_post_restore, sender=model, dispatch_uid=uid)
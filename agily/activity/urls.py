@@ -0,0 +1,10 @@
+from django.urls import path
+
+from .views import story_activity, workspace_activity
+
+app_name = "activity"
+
+urlpatterns = [
+    path("stories/<int:pk>/", story_activity, name="story-activity"),
+    path("", workspace_activity, name="workspace-activity"),
+]
@@ -0,0 +1,27 @@
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import get_object_or_404, render
+
+from agily.activity.models import ChangeEvent
+from agily.stories.models import Story
+
+
+def _render_page(request, events, title, **context):
+    events, next_cursor = events.select_related("user").page(request.GET.get("before"))
+    context.update(events=events, next_cursor=next_cursor, title=title, current_workspace=request.workspace.slug)
+
+    # the "older" button only asks for the next rows; boosted navigation still wants the whole page
+    partial = request.headers.get("HX-Request") and not request.headers.get("HX-Boosted")
+    template = "activity/_events.html" if partial else "activity/feed.html"
+
+    return render(request, template, context)
+
+
+@login_required
+def workspace_activity(request, workspace):
+    return _render_page(request, ChangeEvent.objects.filter(workspace=request.workspace), "Activity")
+
+
+@login_required
+def story_activity(request, workspace, pk):
+    story = get_object_or_404(Story.all_objects, pk=pk, workspace=request.workspace)
+    return _render_page(request, ChangeEvent.objects.for_object(story), f"Activity of {story}", object=story)
@@ -0,0 +1,16 @@
+from django.contrib import admin
+
+from agily.attachments.models import Blob, Upload
+
+
+@admin.register(Blob)
+class BlobAdmin(admin.ModelAdmin):
+    list_display = ("sha256", "size", "refcount", "created_at", "updated_at")
+    search_fields = ("sha256",)
+    readonly_fields = ("sha256", "size", "refcount", "created_at", "updated_at")
+
+
+@admin.register(Upload)
+class UploadAdmin(admin.ModelAdmin):
+    list_display = ("filename", "user", "offset", "length", "blob", "updated_at")
+    raw_id_fields = ("user", "blob")
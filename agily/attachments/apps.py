@@ -0,0 +1,22 @@
+from django.apps import AppConfig, apps
+from django.db.models.signals import post_delete, post_save
+
+ATTACHMENT_MODELS = ("stories.StoryAttachment", "agily.IssueAttachment")
+
+
+class AttachmentsConfig(AppConfig):
+    name = "agily.attachments"
+    verbose_name = "Attachments"
+
+    def ready(self):
+        from agily.attachments.models import handle_attachment_post_bulk_create, handle_attachment_post_delete
+        from agily.attachments.previews import handle_attachment_post_save
+        from agily.signals import post_bulk_create
+
+        for label in ATTACHMENT_MODELS:
+            model = apps.get_model(label)
+            uid = f"blob-{label}"
+
+            post_save.connect(handle_attachment_post_save, sender=model, dispatch_uid=uid)
+            post_delete.connect(handle_attachment_post_delete, sender=model, dispatch_uid=uid)
+            post_bulk_create.connect(handle_attachment_post_bulk_create, sender=model, dispatch_uid=uid)
@@ -0,0 +1,115 @@
+"""
+ZIP archives of the attachments of a story or an issue, built while they are sent.
+
+The archive is written by ``zipfile`` into a buffer that the response drains after every chunk, so memory stays
+at one chunk whatever the size of the files, nothing is written to disk and the first bytes go out before the
+last file is read. Files are stored uncompressed: attachments are mostly images and PDFs that deflate would
+only spend CPU on.
+"""
+
+import os
+import zipfile
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from agily import signals
+from agily.attachments.downloads import CHUNK_SIZE, content_disposition
+
+# the earliest timestamp a ZIP entry can hold
+ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+
+
+class _Buffer:
+    """Write-only file object keeping what zipfile wrote until it is drained."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _unique_name(name, taken):
+    stem, ext = os.path.splitext(name)
+    candidate, n = name, 1
+
+    while candidate in taken:
+        n += 1
+        candidate = f"{stem} ({n}){ext}"
+
+    taken.add(candidate)
+    return candidate
+
+
+def archive_entries(attachments, dedupe=False):
+    """(entry name, attachment) of every file to put in the archive.
+
+    With dedupe, content stored under several attachments goes in once, under the first one's name.
+    """
+    taken = set()
+    seen = set()
+
+    for attachment in attachments:
+        if dedupe and attachment.checksum:
+            if attachment.checksum in seen:
+                continue
+            seen.add(attachment.checksum)
+
+        yield _unique_name(attachment.filename() or f"attachment-{attachment.pk}", taken), attachment
+
+
+def stream_zip(attachments, dedupe=False, chunk_size=CHUNK_SIZE):
+    buffer = _Buffer()
+
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for name, attachment in archive_entries(attachments, dedupe):
+            uploaded_at = timezone.localtime(attachment.uploaded_at).timetuple()[:6]
+
+            info = zipfile.ZipInfo(name, date_time=max(uploaded_at, ZIP_EPOCH))
+            # lets zipfile pick zip64 up front for files over 4GB
+            info.file_size = attachment.size if attachment.size is not None else attachment.file.size
+
+            try:
+                source = attachment.file.open("rb")
+            except FileNotFoundError:
+                continue
+
+            with source, archive.open(info, "w") as entry:
+                while chunk := source.read(chunk_size):
+                    entry.write(chunk)
+                    yield buffer.drain()
+
+            yield buffer.drain()
+
+    # the central directory
+    yield buffer.drain()
+
+
+def _counted(chunks):
+    sent = 0
+
+    try:
+        for chunk in chunks:
+            sent += len(chunk)
+            yield chunk
+    finally:
+        # also when the client went away halfway
+        signals.attachment_served.send(sender="archive", size=sent)
+
+
+def serve_zip(attachments, filename, dedupe=False):
+    response = StreamingHttpResponse(_counted(stream_zip(attachments, dedupe)), content_type="application/zip")
+    response["Content-Disposition"] = content_disposition(True, filename)
+    response["Cache-Control"] = "private, no-cache"
+
+    return response
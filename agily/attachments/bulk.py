@@ -0,0 +1,88 @@
+"""
+Stores the files of a multi-file form submission at once.
+
+Hashing and writing the files is spread over a small thread pool, so a submission takes about as long as its
+largest file; the database work stays on the request's thread and connection (and inside its transaction), and
+all attachment rows go in with one ``bulk_create``.
+"""
+
+import os
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from agily.attachments.models import Blob, blob_name, hash_file
+from agily.attachments.previews import schedule_previews
+
+_executor = None
+
+
+def executor():
+    global _executor
+
+    if _executor is None:
+        # shared by all requests, so the number of writing threads stays bounded per process
+        _executor = ThreadPoolExecutor(settings.ATTACHMENT_WRITE_WORKERS, thread_name_prefix="attachments")
+
+    return _executor
+
+
+def write_file(f):
+    """Hash f and write it where its blob keeps it, unless it is there already; returns (sha256, size)."""
+    sha256, size = hash_file(f)
+    name = blob_name(sha256)
+
+    if not default_storage.exists(name):
+        saved = default_storage.save(name, f)
+
+        if saved != name:
+            # another request or thread wrote the same content meanwhile
+            default_storage.delete(saved)
+
+    f.seek(0)
+
+    return sha256, size
+
+
+@transaction.atomic
+def create_attachments(model, files, **fields):
+    """Store files as attachment rows of model with the given field values and return the rows."""
+    files = list(files)
+
+    if not files:
+        return []
+
+    if len(files) == 1:
+        hashes = [write_file(files[0])]
+    else:
+        hashes = list(executor().map(write_file, files))
+
+    blobs = {}
+    extra = Counter()
+
+    for f, (sha256, size) in zip(files, hashes):
+        if sha256 in blobs:
+            extra[blobs[sha256].pk] += 1
+        else:
+            # finds the file written, only writes it again when collect_blobs got to it in between
+            blobs[sha256] = Blob.objects.store(f, sha256=sha256, size=size)
+
+    # the same content submitted more than once
+    Blob.objects.acquire(extra)
+
+    attachments = []
+
+    for f, (sha256, _) in zip(files, hashes):
+        blob = blobs[sha256]
+        attachment = model(blob=blob, file=blob.name, name=os.path.basename(f.name), **fields)
+        attachment.set_metadata(blob)
+        attachments.append(attachment)
+
+    model.objects.bulk_create(attachments)
+    schedule_previews(attachments)
+
+    return attachments
@@ -0,0 +1,186 @@
+"""
+Attachment downloads with validators, byte ranges and optional proxy offload.
+
+``serve`` answers conditional requests (``If-None-Match``, ``If-Modified-Since``...) with a 304 before the file
+is touched, honours single ``Range`` requests (guarded by ``If-Range``) with a 206 streaming only the requested
+bytes, and with ``ATTACHMENT_SENDFILE`` set hands the transfer to the front proxy through ``X-Accel-Redirect``
+(nginx) or ``X-Sendfile`` (apache/lighttpd), so no worker streams the body at all.
+"""
+
+import hashlib
+import mimetypes
+import re
+
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from agily import signals
+
+CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def make_etag(name, size):
+    # stored files are never rewritten in place: a new upload always gets a new name, so name and size pin the
+    # bytes down and the tag can be strong
+    return quote_etag(hashlib.sha1(f"{name}:{size}".encode()).hexdigest())
+
+
+def content_disposition(as_attachment, filename):
+    """``Content-Disposition`` value for filename, RFC 6266's ``filename*`` when it isn't plain ASCII."""
+    disposition = "attachment" if as_attachment else "inline"
+
+    try:
+        filename.encode("ascii")
+    except UnicodeEncodeError:
+        return f"{disposition}; filename*=UTF-8''{quote(filename)}"
+
+    escaped = filename.replace("\\", "\\\\").replace('"', '\\"')
+    return f'{disposition}; filename="{escaped}"'
+
+
+def parse_range(header, size):
+    """(first, last) byte offsets of a single-range ``Range`` header, or None when it has to be ignored.
+
+    Raises ValueError for a range that cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.replace(" ", ""))
+
+    # malformed or multiple ranges: answering with the whole file is always allowed
+    if match is None:
+        return None
+
+    start, end = match.groups()
+
+    if not start and not end:
+        return None
+
+    if not start:
+        # suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+
+    first = int(start)
+    last = min(int(end), size - 1) if end else size - 1
+
+    if first >= size or first > last:
+        raise ValueError(header)
+
+    return first, last
+
+
+def read_range(storage, name, first, last, chunk_size=CHUNK_SIZE):
+    remaining = last - first + 1
+
+    with storage.open(name, "rb") as f:
+        f.seek(first)
+
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _sendfile(response, name, storage):
+    mode = getattr(settings, "ATTACHMENT_SENDFILE", "")
+
+    if mode == "nginx":
+        # nginx decodes the URI before looking the file up
+        response["X-Accel-Redirect"] = getattr(settings, "ATTACHMENT_SENDFILE_PREFIX", "/protected/") + quote(name)
+    elif mode == "apache":
+        response["X-Sendfile"] = storage.path(name)
+    else:
+        return False
+
+    return True
+
+
+def serve(
+    request,
+    name,
+    storage,
+    filename=None,
+    content_type=None,
+    size=None,
+    etag=None,
+    last_modified=None,
+    as_attachment=True,
+    cache_control="private, no-cache",
+):
+    """Response sending the file stored under name in storage, as an attachment unless told otherwise."""
+    filename = filename or name.rsplit("/", 1)[-1]
+    content_type = content_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    size = storage.size(name) if size is None else size
+    etag = etag or make_etag(name, size)
+    last_modified = last_modified.timestamp() if last_modified is not None else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        response["ETag"] = etag
+        return response
+
+    headers = {
+        "Content-Disposition": content_disposition(as_attachment, filename),
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        # by default the browser may keep the bytes but has to revalidate, which is a cheap 304 from here
+        "Cache-Control": cache_control,
+    }
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+
+    response = HttpResponse(content_type=content_type, headers=headers)
+    if _sendfile(response, name, storage):
+        # the proxy does the ranges itself
+        return response
+
+    byte_range = None
+    range_header = request.headers.get("Range")
+
+    # If-Range: only send a part when the client still has the same version
+    if range_header and request.headers.get("If-Range", etag) == etag:
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return HttpResponse(status=416, headers={"Content-Range": f"bytes */{size}"})
+
+    if byte_range is None:
+        response = FileResponse(storage.open(name, "rb"), content_type=content_type, headers=headers)
+        # FileResponse derives its own from the file object
+        response["Content-Length"] = size
+        response["Content-Disposition"] = headers["Content-Disposition"]
+        signals.attachment_served.send(sender="file", size=size)
+        return response
+
+    first, last = byte_range
+    response = StreamingHttpResponse(
+        read_range(storage, name, first, last), status=206, content_type=content_type, headers=headers
+    )
+    response["Content-Range"] = f"bytes {first}-{last}/{size}"
+    response["Content-Length"] = last - first + 1
+    signals.attachment_served.send(sender="file", size=last - first + 1)
+
+    return response
+
+
+def serve_attachment(request, attachment):
+    """``serve`` for a story or issue attachment row, using the metadata stored on it."""
+    return serve(
+        request,
+        attachment.file.name,
+        attachment.file.storage,
+        filename=attachment.filename(),
+        content_type=attachment.content_type or None,
+        size=attachment.size,
+        etag=quote_etag(attachment.checksum) if attachment.checksum else None,
+        last_modified=attachment.uploaded_at,
+    )
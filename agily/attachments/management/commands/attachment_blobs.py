@@ -0,0 +1,49 @@
+import os
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from agily.attachments.apps import ATTACHMENT_MODELS
+from agily.attachments.models import Blob, guess_content_type
+from agily.utils import batched
+from agily.workspaces.deletion import delete_files
+
+
+class Command(BaseCommand):
+    help = "Move attachments stored before content-addressed blobs into them, dropping duplicate files"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200)
+
+    def handle(self, *args, **options):
+        for label in ATTACHMENT_MODELS:
+            model = apps.get_model(label)
+            moved = missing = 0
+
+            for batch in batched(model.objects.filter(blob__isnull=True).exclude(file=""), options["batch_size"]):
+                old_names = []
+
+                for attachment in batch:
+                    try:
+                        with attachment.file.open("rb") as f:
+                            blob = Blob.objects.store(f)
+                    except FileNotFoundError:
+                        missing += 1
+                        continue
+
+                    old_names.append(attachment.file.name)
+                    name = attachment.name or os.path.basename(attachment.file.name)
+                    model.objects.filter(pk=attachment.pk).update(
+                        blob=blob,
+                        file=blob.name,
+                        name=name,
+                        size=blob.size,
+                        checksum=blob.sha256,
+                        content_type=guess_content_type(name),
+                    )
+                    moved += 1
+
+                # only goes for files no other pre-blob row still points at
+                delete_files(old_names)
+
+            self.stdout.write(f"{label}: {moved} moved to blobs, {missing} files missing")
@@ -0,0 +1,44 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from agily.attachments.apps import ATTACHMENT_MODELS
+from agily.attachments.models import guess_content_type, hash_file
+from agily.utils import batched
+
+
+class Command(BaseCommand):
+    help = "Fill in size, content type and checksum of attachments stored before they were kept on the row"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200)
+
+    def handle(self, *args, **options):
+        for label in ATTACHMENT_MODELS:
+            model = apps.get_model(label)
+            updated = missing = 0
+
+            queryset = model.objects.filter(size__isnull=True).exclude(file="").select_related("blob")
+
+            for batch in batched(queryset, options["batch_size"]):
+                for attachment in batch:
+                    if attachment.blob is not None:
+                        # the blob already knows, no need to read the file
+                        attachment.set_metadata(attachment.blob)
+                    else:
+                        try:
+                            with attachment.file.open("rb") as f:
+                                attachment.checksum, attachment.size = hash_file(f)
+                        except FileNotFoundError:
+                            missing += 1
+                            continue
+
+                        attachment.content_type = guess_content_type(attachment.filename())
+
+                    updated += 1
+
+                model.objects.bulk_update(
+                    [attachment for attachment in batch if attachment.size is not None],
+                    ["size", "content_type", "checksum"],
+                )
+
+            self.stdout.write(f"{label}: {updated} updated, {missing} files missing")
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from agily.attachments.orphans import collect_orphans
+
+
+class Command(BaseCommand):
+    help = "Delete stored attachment files no attachment row or blob refers to any more"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report the orphaned files")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--grace-hours", type=int, default=1, help="Leave files younger than this alone")
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        report = self.stdout.write if dry_run or options["verbosity"] > 1 else None
+
+        found, size = collect_orphans(
+            dry_run=dry_run,
+            batch_size=options["batch_size"],
+            grace=timedelta(hours=options["grace_hours"]),
+            report=report,
+        )
+
+        action = "found" if dry_run else "deleted"
+        self.stdout.write(f"{found} orphaned files {action} ({filesizeformat(size)})")
@@ -0,0 +1,38 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from agily.attachments.apps import ATTACHMENT_MODELS
+from agily.attachments.models import Blob
+from agily.attachments.previews import IMAGE_TYPES, PDF_TYPE, can_preview, generate_previews
+
+
+class Command(BaseCommand):
+    help = "Render the missing previews of image and PDF attachments in a pool of processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None, help="Processes to render with (default: CPUs)")
+        parser.add_argument("--batch-size", type=int, default=100)
+
+    def handle(self, *args, **options):
+        types = [content_type for content_type in IMAGE_TYPES | {PDF_TYPE} if can_preview(content_type)]
+        items = {}
+
+        for label in ATTACHMENT_MODELS:
+            rows = (
+                apps.get_model(label)
+                .objects.filter(blob__preview_state=Blob.PREVIEW_NONE, content_type__in=types)
+                .values_list("blob_id", "content_type")
+            )
+            items.update(rows)
+
+        items = sorted(items.items())
+        batch_size = options["batch_size"]
+        ready = 0
+
+        with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+            for start in range(0, len(items), batch_size):
+                ready += generate_previews(items[start : start + batch_size], executor=executor)
+
+        self.stdout.write(f"{ready} of {len(items)} previews rendered")
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attachments', '0002_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blob',
+            name='preview_state',
+            field=models.CharField(blank=True, choices=[('', 'none'), ('ready', 'ready'), ('failed', 'failed')], default='', max_length=8),
+        ),
+    ]
@@ -0,0 +1,254 @@
+import hashlib
+import logging
+import mimetypes
+import os
+import uuid
+
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.db.models import F, ProtectedError, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+BLOB_ROOT = "blobs"
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def blob_name(sha256):
+    return f"{BLOB_ROOT}/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+def guess_content_type(name):
+    return mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+
+def preview_name(sha256):
+    # next to the blob, so it shares its lifetime
+    return f"{blob_name(sha256)}.preview.jpg"
+
+
+def hash_file(f):
+    """(SHA-256 hex digest, size) of a django File, read in chunks."""
+    digest = hashlib.sha256()
+    size = 0
+
+    for chunk in f.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+        size += len(chunk)
+
+    f.seek(0)
+
+    return digest.hexdigest(), size
+
+
+class BlobManager(models.Manager):
+    def acquire(self, counts):
+        """Add references: counts maps blob ids to the number of new rows pointing at them."""
+        self._change(counts, 1)
+
+    def release(self, counts):
+        """Drop references; blobs nobody refers to any more are left for ``collect_blobs``."""
+        self._change(counts, -1)
+
+    def _change(self, counts, sign):
+        counts = Counter({pk: n for pk, n in Counter(counts).items() if pk is not None})
+        now = timezone.now()
+
+        # one UPDATE per distinct amount, not per blob
+        for amount in set(counts.values()):
+            pks = [pk for pk, n in counts.items() if n == amount]
+            self.filter(pk__in=pks).update(refcount=F("refcount") + sign * amount, updated_at=now)
+
+    def store(self, f, sha256=None, size=None):
+        """The blob holding the content of the file object f, with one more reference.
+
+        The content is hashed first (unless the caller already did) and only written when no blob with the same
+        hash exists yet.
+        """
+        if sha256 is None:
+            sha256, size = hash_file(f)
+
+        while True:
+            blob, created = self.get_or_create(sha256=sha256, defaults=dict(size=size, refcount=1))
+
+            # a blob being collected at the same time disappears under us: start over and write it again
+            if created or self.filter(pk=blob.pk).update(refcount=F("refcount") + 1, updated_at=timezone.now()):
+                break
+
+        if not default_storage.exists(blob.name):
+            saved = default_storage.save(blob.name, f)
+
+            if saved != blob.name:
+                # lost a race with another upload of the same content, which already wrote it
+                default_storage.delete(saved)
+
+        return blob
+
+
+class Blob(models.Model):
+    """One stored file, shared by every attachment row with the same content.
+
+    Files live under ``blobs/`` named after the SHA-256 of their content, so a screenshot attached to a story
+    and its copies is stored once. ``refcount`` counts the attachment rows pointing here; blobs left at zero are
+    deleted by ``collect_blobs``.
+    """
+
+    PREVIEW_NONE = ""
+    PREVIEW_READY = "ready"
+    PREVIEW_FAILED = "failed"
+
+    PREVIEW_CHOICES = (
+        (PREVIEW_NONE, "none"),
+        (PREVIEW_READY, "ready"),
+        (PREVIEW_FAILED, "failed"),
+    )
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    refcount = models.IntegerField(default=0)
+    # see agily.attachments.previews
+    preview_state = models.CharField(max_length=8, choices=PREVIEW_CHOICES, default=PREVIEW_NONE, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    objects = BlobManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["updated_at"], condition=Q(refcount__lte=0), name="attachments_blob_unused_idx"),
+        ]
+
+    def __str__(self):
+        return self.sha256
+
+    @property
+    def name(self):
+        return blob_name(self.sha256)
+
+    @property
+    def preview_name(self):
+        return preview_name(self.sha256)
+
+    def has_preview(self):
+        return self.preview_state == self.PREVIEW_READY
+
+
+class AttachmentModel(models.Model):
+    """Attachment rows keeping their content in a shared ``Blob``.
+
+    A newly uploaded file is hashed and stored through ``Blob.objects.store``; the ``file`` field then points at
+    the blob and ``name`` keeps the name it was uploaded with. Rows from before blobs keep their own file.
+
+    Size, content type and checksum are copied onto the row when it is stored, so listing and serving
+    attachments never asks the storage about the file.
+    """
+
+    class Meta:
+        abstract = True
+
+    blob = models.ForeignKey(Blob, null=True, blank=True, on_delete=models.PROTECT, related_name="+")
+    name = models.CharField(max_length=255, blank=True)
+
+    size = models.PositiveBigIntegerField(null=True, blank=True)
+    content_type = models.CharField(max_length=255, blank=True)
+    # SHA-256 of the content
+    checksum = models.CharField(max_length=64, blank=True)
+
+    def filename(self):
+        if self.name:
+            return self.name
+        return os.path.basename(self.file.name) if self.file else ""
+
+    def set_metadata(self, blob):
+        self.size = blob.size
+        self.checksum = blob.sha256
+        self.content_type = guess_content_type(self.filename())
+
+    def save(self, *args, **kwargs):
+        if self.file and not self.file._committed:
+            with transaction.atomic():
+                self.name = self.name or os.path.basename(self.file.name)
+                self.blob = Blob.objects.store(self.file)
+                self.set_metadata(self.blob)
+
+                self.file.name = self.blob.name
+                self.file._committed = True
+
+                super().save(*args, **kwargs)
+            return
+
+        super().save(*args, **kwargs)
+
+
+class Upload(models.Model):
+    """A resumable upload in progress, see ``agily.attachments.uploads``.
+
+    Received bytes are appended to a staging file; once ``offset`` reaches ``length`` the content goes into a
+    blob and the upload holds that reference until ``attach`` hands it to an attachment row.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+
+    filename = models.CharField(max_length=255)
+    length = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+
+    blob = models.ForeignKey(Blob, null=True, blank=True, on_delete=models.PROTECT, related_name="+")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return self.filename
+
+    @property
+    def staging_path(self):
+        return os.path.join(settings.ATTACHMENT_UPLOAD_STAGING_DIR, self.id.hex)
+
+    def is_complete(self):
+        return self.blob_id is not None
+
+
+def handle_attachment_post_delete(sender, instance, **kwargs):
+    if instance.blob_id is not None:
+        Blob.objects.release([instance.blob_id])
+
+
+def handle_attachment_post_bulk_create(sender, instances, **kwargs):
+    # copied rows (workspace clones) share the blob of their original
+    Blob.objects.acquire(Counter(instance.blob_id for instance in instances))
+
+
+def collect_blobs(grace=None):
+    """Delete the blobs nobody referred to for ``grace`` and return how many went."""
+    cutoff = timezone.now() - (grace if grace is not None else timedelta(hours=1))
+    deleted = 0
+
+    for pk in list(Blob.objects.filter(refcount__lte=0, updated_at__lt=cutoff).values_list("pk", flat=True)):
+        with transaction.atomic():
+            # the row lock makes a concurrent store() wait, find the row gone and write the file again
+            blob = Blob.objects.select_for_update().filter(pk=pk, refcount__lte=0).first()
+
+            if blob is None:
+                continue
+
+            try:
+                blob.delete()
+            except ProtectedError:
+                # the counter drifted below the rows still pointing here: leave it alone
+                logger.warning("Blob %s is unreferenced by count but still in use", blob)
+                continue
+
+            default_storage.delete(blob.name)
+            default_storage.delete(blob.preview_name)
+            deleted += 1
+
+    return deleted
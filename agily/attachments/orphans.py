@@ -0,0 +1,175 @@
+"""
+Finds and deletes stored attachment files no row refers to.
+
+Both sides are read in the same order and merged like a sorted merge join: the storage tree is walked one
+directory at a time with its entries sorted, and the referenced names are paged from the database in code point
+order. Neither side is ever held in memory as a whole, so the cost is one pass over the tree and one ordered
+scan per table.
+"""
+
+import heapq
+import logging
+
+from datetime import timedelta
+from functools import partial
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.db.models import F
+from django.db.models.functions import Collate
+from django.utils import timezone
+
+from agily.attachments.apps import ATTACHMENT_MODELS
+from agily.attachments.models import BLOB_ROOT, Blob, blob_name, preview_name
+
+logger = logging.getLogger(__name__)
+
+# collations ordering strings by code point, like python does
+BINARY_COLLATIONS = {"mysql": "utf8mb4_bin", "postgresql": "C", "sqlite": "BINARY"}
+
+STREAM_CHUNK_SIZE = 2000
+
+
+def walk(storage, root):
+    """Names of the files under root, in code point order."""
+    try:
+        dirs, files = storage.listdir(root)
+    except FileNotFoundError:
+        return
+
+    # sorting directories as "name/" keeps every name below them where plain string order puts it
+    entries = sorted([(f"{name}/", True) for name in dirs] + [(name, False) for name in files])
+
+    for entry, is_dir in entries:
+        if is_dir:
+            yield from walk(storage, f"{root}/{entry[:-1]}")
+        else:
+            yield f"{root}/{entry}"
+
+
+def _stream(queryset, field, binary=False):
+    """The distinct values of field, sorted, fetched a page at a time.
+
+    Pages are cut on the last value seen rather than held open in a cursor, which mysqlclient would buffer
+    whole. binary forces code point order on columns whose collation could sort otherwise.
+    """
+    collation = BINARY_COLLATIONS.get(connection.vendor) if binary else None
+    queryset = queryset.annotate(key=Collate(field, collation) if collation else F(field)).order_by("key")
+    last = None
+
+    while True:
+        page = queryset if last is None else queryset.filter(key__gt=last)
+        values = list(page.values_list("key", flat=True).distinct()[:STREAM_CHUNK_SIZE])
+
+        yield from values
+
+        if len(values) < STREAM_CHUNK_SIZE:
+            return
+        last = values[-1]
+
+
+def _blob_names():
+    # lowercase hex sorts the same in every collation
+    for sha256 in _stream(Blob.objects.all(), "sha256"):
+        # sha256s have a fixed length, so a preview sorts right after its blob
+        yield blob_name(sha256)
+        yield preview_name(sha256)
+
+
+def _file_names(models, root):
+    streams = [_stream(model.objects.filter(file__startswith=f"{root}/"), "file", binary=True) for model in models]
+    return heapq.merge(*streams)
+
+
+def attachment_roots():
+    """{storage directory: callable streaming the sorted names referenced in it}."""
+    models = [apps.get_model(label) for label in ATTACHMENT_MODELS]
+    roots = {BLOB_ROOT: _blob_names}
+
+    for model in models:
+        # files from before blobs, under the static part of upload_to
+        root = model._meta.get_field("file").upload_to.split("%", 1)[0].rstrip("/")
+        roots.setdefault(root, partial(_file_names, models, root))
+
+    return roots
+
+
+def merge_orphans(files, referenced):
+    """The names of the sorted files missing from the sorted referenced names."""
+    referenced = iter(referenced)
+    current = next(referenced, None)
+
+    for name in files:
+        while current is not None and current < name:
+            current = next(referenced, None)
+
+        if current != name:
+            yield name
+
+
+def find_orphans(storage=None):
+    storage = storage or default_storage
+
+    for root, referenced in attachment_roots().items():
+        yield from merge_orphans(walk(storage, root), referenced())
+
+
+def _still_orphans(names):
+    """The names of the batch still not referenced now: rows may have been added since they were streamed."""
+    names = set(names)
+    blobs = {name.rsplit("/", 1)[-1].split(".", 1)[0] for name in names if name.startswith(f"{BLOB_ROOT}/")}
+
+    for sha256 in Blob.objects.filter(sha256__in=blobs).values_list("sha256", flat=True):
+        names -= {blob_name(sha256), preview_name(sha256)}
+
+    for label in ATTACHMENT_MODELS:
+        names -= set(apps.get_model(label).objects.filter(file__in=names).values_list("file", flat=True))
+
+    return sorted(names)
+
+
+def collect_orphans(dry_run=False, batch_size=500, grace=None, storage=None, report=None):
+    """Delete the orphaned attachment files and return (files, bytes) deleted, or found with dry_run.
+
+    Files younger than grace are left alone: a blob is written while the transaction creating its row is still
+    open. report, when given, is called with the name of every orphan.
+    """
+    storage = storage or default_storage
+    cutoff = timezone.now() - (grace if grace is not None else timedelta(hours=1))
+    found = size = 0
+
+    def flush(batch):
+        nonlocal found, size
+
+        for name in _still_orphans(batch):
+            try:
+                if storage.get_modified_time(name) >= cutoff:
+                    continue
+                file_size = storage.size(name)
+                if not dry_run:
+                    storage.delete(name)
+            except FileNotFoundError:
+                continue
+            except OSError:
+                logger.warning("Could not delete orphaned attachment file %s", name)
+                continue
+
+            found += 1
+            size += file_size
+            if report is not None:
+                report(name)
+
+    batch = []
+
+    for name in find_orphans(storage):
+        batch.append(name)
+
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+
+    if batch:
+        flush(batch)
+
+    return found, size
@@ -0,0 +1,164 @@
+"""
+Thumbnails of image attachments and first-page previews of PDFs.
+
+Previews are rendered off the request path: storing an attachment queues ``generate_previews`` on Celery, whose
+prefork workers are the process pool doing the CPU-bound decoding, and the ``attachment_previews`` command
+renders the backlog of existing blobs in a ``ProcessPoolExecutor``. A preview is a JPEG stored next to its blob
+and named after the same content hash, so it is rendered once per content and can be cached by browsers forever.
+"""
+
+import io
+import logging
+import shutil
+import subprocess
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from agily.attachments.models import Blob
+
+logger = logging.getLogger(__name__)
+
+IMAGE_TYPES = {"image/bmp", "image/gif", "image/jpeg", "image/png", "image/tiff", "image/webp"}
+PDF_TYPE = "application/pdf"
+
+PDF_TIMEOUT = 30
+
+
+def can_preview(content_type):
+    if content_type in IMAGE_TYPES:
+        return True
+    # first pages come from poppler's pdftoppm, when installed
+    return content_type == PDF_TYPE and shutil.which("pdftoppm") is not None
+
+
+def _pdf_first_page(source, size):
+    args = ["pdftoppm", "-png", "-f", "1", "-l", "1", "-singlefile", "-scale-to", str(size * 2)]
+
+    if isinstance(source, bytes):
+        result = subprocess.run(args + ["-"], input=source, capture_output=True, timeout=PDF_TIMEOUT, check=True)
+    else:
+        result = subprocess.run(args + [source], capture_output=True, timeout=PDF_TIMEOUT, check=True)
+
+    return io.BytesIO(result.stdout)
+
+
+def render(source, content_type, size):
+    """JPEG bytes of a preview fitting in size x size, or None when source cannot be previewed.
+
+    source is a file path or the file content. Runs in worker processes, so it only touches the file.
+    """
+    from PIL import Image, ImageOps
+
+    try:
+        if content_type == PDF_TYPE:
+            source = _pdf_first_page(source, size)
+        elif isinstance(source, bytes):
+            source = io.BytesIO(source)
+
+        with Image.open(source) as image:
+            # let the JPEG decoder downscale while decoding instead of building the full bitmap first
+            image.draft("RGB", (size, size))
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((size, size))
+
+            if image.mode in ("RGBA", "LA", "P"):
+                image = image.convert("RGBA")
+                background = Image.new("RGB", image.size, "white")
+                background.paste(image, mask=image.getchannel("A"))
+                image = background
+            elif image.mode != "RGB":
+                image = image.convert("RGB")
+
+            output = io.BytesIO()
+            image.save(output, "JPEG", quality=80, optimize=True, progressive=True)
+    except Exception:
+        logger.warning("Could not render a preview", exc_info=True)
+        return None
+
+    return output.getvalue()
+
+
+def _source(name):
+    try:
+        return default_storage.path(name)
+    except NotImplementedError:
+        # remote storage: the bytes, read by the worker rendering them, one file at a time
+        with default_storage.open(name, "rb") as f:
+            return f.read()
+
+
+def _render(job):
+    name, content_type, size = job
+
+    try:
+        source = _source(name)
+    except OSError:
+        logger.warning("Could not read %s for its preview", name, exc_info=True)
+        return None
+
+    return render(source, content_type, size)
+
+
+def generate_previews(items, executor=None):
+    """Render the previews of [(blob id, content type)] not rendered yet and return how many are ready.
+
+    Rendering is spread over executor when given. Blobs larger than ``ATTACHMENT_PREVIEW_MAX_BYTES`` get no preview.
+    """
+    content_types = dict(items)
+    blobs = list(Blob.objects.filter(pk__in=content_types, preview_state=Blob.PREVIEW_NONE))
+
+    if not blobs:
+        return 0
+
+    states = defaultdict(list)
+    max_bytes = settings.ATTACHMENT_PREVIEW_MAX_BYTES
+
+    if max_bytes:
+        states[Blob.PREVIEW_FAILED] = [blob.pk for blob in blobs if blob.size > max_bytes]
+        blobs = [blob for blob in blobs if blob.size <= max_bytes]
+
+    size = settings.ATTACHMENT_PREVIEW_SIZE
+    # names only: the workers read the files themselves, so neither this process nor the pipe to the pool holds them
+    jobs = [(blob.name, content_types[blob.pk], size) for blob in blobs]
+    results = executor.map(_render, jobs) if executor is not None else map(_render, jobs)
+
+    for blob, data in zip(blobs, results):
+        if data is None:
+            states[Blob.PREVIEW_FAILED].append(blob.pk)
+            continue
+
+        # a leftover of a blob collected and uploaded again
+        default_storage.delete(blob.preview_name)
+        default_storage.save(blob.preview_name, ContentFile(data))
+        states[Blob.PREVIEW_READY].append(blob.pk)
+
+    for state, pks in states.items():
+        Blob.objects.filter(pk__in=pks).update(preview_state=state)
+
+    return len(states[Blob.PREVIEW_READY])
+
+
+def schedule_previews(attachments):
+    """Queue previews of the attachments whose content has none yet, once the transaction commits."""
+    from agily.attachments.tasks import generate_previews as task
+
+    items = {
+        attachment.blob_id: attachment.content_type
+        for attachment in attachments
+        if attachment.blob_id is not None
+        and attachment.blob.preview_state == Blob.PREVIEW_NONE
+        and can_preview(attachment.content_type)
+    }
+
+    if items:
+        transaction.on_commit(lambda: task.delay(list(items.items())))
+
+
+def handle_attachment_post_save(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        schedule_previews([instance])
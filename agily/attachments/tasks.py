@@ -0,0 +1,42 @@
+import logging
+
+from agily.taskapp.celery import app
+
+logger = logging.getLogger(__name__)
+
+
+@app.task(ignore_result=True)
+def collect_blobs():
+    from agily.attachments.models import collect_blobs as collect
+
+    deleted = collect()
+
+    if deleted:
+        logger.info("Deleted %d unreferenced attachment blobs", deleted)
+
+
+@app.task(ignore_result=True)
+def expire_uploads():
+    from agily.attachments.uploads import expire_uploads as expire
+
+    expired = expire()
+
+    if expired:
+        logger.info("Expired %d unfinished uploads", expired)
+
+
+@app.task(ignore_result=True)
+def generate_previews(items):
+    from agily.attachments.previews import generate_previews as generate
+
+    generate(items)
+
+
+@app.task(ignore_result=True)
+def collect_orphans():
+    from agily.attachments.orphans import collect_orphans as collect
+
+    deleted, size = collect()
+
+    if deleted:
+        logger.info("Deleted %d orphaned attachment files (%d bytes)", deleted, size)
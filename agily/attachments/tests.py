@@ -0,0 +1,260 @@
+import base64
+import hashlib
+import tempfile
+import zipfile
+
+from datetime import timedelta
+from io import BytesIO, StringIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from agily.attachments.bulk import create_attachments
+from agily.attachments.downloads import content_disposition
+from agily.attachments.models import Blob, collect_blobs
+from agily.attachments.orphans import collect_orphans, walk
+from agily.attachments.previews import generate_previews
+from agily.stories.factories import StoryFactory
+from agily.stories.models import StoryAttachment
+from agily.users.tests.factories import UserFactory
+from agily.workspaces.factories import WorkspaceFactory
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class DownloadTest(TestCase):
+    def setUp(self):
+        workspace = WorkspaceFactory.create()
+        story = StoryFactory.create(workspace=workspace)
+        self.attachment = StoryAttachment(story=story)
+        self.attachment.file.save("notes.txt", ContentFile(b"0123456789"))
+        self.url = reverse("stories:story-attachment-download", args=[workspace.slug, self.attachment.pk])
+
+    def test_full_download(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertIn("attachment", response["Content-Disposition"])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_range(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=2-4")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 2-4/10")
+        self.assertEqual(b"".join(response.streaming_content), b"234")
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-3")
+        self.assertEqual(b"".join(response.streaming_content), b"789")
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=20-")
+        self.assertEqual(response.status_code, 416)
+
+        # a stale If-Range gets the whole file
+        response = self.client.get(self.url, HTTP_RANGE="bytes=2-4", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(ATTACHMENT_SENDFILE="nginx", ATTACHMENT_SENDFILE_PREFIX="/protected/")
+    def test_sendfile(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response["X-Accel-Redirect"], "/protected/" + self.attachment.file.name)
+        self.assertEqual(response.content, b"")
+
+    def test_content_disposition(self):
+        self.assertEqual(content_disposition(True, 'a "b".txt'), 'attachment; filename="a \\"b\\".txt"')
+        self.assertEqual(content_disposition(False, "résumé.pdf"), "inline; filename*=UTF-8''r%C3%A9sum%C3%A9.pdf")
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class BlobTest(TestCase):
+    def setUp(self):
+        self.story = StoryFactory.create(workspace=WorkspaceFactory.create())
+
+    def attach(self, name, content):
+        attachment = StoryAttachment(story=self.story, file=ContentFile(content, name=name))
+        attachment.save()
+        return attachment
+
+    def test_identical_files_share_a_blob(self):
+        first = self.attach("a.png", b"same bytes")
+        second = self.attach("b.png", b"same bytes")
+
+        blob = Blob.objects.get()
+        self.assertEqual((blob.refcount, blob.size), (2, 10))
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual((first.filename(), second.filename()), ("a.png", "b.png"))
+        self.assertEqual((first.size, first.checksum, first.content_type), (10, blob.sha256, "image/png"))
+
+        first.delete()
+        self.assertEqual(collect_blobs(grace=timedelta(0)), 0)
+
+        second.delete()
+        self.assertEqual(Blob.objects.get().refcount, 0)
+        self.assertEqual(collect_blobs(grace=timedelta(0)), 1)
+        self.assertFalse(default_storage.exists(blob.name))
+
+    @override_settings(ATTACHMENT_PREVIEW_MAX_BYTES=5)
+    def test_no_preview_over_the_size_cap(self):
+        attachment = self.attach("big.png", b"0123456789")
+
+        self.assertEqual(generate_previews([(attachment.blob_id, "image/png")]), 0)
+        self.assertEqual(Blob.objects.get().preview_state, Blob.PREVIEW_FAILED)
+
+    def test_create_attachments(self):
+        files = [
+            ContentFile(b"one", name="1.txt"),
+            ContentFile(b"two", name="2.txt"),
+            ContentFile(b"one", name="3.txt"),
+        ]
+
+        attachments = create_attachments(StoryAttachment, files, story=self.story)
+
+        self.assertEqual([attachment.filename() for attachment in attachments], ["1.txt", "2.txt", "3.txt"])
+        self.assertEqual(sorted(Blob.objects.values_list("refcount", flat=True)), [1, 2])
+        self.assertEqual(StoryAttachment.objects.filter(story=self.story).count(), 3)
+        with StoryAttachment.objects.get(name="2.txt").file.open("rb") as f:
+            self.assertEqual(f.read(), b"two")
+
+    def test_metadata_backfill(self):
+        attachment = self.attach("notes.txt", b"0123456789")
+        StoryAttachment.objects.update(size=None, content_type="", checksum="")
+
+        call_command("attachment_metadata", stdout=StringIO())
+
+        attachment.refresh_from_db()
+        self.assertEqual(
+            (attachment.size, attachment.content_type, attachment.checksum),
+            (10, "text/plain", hashlib.sha256(b"0123456789").hexdigest()),
+        )
+
+
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(), ATTACHMENT_UPLOAD_STAGING_DIR=tempfile.mkdtemp(), ATTACHMENT_UPLOAD_CHUNK_MAX=4
+)
+class UploadTest(TestCase):
+    def setUp(self):
+        self.workspace = WorkspaceFactory.create()
+        self.story = StoryFactory.create(workspace=self.workspace)
+        self.client.force_login(UserFactory.create())
+
+    def patch(self, url, offset, chunk):
+        return self.client.generic(
+            "PATCH", url, chunk, content_type="application/offset+octet-stream", HTTP_UPLOAD_OFFSET=str(offset)
+        )
+
+    def test_resumable_upload(self):
+        content = b"0123456789"
+        response = self.client.post(
+            reverse("attachments:upload-create"),
+            HTTP_UPLOAD_LENGTH=str(len(content)),
+            HTTP_UPLOAD_METADATA="filename " + base64.b64encode(b"notes.txt").decode(),
+        )
+        self.assertEqual(response.status_code, 201)
+        url = response["Location"]
+
+        self.assertEqual(self.patch(url, 0, content[:4])["Upload-Offset"], "4")
+        # a retried chunk the server already has
+        self.assertEqual(self.patch(url, 0, content[:4]).status_code, 409)
+        self.assertEqual(self.patch(url, 4, content[4:12]).status_code, 413)
+        self.assertEqual(self.client.head(url)["Upload-Offset"], "4")
+
+        self.patch(url, 4, content[4:8])
+        self.assertEqual(self.patch(url, 8, content[8:])["Upload-Offset"], "10")
+
+        blob = Blob.objects.get()
+        self.assertEqual((blob.sha256, blob.refcount), (hashlib.sha256(content).hexdigest(), 1))
+
+        upload_id = url.rstrip("/").rsplit("/", 1)[-1]
+        self.client.post(
+            reverse("stories:story-attachment-upload", args=[self.workspace.slug, self.story.pk]),
+            {"uploads": [upload_id], "description": "chunked"},
+        )
+
+        attachment = StoryAttachment.objects.get()
+        self.assertEqual((attachment.filename(), attachment.blob_id), ("notes.txt", blob.pk))
+        self.assertEqual(Blob.objects.get().refcount, 1)
+        with attachment.file.open("rb") as f:
+            self.assertEqual(f.read(), content)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class PreviewTest(TestCase):
+    def setUp(self):
+        self.workspace = WorkspaceFactory.create()
+        self.story = StoryFactory.create(workspace=self.workspace)
+        self.client.force_login(UserFactory.create())
+
+    def test_preview(self):
+        attachment = StoryAttachment(story=self.story, file=ContentFile(b"not really a png", name="shot.png"))
+        attachment.save()
+        blob = attachment.blob
+
+        url = reverse("attachments:preview", args=[blob.sha256])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        default_storage.save(blob.preview_name, ContentFile(b"jpeg"))
+        Blob.objects.filter(pk=blob.pk).update(preview_state=Blob.PREVIEW_READY)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertTrue(response["Content-Disposition"].startswith("inline"))
+
+        response = self.client.get(reverse("stories:story-detail", args=[self.workspace.slug, self.story.pk]))
+        self.assertContains(response, url)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class OrphanTest(TestCase):
+    def test_collect_orphans(self):
+        story = StoryFactory.create(workspace=WorkspaceFactory.create())
+        kept = StoryAttachment(story=story, file=ContentFile(b"kept", name="kept.txt"))
+        kept.save()
+        legacy = default_storage.save("story_attachments/2020/01/01/legacy.txt", ContentFile(b"legacy"))
+        StoryAttachment.objects.bulk_create([StoryAttachment(story=story, file=legacy)])
+
+        orphans = [
+            default_storage.save("blobs/00/00/" + "0" * 64, ContentFile(b"gone")),
+            default_storage.save("story_attachments/2020/01/01/legacy-copy.txt", ContentFile(b"gone")),
+            default_storage.save("story_attachments/2020/01/01/legacy/nested.txt", ContentFile(b"gone")),
+        ]
+
+        self.assertEqual(list(walk(default_storage, "story_attachments")), sorted([legacy] + orphans[1:]))
+
+        reported = []
+        self.assertEqual(collect_orphans(dry_run=True, grace=timedelta(0), report=reported.append), (3, 12))
+        self.assertEqual(sorted(reported), sorted(orphans))
+        self.assertTrue(all(default_storage.exists(name) for name in orphans))
+
+        self.assertEqual(collect_orphans(grace=timedelta(0)), (3, 12))
+        self.assertFalse(any(default_storage.exists(name) for name in orphans))
+        self.assertTrue(default_storage.exists(kept.file.name))
+        self.assertTrue(default_storage.exists(legacy))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ArchiveTest(TestCase):
+    def test_download_all(self):
+        workspace = WorkspaceFactory.create()
+        story = StoryFactory.create(workspace=workspace)
+        for name, content in (("a.txt", b"first"), ("a.txt", b"second"), ("copy.txt", b"first")):
+            StoryAttachment(story=story, file=ContentFile(content, name=name)).save()
+
+        self.client.force_login(UserFactory.create())
+        url = reverse("stories:story-attachments-download", args=[workspace.slug, story.pk])
+
+        response = self.client.get(url)
+        self.assertEqual(response["Content-Type"], "application/zip")
+        archive = zipfile.ZipFile(BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), ["a.txt", "a (2).txt", "copy.txt"])
+        self.assertEqual(archive.read("a (2).txt"), b"second")
+
+        response = self.client.get(url, {"dedupe": "1"})
+        archive = zipfile.ZipFile(BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), ["a.txt", "a (2).txt"])
@@ -0,0 +1,205 @@
+"""
+Resumable chunked uploads, following the core of the tus protocol (https://tus.io/protocols/resumable-upload).
+
+A client creates an upload with its total length, sends the bytes in ``PATCH`` requests of at most
+``ATTACHMENT_UPLOAD_CHUNK_MAX`` bytes at the offset the server reports, and after a dropped connection asks for
+that offset with ``HEAD`` and carries on. No request holds a worker for longer than one chunk.
+
+Chunks are appended to a staging file and hashed as they arrive. The SHA-256 state cannot be stored, so each
+process keeps the hashers of the uploads it served last; a chunk landing in another process re-hashes the staged
+prefix once. The last chunk moves the staging file into a blob, and ``attach`` turns finished uploads into
+attachment rows in one transaction.
+"""
+
+import hashlib
+import os
+import threading
+import uuid
+
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from agily.attachments.models import HASH_CHUNK_SIZE, Blob, Upload
+from agily.attachments.previews import schedule_previews
+
+MAX_HASHERS = 64
+
+_lock = threading.Lock()
+_hashers = OrderedDict()
+
+
+class UploadError(Exception):
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+class StagedFile(File):
+    """The staging file, presented like a django temporary upload so FileSystemStorage moves it in place."""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def _hasher(upload):
+    with _lock:
+        offset, hasher = _hashers.pop(upload.pk, (None, None))
+
+    if offset == upload.offset:
+        return hasher
+
+    hasher = hashlib.sha256()
+    remaining = upload.offset
+
+    if remaining:
+        with open(upload.staging_path, "rb") as f:
+            while remaining > 0:
+                chunk = f.read(min(HASH_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                remaining -= len(chunk)
+
+    return hasher
+
+
+def _keep_hasher(upload, hasher):
+    with _lock:
+        _hashers[upload.pk] = (upload.offset, hasher)
+
+        while len(_hashers) > MAX_HASHERS:
+            _hashers.popitem(last=False)
+
+
+def create(user, filename, length):
+    if length > settings.ATTACHMENT_UPLOAD_MAX_SIZE:
+        raise UploadError("Upload too large", 413)
+
+    os.makedirs(settings.ATTACHMENT_UPLOAD_STAGING_DIR, exist_ok=True)
+
+    upload = Upload.objects.create(user=user, filename=os.path.basename(filename)[:255] or "upload", length=length)
+    open(upload.staging_path, "wb").close()
+
+    return upload
+
+
+def append(upload_id, user, offset, stream, content_length):
+    """Append the body of a PATCH request at offset and return the updated upload."""
+    if content_length > settings.ATTACHMENT_UPLOAD_CHUNK_MAX:
+        raise UploadError("Chunk too large", 413)
+
+    with transaction.atomic():
+        # the row lock serialises concurrent PATCHes of the same upload
+        upload = Upload.objects.select_for_update().filter(pk=upload_id, user=user).first()
+
+        if upload is None:
+            raise UploadError("Unknown upload", 404)
+
+        if upload.is_complete() or offset != upload.offset:
+            raise UploadError("Offset mismatch", 409)
+
+        if offset + content_length > upload.length:
+            raise UploadError("Chunk beyond the upload length", 400)
+
+        hasher = _hasher(upload)
+
+        with open(upload.staging_path, "r+b") as f:
+            # drop whatever a previously interrupted request wrote past the committed offset
+            f.truncate(upload.offset)
+            f.seek(upload.offset)
+
+            remaining = content_length
+            while remaining > 0:
+                chunk = stream.read(min(HASH_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                f.write(chunk)
+                hasher.update(chunk)
+                remaining -= len(chunk)
+
+        upload.offset += content_length - remaining
+        upload.save(update_fields=["offset", "updated_at"])
+
+        if upload.offset < upload.length:
+            _keep_hasher(upload, hasher)
+            return upload
+
+        with open(upload.staging_path, "rb") as f:
+            upload.blob = Blob.objects.store(StagedFile(f), sha256=hasher.hexdigest(), size=upload.length)
+
+        upload.save(update_fields=["blob", "updated_at"])
+
+    discard_staging(upload)
+
+    return upload
+
+
+def discard_staging(upload):
+    try:
+        os.remove(upload.staging_path)
+    except FileNotFoundError:
+        pass
+
+
+@transaction.atomic
+def attach(model, user, upload_ids, **fields):
+    """Create one attachment row per finished upload of user and return them.
+
+    The reference each upload holds on its blob passes to the new row. Ids that are not the user's finished
+    uploads are ignored.
+    """
+    pks = set()
+    for pk in upload_ids:
+        try:
+            pks.add(uuid.UUID(str(pk)))
+        except ValueError:
+            continue
+
+    if not pks:
+        return []
+
+    uploads = list(
+        Upload.objects.select_for_update()
+        .filter(pk__in=pks, user=user, blob__isnull=False)
+        .select_related("blob")
+        .order_by("created_at")
+    )
+
+    attachments = []
+
+    for upload in uploads:
+        attachment = model(blob=upload.blob, file=upload.blob.name, name=upload.filename, **fields)
+        attachment.set_metadata(upload.blob)
+        attachments.append(attachment)
+
+    model.objects.bulk_create(attachments)
+    schedule_previews(attachments)
+
+    Upload.objects.filter(pk__in=[upload.pk for upload in uploads]).delete()
+
+    return attachments
+
+
+def discard(upload):
+    """Drop an upload with its staged bytes and, once finished, its blob reference."""
+    discard_staging(upload)
+    Blob.objects.release([upload.blob_id])
+    upload.delete()
+
+
+def expire_uploads(max_age=None):
+    """Drop the uploads nobody touched for ``max_age`` and return how many went."""
+    cutoff = timezone.now() - (max_age or timedelta(hours=settings.ATTACHMENT_UPLOAD_EXPIRY_HOURS))
+    expired = 0
+
+    for upload in Upload.objects.filter(updated_at__lt=cutoff).iterator():
+        with transaction.atomic():
+            discard(upload)
+        expired += 1
+
+    return expired
@@ -0,0 +1,11 @@
+from django.urls import path
+
+from .views import preview, upload_create, upload_detail
+
+app_name = "attachments"
+
+urlpatterns = [
+    path("uploads/", upload_create, name="upload-create"),
+    path("uploads/<uuid:pk>/", upload_detail, name="upload-detail"),
+    path("previews/<slug:sha256>.jpg", preview, name="preview"),
+]
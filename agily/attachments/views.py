@@ -0,0 +1,127 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.views.decorators.http import require_http_methods
+
+from agily.attachments import uploads
+from agily.attachments.downloads import serve
+from agily.attachments.models import Blob, Upload
+
+TUS_VERSION = "1.0.0"
+
+UPLOAD_CONTENT_TYPE = "application/offset+octet-stream"
+
+# previews are named after the content they show, so they never change under their url
+PREVIEW_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+def _response(status=204, **headers):
+    response = HttpResponse(status=status)
+    response["Tus-Resumable"] = TUS_VERSION
+    response["Cache-Control"] = "no-store"
+
+    for name, value in headers.items():
+        response[name.replace("_", "-")] = value
+
+    return response
+
+
+def _int_header(request, name):
+    try:
+        value = int(request.headers[name])
+    except (KeyError, ValueError):
+        return None
+    return value if value >= 0 else None
+
+
+def _metadata(header):
+    """The Upload-Metadata header: comma separated "key base64(value)" pairs."""
+    metadata = {}
+
+    for pair in header.split(","):
+        key, _, value = pair.strip().partition(" ")
+        try:
+            metadata[key] = base64.b64decode(value, validate=True).decode()
+        except (binascii.Error, UnicodeDecodeError):
+            continue
+
+    return metadata
+
+
+@login_required
+@require_http_methods(["OPTIONS", "POST"])
+def upload_create(request):
+    if request.method == "OPTIONS":
+        return _response(
+            Tus_Version=TUS_VERSION,
+            Tus_Max_Size=settings.ATTACHMENT_UPLOAD_MAX_SIZE,
+            Tus_Extension="creation,termination",
+        )
+
+    length = _int_header(request, "Upload-Length")
+    if length is None:
+        return _response(400)
+
+    filename = _metadata(request.headers.get("Upload-Metadata", "")).get("filename", "")
+
+    try:
+        upload = uploads.create(request.user, filename, length)
+    except uploads.UploadError as e:
+        return _response(e.status)
+
+    return _response(
+        201,
+        Location=reverse("attachments:upload-detail", args=[upload.pk]),
+        Upload_Offset=0,
+        Upload_Chunk_Max=settings.ATTACHMENT_UPLOAD_CHUNK_MAX,
+    )
+
+
+@login_required
+@require_http_methods(["HEAD", "PATCH", "DELETE"])
+def upload_detail(request, pk):
+    if request.method == "PATCH":
+        if request.content_type != UPLOAD_CONTENT_TYPE:
+            return _response(415)
+
+        offset = _int_header(request, "Upload-Offset")
+        content_length = _int_header(request, "Content-Length")
+        if offset is None or content_length is None:
+            return _response(400)
+
+        try:
+            upload = uploads.append(pk, request.user, offset, request, content_length)
+        except uploads.UploadError as e:
+            return _response(e.status)
+
+        return _response(Upload_Offset=upload.offset)
+
+    upload = get_object_or_404(Upload, pk=pk, user=request.user)
+
+    if request.method == "DELETE":
+        uploads.discard(upload)
+        return _response()
+
+    return _response(200, Upload_Offset=upload.offset, Upload_Length=upload.length)
+
+
+@login_required
+def preview(request, sha256):
+    blob = get_object_or_404(Blob, sha256=sha256, preview_state=Blob.PREVIEW_READY)
+
+    return serve(
+        request,
+        blob.preview_name,
+        default_storage,
+        filename=f"{sha256}.jpg",
+        content_type="image/jpeg",
+        etag=f'"{sha256}"',
+        as_attachment=False,
+        cache_control=PREVIEW_CACHE_CONTROL,
+    )
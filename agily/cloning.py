@@ -0,0 +1,180 @@
+"""
+Bulk cloning of stories, epics, sprints and their children.
+
+Copies are inserted with ``bulk_create`` so no save signal fires per clone: tag through-rows, child tasks and
+simple_history rows are written in bulk too, and the epic/sprint rollups run once per affected parent at the end.
+"""
+
+from collections import Counter
+
+from django.apps import apps
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from agily.signals import post_bulk_create
+
+BATCH_SIZE = 500
+
+COPY_PREFIX = "Copy of "
+
+# a cloned epic or sprint starts without stories
+EMPTY_ROLLUPS = dict(total_points=0, story_count=0, points_done=0, progress=0)
+
+
+def bulk_insert(model, objs, batch_size=BATCH_SIZE):
+    """Insert objs and return them with their primary keys set."""
+    if connection.features.can_return_rows_from_bulk_insert:
+        return model._base_manager.bulk_create(objs, batch_size=batch_size)
+
+    # MySQL does not hand back the ids of a multi-row INSERT: fall back to one INSERT per row, with the same field
+    # defaults bulk_create would apply. pre_save and post_save are still sent, with raw=True: receivers have to
+    # check it to skip these rows
+    for obj in objs:
+        for field in model._meta.concrete_fields:
+            field.pre_save(obj, True)
+        obj.save_base(raw=True, force_insert=True)
+
+    return objs
+
+
+def copy_instance(obj, **changes):
+    """Unsaved copy of obj with the given field values (by attname) replaced."""
+    fields = [field for field in obj._meta.concrete_fields if not field.primary_key]
+    values = {field.attname: getattr(obj, field.attname) for field in fields}
+    values.update(changes)
+    return obj.__class__(**values)
+
+
+def copy_title(title):
+    return (COPY_PREFIX + title)[:255]
+
+
+def clone(model, objs, changes=None, history=True, batch_size=BATCH_SIZE):
+    """Insert a copy of every obj and return the copies in the same order.
+
+    ``changes`` is an optional callable receiving the original and returning the field values to replace.
+    """
+    objs = list(objs)
+    clones = [copy_instance(obj, **(changes(obj) if changes else {})) for obj in objs]
+
+    if not clones:
+        return clones
+
+    bulk_insert(model, clones, batch_size=batch_size)
+
+    if history and hasattr(model, "history"):
+        model.history.bulk_history_create(clones, batch_size=batch_size, default_date=timezone.now())
+
+    post_bulk_create.send(sender=model, instances=clones)
+
+    return clones
+
+
+def copy_tags(model, pk_map, field_name="tags", batch_size=BATCH_SIZE):
+    """Give every clone in pk_map (original pk -> clone pk) the tags of its original."""
+    field = model._meta.get_field(field_name)
+    through = field.remote_field.through
+    source_attname = field.m2m_field_name() + "_id"
+    tag_attname = field.m2m_reverse_field_name() + "_id"
+
+    rows = through.objects.filter(**{source_attname + "__in": list(pk_map)}).values_list(source_attname, tag_attname)
+    links = [through(**{source_attname: pk_map[source_id], tag_attname: tag_id}) for source_id, tag_id in rows]
+
+    if not links:
+        return
+
+    through.objects.bulk_create(links, batch_size=batch_size)
+
+    # tagulous keeps a usage counter per tag: bump every tag once per distinct increment
+    increments = Counter(getattr(link, tag_attname) for link in links)
+    for amount in set(increments.values()):
+        tag_ids = [tag_id for tag_id, count in increments.items() if count == amount]
+        field.tag_model.objects.filter(pk__in=tag_ids).update(count=F("count") + amount)
+
+
+def copy_tasks(story_pk_map, batch_size=BATCH_SIZE):
+    """Copy the tasks of every original story in story_pk_map to its clone."""
+    Task = apps.get_model("stories", "Task")
+
+    original_ids = list(story_pk_map)
+
+    for start in range(0, len(original_ids), batch_size):
+        story_ids = original_ids[start : start + batch_size]
+        tasks = Task.objects.filter(story_id__in=story_ids).order_by("pk")
+        clone(Task, tasks.iterator(), changes=lambda task: dict(story_id=story_pk_map[task.story_id]))
+
+
+def update_rollups(epic_ids=(), sprint_ids=(), project_ids=()):
+    """Recompute points and progress once for each given epic, sprint and project."""
+    Epic = apps.get_model("stories", "Epic")
+    Sprint = apps.get_model("sprints", "Sprint")
+    Project = apps.get_model("agily", "Project")
+
+    for epic in Epic.objects.filter(id__in={pk for pk in epic_ids if pk}).select_related("state"):
+        epic.update_points_and_progress()
+        epic.update_state()
+
+    for sprint in Sprint.objects.filter(id__in={pk for pk in sprint_ids if pk}):
+        sprint.update_points_and_progress()
+
+    for project in Project.objects.filter(id__in={pk for pk in project_ids if pk}):
+        project.update_rollups()
+
+
+def _completed_at(obj, now):
+    return now if obj.state is not None and obj.is_done() else None
+
+
+@transaction.atomic
+def clone_stories(stories):
+    Story = apps.get_model("stories", "Story")
+
+    if hasattr(stories, "select_related"):
+        stories = stories.select_related("state")
+
+    stories = list(stories)
+    now = timezone.now()
+    clones = clone(
+        Story,
+        stories,
+        changes=lambda story: dict(title=copy_title(story.title), completed_at=_completed_at(story, now)),
+    )
+
+    pk_map = {story.pk: cloned.pk for story, cloned in zip(stories, clones)}
+    copy_tags(Story, pk_map)
+    copy_tasks(pk_map)
+
+    update_rollups(
+        epic_ids=[cloned.epic_id for cloned in clones],
+        sprint_ids=[cloned.sprint_id for cloned in clones],
+        project_ids=[cloned.project_id for cloned in clones],
+    )
+
+    return clones
+
+
+@transaction.atomic
+def clone_epics(epics):
+    Epic = apps.get_model("stories", "Epic")
+
+    epics = list(epics)
+    clones = clone(Epic, epics, changes=lambda epic: dict(EMPTY_ROLLUPS, title=copy_title(epic.title)))
+    copy_tags(Epic, {epic.pk: cloned.pk for epic, cloned in zip(epics, clones)})
+
+    return clones
+
+
+@transaction.atomic
+def clone_sprints(sprints):
+    Sprint = apps.get_model("sprints", "Sprint")
+
+    from agily.sprints.tasks import transition_sprint
+
+    clones = clone(Sprint, sprints, changes=lambda sprint: dict(EMPTY_ROLLUPS, title=copy_title(sprint.title)))
+
+    # the copies skipped the post_save handler that schedules their state transitions
+    for cloned in clones:
+        transaction.on_commit(lambda pk=cloned.pk: transition_sprint.delay(pk))
+
+    return clones
@@ -0,0 +1,148 @@
+"""
+Dependency probes behind the readiness endpoint.
+
+Each process probes the database, the broker and the media storage from a background thread every
+``HEALTH_CHECK_INTERVAL`` seconds and keeps the last result, so a readiness request only reads it. Django's system
+checks don't change while the process runs: they are run once, by the first refresh.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import SystemCheckError
+from django.db import connection
+from django.utils import timezone
+
+from agily.taskapp.celery import app
+
+# written once in storage's root by nobody: asking whether it exists is the cheapest round trip
+STORAGE_PROBE_NAME = ".health-check"
+
+# refreshes missed before the last result stops counting as healthy
+STALE_INTERVALS = 3
+
+_lock = threading.Lock()
+_result = None
+_system_checks = None
+_refresher = None
+
+
+def probe_database():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+
+
+def probe_broker():
+    if app.conf.task_always_eager:
+        # tasks run in process, nothing to connect to
+        return "skipped"
+
+    with app.connection_for_write(connect_timeout=settings.HEALTH_CHECK_TIMEOUT) as conn:
+        conn.connect()
+
+
+def probe_storage():
+    default_storage.exists(STORAGE_PROBE_NAME)
+
+
+PROBES = {
+    "database": probe_database,
+    "broker": probe_broker,
+    "storage": probe_storage,
+}
+
+
+def timed(probe):
+    """{"ok": bool, "latency_ms": float} of one run of probe, with the error when it failed."""
+    started = time.perf_counter()
+
+    try:
+        note = probe()
+    except Exception as e:
+        report = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+    else:
+        report = {"ok": True}
+        if note:
+            report["note"] = note
+
+    report["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    return report
+
+
+def system_checks():
+    global _system_checks
+
+    if _system_checks is None:
+        try:
+            call_command("check")
+        except SystemCheckError as e:
+            _system_checks = {"ok": False, "error": str(e)}
+        else:
+            _system_checks = {"ok": True}
+
+    return _system_checks
+
+
+def refresh():
+    """Probe everything once and keep the result for the readiness endpoint."""
+    global _result
+
+    checks = {"system": system_checks()}
+
+    for name, probe in PROBES.items():
+        checks[name] = timed(probe)
+
+    result = {
+        "ok": all(check["ok"] for check in checks.values()),
+        "checked_at": timezone.now(),
+        "checks": checks,
+    }
+
+    with _lock:
+        _result = result
+
+    return result
+
+
+def _refresh_forever():
+    while True:
+        time.sleep(settings.HEALTH_CHECK_INTERVAL)
+
+        try:
+            refresh()
+        finally:
+            # the thread has a database connection of its own: don't leave it open between refreshes
+            connection.close()
+
+
+def start_refresher():
+    global _refresher
+
+    with _lock:
+        if _refresher is None or not _refresher.is_alive():
+            _refresher = threading.Thread(target=_refresh_forever, name="health-checks", daemon=True)
+            _refresher.start()
+
+
+def current():
+    """The last result, probing right away when there is none yet (the first request of the process).
+
+    A result older than a few intervals means the refresher is stuck on a probe: it's reported as failed.
+    """
+    with _lock:
+        result = _result
+
+    if result is None:
+        result = refresh()
+
+    start_refresher()
+
+    age = (timezone.now() - result["checked_at"]).total_seconds()
+    stale = age > settings.HEALTH_CHECK_INTERVAL * STALE_INTERVALS
+
+    return dict(result, ok=result["ok"] and not stale, age=round(age, 1), stale=stale)
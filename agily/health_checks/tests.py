@@ -0,0 +1,34 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from agily.health_checks import probes
+
+
+@override_settings(HEALTH_CHECK_INTERVAL=3600)
+class ReadinessTest(TestCase):
+    def setUp(self):
+        probes._result = probes._system_checks = None
+
+    def test_probes_are_cached(self):
+        with mock.patch.object(probes, "call_command") as check:
+            response = self.client.get("/health/ready/")
+            self.client.get("/health/ready/")
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(set(data["checks"]), {"system", "database", "broker", "storage"})
+        self.assertIn("latency_ms", data["checks"]["database"])
+        self.assertEqual(check.call_count, 1)
+
+        # later requests read the first result
+        with self.assertNumQueries(0):
+            self.client.get("/health/ready/")
+
+    def test_failed_probe(self):
+        with mock.patch.dict(probes.PROBES, storage=mock.Mock(side_effect=OSError("unreachable"))):
+            response = self.client.get("/health/ready/")
+
+        self.assertEqual(response.status_code, 503)
+        storage = response.json()["checks"]["storage"]
+        self.assertEqual(storage, {"ok": False, "error": "OSError: unreachable", "latency_ms": mock.ANY})
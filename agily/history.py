@@ -0,0 +1,137 @@
+"""
+Retention for the simple_history tables of epics, stories and sprints.
+
+Every save writes a full snapshot, the rollup saves of ``update_points_and_progress``/``update_state`` included,
+so the history tables outgrow the data. ``maintain`` walks a history table in batches of objects and
+
+* collapses runs of consecutive snapshots that only differ in rollup counters, keeping the first snapshot of a
+  run (the one carrying the actual change and its user) and the newest snapshot of the object;
+* expires the snapshots beyond the newest ``HISTORY_KEEP_LATEST`` of an object that are also older than
+  ``HISTORY_KEEP_DAYS`` days, writing them to a gzipped NDJSON file in the default storage before deleting them.
+"""
+
+import gzip
+import json
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+HISTORY_MODELS = ("stories.Epic", "stories.Story", "sprints.Sprint")
+
+# written by the rollups, plus the auto_now timestamps every save bumps
+ROLLUP_FIELDS = {"total_points", "story_count", "points_done", "progress", "created_at", "updated_at"}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def history_model(label):
+    return apps.get_model(label).history.model
+
+
+def compared_fields(model):
+    """Attnames of the tracked fields a snapshot has to differ in to count as a real change."""
+    # the fields the history model copies, which leaves out its model's excluded_fields
+    return [field.attname for field in model.tracked_fields if field.attname not in ROLLUP_FIELDS]
+
+
+def collapsible(snapshots, fields):
+    """history_ids of the rollup-only snapshots of one object, given its snapshots oldest first."""
+    collapsed = []
+    kept = None
+
+    for snapshot in snapshots[:-1]:
+        if (
+            kept is not None
+            and snapshot["history_type"] == "~"
+            and kept["history_type"] == "~"
+            and all(snapshot[field] == kept[field] for field in fields)
+        ):
+            collapsed.append(snapshot["history_id"])
+        else:
+            kept = snapshot
+
+    return collapsed
+
+
+def expired(snapshots, keep_latest, cutoff):
+    """history_ids of the snapshots of one object (oldest first) that fall out of both retention policies."""
+    if keep_latest is None and cutoff is None:
+        return []
+
+    candidates = snapshots if keep_latest is None else snapshots[: max(len(snapshots) - keep_latest, 0)]
+
+    return [s["history_id"] for s in candidates if cutoff is None or s["history_date"] < cutoff]
+
+
+def archive(model, rows):
+    """Store rows as gzipped NDJSON and return the file name."""
+    payload = "".join(json.dumps(row, cls=DjangoJSONEncoder) + "\n" for row in rows)
+
+    name = "{}/{}/{}-{}.ndjson.gz".format(
+        _setting("HISTORY_ARCHIVE_PATH", "history").rstrip("/"),
+        model._meta.label_lower,
+        timezone.now().strftime("%Y%m%d%H%M%S"),
+        rows[0]["history_id"],
+    )
+
+    return default_storage.save(name, ContentFile(gzip.compress(payload.encode("utf-8"))))
+
+
+def maintain(label, after=None, batch_size=None, now=None):
+    """Compact and expire the history of the next batch of objects with an id above ``after``.
+
+    Returns ``(last object id or None when done, collapsed count, archived count)``.
+    """
+    model = history_model(label)
+    batch_size = batch_size or _setting("HISTORY_BATCH_SIZE", 500)
+
+    keep_latest = _setting("HISTORY_KEEP_LATEST", 50)
+    keep_days = _setting("HISTORY_KEEP_DAYS", 180)
+    cutoff = (now or timezone.now()) - timedelta(days=keep_days) if keep_days is not None else None
+
+    # the historical id column is indexed, so this is a range scan over the distinct objects
+    object_ids = model.objects.order_by("id").values_list("id", flat=True).distinct()
+    if after is not None:
+        object_ids = object_ids.filter(id__gt=after)
+    object_ids = list(object_ids[:batch_size])
+
+    if not object_ids:
+        return None, 0, 0
+
+    fields = compared_fields(model)
+
+    snapshots = defaultdict(list)
+    for row in model.objects.filter(id__in=object_ids).order_by("id", "history_date", "history_id").values():
+        snapshots[row["id"]].append(row)
+
+    collapsed, expiring = [], []
+
+    for rows in snapshots.values():
+        dropped = set(collapsible(rows, fields))
+        collapsed.extend(dropped)
+
+        remaining = [row for row in rows if row["history_id"] not in dropped]
+        expired_ids = set(expired(remaining, keep_latest, cutoff))
+        expiring.extend(row for row in remaining if row["history_id"] in expired_ids)
+
+    if expiring:
+        # the file goes first: a failure afterwards leaves rows both archived and in the table, never neither
+        archive(model, expiring)
+
+    with transaction.atomic():
+        model.objects.filter(history_id__in=collapsed).delete()
+        model.objects.filter(history_id__in=[row["history_id"] for row in expiring]).delete()
+
+    last = object_ids[-1] if len(object_ids) == batch_size else None
+
+    return last, len(collapsed), len(expiring)
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from agily.models import Project
+
+
+class Command(BaseCommand):
+    help = "Recompute the story points, issue counts and active sprint kept on every project"
+
+    def handle(self, *args, **options):
+        updated = 0
+
+        for project in Project.objects.order_by("pk").iterator():
+            project.update_rollups()
+            updated += 1
+
+        self.stdout.write(f"{updated} projects updated")
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agily', '0006_soft_delete'),
+        ('attachments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='issueattachment',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='attachments.blob'),
+        ),
+        migrations.AddField(
+            model_name='issueattachment',
+            name='name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+SEVERITY_RANKS = {"critical": 0, "high": 1, "medium": 2, "low": 3}
+
+
+def set_severity_rank(apps, schema_editor):
+    Issue = apps.get_model("agily", "Issue")
+
+    # one UPDATE per severity
+    for severity, rank in SEVERITY_RANKS.items():
+        Issue.objects.filter(severity=severity).update(severity_rank=rank)
+    Issue.objects.exclude(severity__in=SEVERITY_RANKS).update(severity_rank=4)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agily', '0008_attachment_metadata'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='issue',
+            name='severity_rank',
+            field=models.PositiveSmallIntegerField(default=2, editable=False),
+        ),
+        migrations.RunPython(set_severity_rank, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='issue',
+            index=models.Index(fields=['project', 'status', 'severity_rank', '-created_at', '-id'], name='issue_project_status_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='issue',
+            index=models.Index(fields=['project', 'severity_rank', '-created_at', '-id'], name='issue_project_rank_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+INDEX_NAME = "issue_title_description_ft"
+
+
+def create_fulltext_index(apps, schema_editor):
+    # only MySQL has FULLTEXT indexes; agily.search falls back to icontains elsewhere
+    if schema_editor.connection.vendor != "mysql":
+        return
+
+    table = schema_editor.quote_name(apps.get_model("agily", "Issue")._meta.db_table)
+    schema_editor.execute(f"CREATE FULLTEXT INDEX {INDEX_NAME} ON {table} (title, description)")
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "mysql":
+        return
+
+    table = schema_editor.quote_name(apps.get_model("agily", "Issue")._meta.db_table)
+    schema_editor.execute(f"DROP INDEX {INDEX_NAME} ON {table}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agily", "0009_issue_severity_rank"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agily', '0010_issue_fulltext'),
+        ('sprints', '0012_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='active_sprint',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='sprints.sprint'),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='issue_counts',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='points_done',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='progress',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='story_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='total_points',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
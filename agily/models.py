@@ -1,10 +1,66 @@
+import base64
+import binascii
+
+from datetime import datetime
+
 from django.apps import apps
 from django.db import models
+from django.db.models import Count, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
 from django.conf import settings
+from agily import signals
+from agily.attachments.models import AttachmentModel
+from agily.workspaces.generations import bump_generation
 from agily.workspaces.models import Workspace
 
 
+class SoftDeleteQuerySet(models.QuerySet):
+    def _update_tombstones(self, queryset, deleted_at, signal):
+        if not signal.has_listeners(self.model):
+            return queryset.update(deleted_at=deleted_at)
+
+        pks = list(queryset.values_list("pk", flat=True))
+        updated = self.model._base_manager.filter(pk__in=pks).update(deleted_at=deleted_at)
+        signal.send(sender=self.model, pks=pks)
+
+        return updated
+
+    def soft_delete(self, deleted_at=None):
+        """Tombstone every row with a single UPDATE; ``purge_deleted`` removes them for good later.
+
+        A removal cascading over several tables passes the same deleted_at to all of them, so its rows can be told
+        apart from the ones removed before.
+        """
+        deleted_at = deleted_at or timezone.now()
+        return self._update_tombstones(self.filter(deleted_at__isnull=True), deleted_at, signals.post_soft_delete)
+
+    def restore(self):
+        return self._update_tombstones(self.filter(deleted_at__isnull=False), None, signals.post_restore)
+
+
+class SoftDeleteManager(models.Manager.from_queryset(SoftDeleteQuerySet)):
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
+class SoftDeleteModel(models.Model):
+    """Rows are tombstoned on removal: ``objects`` hides them, ``all_objects`` still sees them."""
+
+    class Meta:
+        abstract = True
+
+    # indexed on its own for the purge; the models add (parent, deleted_at) indexes for their listings
+    deleted_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    objects = SoftDeleteManager()
+    all_objects = SoftDeleteQuerySet.as_manager()
+
+    def is_deleted(self):
+        return self.deleted_at is not None
+
+
 class BaseModel(models.Model):
     class Meta:
         abstract = True
@@ -31,25 +87,17 @@ class BaseModel(models.Model):
         super().save(*args, **kwargs)
 
 
-class ModelWithProgress(models.Model):
+class ModelWithPoints(models.Model):
+    """Story points and progress of the stories pointing at the model through a field named after it."""
+
     class Meta:
         abstract = True
 
-    title = models.CharField(max_length=255, db_index=True)
-    description = models.TextField(blank=True, null=True)
-
-    created_at = models.DateTimeField(auto_now=True, db_index=True)
-    updated_at = models.DateTimeField(auto_now_add=True, db_index=True)
-    completed_at = models.DateTimeField(null=True, blank=True)
-
     total_points = models.PositiveIntegerField(default=0)
     story_count = models.PositiveIntegerField(default=0)
     points_done = models.PositiveIntegerField(default=0)
     progress = models.PositiveIntegerField(default=0)
 
-    def __str__(self):
-        return self.title
-
     def update_points_and_progress(self, save=True):
         Story = apps.get_model("stories", "Story")
         StoryState = apps.get_model("stories", "StoryState")
@@ -82,21 +130,121 @@ class ModelWithProgress(models.Model):
             self.save()
 
 
-class Project(models.Model):
+class ModelWithProgress(ModelWithPoints):
+    class Meta:
+        abstract = True
+
+    title = models.CharField(max_length=255, db_index=True)
+    description = models.TextField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.title
+
+
+class Project(SoftDeleteModel, ModelWithPoints):
+    # kept up to date by update_rollups, which the story, sprint and issue change handlers queue
+    ROLLUP_FIELDS = ["total_points", "story_count", "points_done", "progress", "issue_counts", "active_sprint"]
+
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     workspace = models.ForeignKey(Workspace, on_delete=models.CASCADE, related_name="projects")
 
+    # {status: {severity: number of issues}}
+    issue_counts = models.JSONField(default=dict, blank=True, editable=False)
+    active_sprint = models.ForeignKey(
+        "sprints.Sprint", on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name="+"
+    )
+
     class Meta:
         unique_together = ['name', 'workspace']
+        indexes = [
+            models.Index(fields=["workspace", "deleted_at"]),
+        ]
 
     def __str__(self):
         return self.name
 
+    def update_rollups(self):
+        """Recompute the story points, issue counts and active sprint, leaving the rest of the row alone."""
+        Sprint = apps.get_model("sprints", "Sprint")
+
+        self.update_points_and_progress(save=False)
+
+        counts = {}
+        for status, severity, n in self.issues.order_by().values_list("status", "severity").annotate(n=Count("id")):
+            counts.setdefault(status, {})[severity] = n
+        self.issue_counts = counts
+
+        started = Sprint.objects.filter(project=self, state=Sprint.STATE_STARTED)
+        self.active_sprint = started.order_by("-starts_at", "-id").first()
+
+        self.save(update_fields=self.ROLLUP_FIELDS)
+
+    def issue_table(self):
+        """[(status label, [count per severity, most severe first], total)] for the dashboard."""
+        severities = sorted(Issue.SEVERITY_RANKS, key=Issue.SEVERITY_RANKS.get)
+        rows = []
+
+        for status, label in Issue.STATUS_CHOICES:
+            counts = self.issue_counts.get(status, {})
+            row = [counts.get(severity, 0) for severity in severities]
+            rows.append((label, row, sum(counts.values())))
+
+        return rows
+
+
+ISSUE_PAGE_SIZE = 50
+
+
+def encode_issue_cursor(issue):
+    value = f"{issue.severity_rank},{issue.created_at.isoformat()},{issue.pk}"
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_issue_cursor(cursor):
+    """(severity_rank, created_at, pk) of the last issue of the previous page, or None for a garbled cursor."""
+    try:
+        rank, created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split(",")
+        return int(rank), datetime.fromisoformat(created_at), int(pk)
+    except (AttributeError, ValueError, UnicodeDecodeError, binascii.Error):
+        return None
+
+
+class IssueQuerySet(SoftDeleteQuerySet):
+    def ranked(self):
+        """Most severe first, then newest first: the order of the issue lists."""
+        return self.order_by("severity_rank", "-created_at", "-id")
+
+    def page(self, cursor=None, size=ISSUE_PAGE_SIZE):
+        """One page of ranked issues and the cursor of the next page (None on the last one).
+
+        Pages are cut on (severity_rank, created_at, id) rather than OFFSET, so every page is a range scan of
+        the (project, status, severity_rank, created_at) index however deep it is.
+        """
+        queryset = self.ranked()
+        position = decode_issue_cursor(cursor) if cursor else None
+
+        if position is not None:
+            rank, created_at, pk = position
+            queryset = queryset.filter(
+                Q(severity_rank__gt=rank)
+                | Q(severity_rank=rank, created_at__lt=created_at)
+                | Q(severity_rank=rank, created_at=created_at, id__lt=pk)
+            )
+
+        issues = list(queryset[: size + 1])
+        next_cursor = encode_issue_cursor(issues[size - 1]) if len(issues) > size else None
+
+        return issues[:size], next_cursor
 
-class Issue(models.Model):
+
+class Issue(SoftDeleteModel):
     STATUS_CHOICES = [
         ("open", "Open"),
         ("resolved", "Resolved"),
@@ -108,35 +256,96 @@ class Issue(models.Model):
         ("high", "High"),
         ("critical", "Critical"),
     ]
+    # stored in severity_rank so the lists can sort on an index: most severe first
+    SEVERITY_RANKS = {"critical": 0, "high": 1, "medium": 2, "low": 3}
+    UNKNOWN_SEVERITY_RANK = 4
+
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="issues")
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="open")
     severity = models.CharField(max_length=10, choices=SEVERITY_CHOICES, default="medium")
+    severity_rank = models.PositiveSmallIntegerField(default=SEVERITY_RANKS["medium"], editable=False)
     requester = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="requested_issues")
     assignee = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="assigned_issues")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = SoftDeleteManager.from_queryset(IssueQuerySet)()
+    all_objects = IssueQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["project", "deleted_at"]),
+            models.Index(
+                fields=["project", "status", "severity_rank", "-created_at", "-id"],
+                name="issue_project_status_rank_idx",
+            ),
+            models.Index(fields=["project", "severity_rank", "-created_at", "-id"], name="issue_project_rank_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # the project whose counters have to drop the issue if it moves
+        instance._loaded_project_id = instance.__dict__.get("project_id")
+        return instance
+
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # bulk_create() and update() skip this: they have to set severity_rank themselves
+        self.severity_rank = self.SEVERITY_RANKS.get(self.severity, self.UNKNOWN_SEVERITY_RANK)
 
-class IssueAttachment(models.Model):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "severity" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "severity_rank"}
+
+        super().save(*args, **kwargs)
+
+
+class IssueAttachment(AttachmentModel):
     issue = models.ForeignKey('Issue', on_delete=models.CASCADE, related_name="attachments")
     file = models.FileField(upload_to="issue_attachments/%Y/%m/%d/")
     description = models.CharField(max_length=255, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        if self.file:
-            return self.file.name.split("/")[-1]
-        return ""
-
-    def filename(self):
-        if self.file:
-            return self.file.name.split("/")[-1]
-        return ""
+        return self.filename()
 
     def get_absolute_url(self):
         return self.file.url
+
+
+@receiver(post_save, sender=Issue)
+@receiver(post_delete, sender=Issue)
+def handle_issue_change(sender, instance, **kwargs):
+    from agily.tasks import queue_project_rollups
+
+    # invalidates what agily.search cached about the workspace's issues
+    workspace_ids = Project._base_manager.filter(pk=instance.project_id).values_list("workspace_id", flat=True)
+    bump_generation(workspace_ids, "issues")
+
+    if not kwargs.get("raw", False):
+        queue_project_rollups([instance.project_id, getattr(instance, "_loaded_project_id", None)])
+        instance._loaded_project_id = instance.project_id
+
+
+@receiver(signals.post_soft_delete, sender=Issue)
+@receiver(signals.post_restore, sender=Issue)
+def handle_issue_tombstones(sender, pks, **kwargs):
+    from agily.tasks import queue_project_rollups
+
+    project_ids = set(Issue._base_manager.filter(pk__in=pks).values_list("project_id", flat=True))
+    workspace_ids = Project._base_manager.filter(pk__in=project_ids).values_list("workspace_id", flat=True)
+    bump_generation(workspace_ids, "issues")
+
+    queue_project_rollups(project_ids)
+
+
+@receiver(signals.post_soft_delete, sender=Project)
+@receiver(signals.post_restore, sender=Project)
+def handle_project_tombstones(sender, pks, **kwargs):
+    workspace_ids = Project._base_manager.filter(pk__in=pks).values_list("workspace_id", flat=True)
+    bump_generation(workspace_ids, "issues")
@@ -0,0 +1,32 @@
+from django.contrib import admin
+
+from agily.profiling.models import QueryFinding, RequestProfile
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "method", "path", "url_name", "status_code", "duration", "sql_count", "trigger")
+    list_filter = ("trigger", "method")
+    search_fields = ("path", "url_name")
+    exclude = ("stacks", "queries")
+    readonly_fields = [field.name for field in RequestProfile._meta.fields if field.name not in ("stacks", "queries")]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(QueryFinding)
+class QueryFindingAdmin(admin.ModelAdmin):
+    list_display = ("kind", "url_name", "template", "code", "requests", "queries_avg", "queries_max", "last_seen_at")
+    list_filter = ("kind",)
+    search_fields = ("url_name", "template", "code", "sql")
+    readonly_fields = [field.name for field in QueryFinding._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
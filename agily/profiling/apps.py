@@ -0,0 +1,20 @@
+from celery import signals as celery_signals
+from django.apps import AppConfig
+
+
+class ProfilingConfig(AppConfig):
+    name = "agily.profiling"
+    verbose_name = "Profiling"
+
+    def ready(self):
+        from agily import signals
+        from agily.profiling import metrics
+        from agily.profiling.timing import handle_cache_read
+
+        signals.cache_read.connect(handle_cache_read, dispatch_uid="server-timing")
+        signals.cache_read.connect(metrics.handle_cache_read, dispatch_uid="metrics")
+        signals.attachment_served.connect(metrics.handle_attachment_served, dispatch_uid="metrics")
+
+        celery_signals.before_task_publish.connect(metrics.handle_before_task_publish, weak=False)
+        celery_signals.worker_process_shutdown.connect(metrics.handle_worker_process_shutdown, weak=False)
+        celery_signals.worker_shutdown.connect(metrics.handle_worker_process_shutdown, weak=False)
@@ -0,0 +1,44 @@
+"""
+The Django template backend, timing the templates rendered for the current ``RequestTiming``.
+
+Django only sends its ``template_rendered`` signal under the test runner, so the timing hooks in where views get
+their templates from instead.
+"""
+
+import time
+
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates as BaseDjangoTemplates
+from django.template.backends.django import Template as BaseTemplate
+from django.template.backends.django import reraise
+
+from agily.profiling.timing import current
+
+
+class Template(BaseTemplate):
+    def render(self, context=None, request=None):
+        timing = current()
+
+        if timing is None:
+            return super().render(context, request)
+
+        started = time.perf_counter()
+        timing.rendering += 1
+
+        try:
+            return super().render(context, request)
+        finally:
+            timing.rendering -= 1
+            if not timing.rendering:
+                timing.template_time += time.perf_counter() - started
+
+
+class DjangoTemplates(BaseDjangoTemplates):
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from agily.profiling.models import QueryFinding
+
+
+class Command(BaseCommand):
+    help = "List the N+1 and duplicate queries the sampled requests ran into, most statements first"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=7, help="only findings seen in the last days")
+        parser.add_argument("--kind", choices=[kind for kind, _ in QueryFinding.KIND_CHOICES])
+        parser.add_argument("--url-name")
+        parser.add_argument("--limit", type=int, default=30)
+        parser.add_argument("--reset", action="store_true", help="forget every finding after the report")
+
+    def handle(self, *args, **options):
+        findings = QueryFinding.objects.filter(last_seen_at__gte=timezone.now() - timedelta(days=options["days"]))
+
+        if options["kind"]:
+            findings = findings.filter(kind=options["kind"])
+        if options["url_name"]:
+            findings = findings.filter(url_name=options["url_name"])
+
+        for finding in findings[: options["limit"]]:
+            where = " ".join(part for part in (finding.template, finding.code) if part) or "unknown origin"
+            self.stdout.write(
+                f"{finding.get_kind_display():<9} {finding.url_name or '?'}: {finding.queries_avg:.1f} statements "
+                f"per request (max {finding.queries_max}) in {finding.requests} requests, from {where}"
+            )
+            self.stdout.write(f"    {finding.sql[:300]}")
+
+        if not findings.exists():
+            self.stdout.write("No repeated queries found.")
+
+        if options["reset"]:
+            QueryFinding.objects.all().delete()
@@ -0,0 +1,276 @@
+"""
+Prometheus metrics of the web and worker processes.
+
+Every process counts in memory, and a background thread adds its counts to the ``MetricValue`` rows every
+``METRICS_FLUSH_INTERVAL`` seconds with ``F()`` updates, the way ``agily.taskapp.instrumentation`` keeps
+``TaskStat``: the table holds the totals of all the gunicorn and celery processes, whatever process a scrape lands
+on, and no request waits for the writes. Histograms only store the bucket each observation falls in; they are made
+cumulative when rendered. The gauges are read from the rollups when scraped.
+"""
+
+import logging
+import math
+import os
+import re
+import threading
+import time
+
+from collections import Counter, defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+METRICS = {
+    "agily_http_request_duration_seconds": ("histogram", "Time to answer a request, by URL name and method."),
+    "agily_db_queries_total": ("counter", "SQL statements sent while answering requests, by URL name."),
+    "agily_db_query_seconds_total": ("counter", "Time spent in SQL while answering requests, by URL name."),
+    "agily_cache_reads_total": ("counter", "Cache reads, by cached value and result (hit or miss)."),
+    "agily_attachment_bytes_served_total": ("counter", "Attachment bytes sent by the workers, archives included."),
+    "agily_celery_tasks_enqueued_total": ("counter", "Tasks published to the broker, by task name."),
+    "agily_sprints": ("gauge", "Sprints by state."),
+    "agily_sprints_due_for_transition": ("gauge", "Sprints whose dates call for a state they are not in yet."),
+    "agily_project_issues": ("gauge", "Issues by status and severity, from the project rollups."),
+    "agily_project_story_points": ("gauge", "Story points of the projects, total and done, from their rollups."),
+}
+
+HISTOGRAM_BUCKETS = {
+    "agily_http_request_duration_seconds": DURATION_BUCKETS,
+}
+
+HISTOGRAM_SUFFIXES = ("_bucket", "_sum", "_count")
+
+LE_RE = re.compile(r'(?:^|,)le="([^"]*)"')
+
+_lock = threading.Lock()
+_pending = defaultdict(float)
+_flusher = None
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def labels(**values):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in sorted(values.items()))
+
+
+def _start_flusher():
+    global _flusher
+
+    # a forked process doesn't inherit the thread: its first count starts one
+    if settings.METRICS_FLUSH_INTERVAL and (_flusher is None or not _flusher.is_alive()):
+        _flusher = threading.Thread(target=_flush_forever, name="metrics", daemon=True)
+        _flusher.start()
+
+
+def inc(name, amount=1, **label_values):
+    with _lock:
+        _pending[(name, labels(**label_values))] += amount
+        _start_flusher()
+
+
+def observe(name, value, **label_values):
+    # only the bucket value falls in: one row to update instead of one per bucket
+    le = next((le for le in HISTOGRAM_BUCKETS[name] if value <= le), "+Inf")
+
+    with _lock:
+        _pending[(f"{name}_bucket", labels(le=le, **label_values))] += 1
+        _pending[(f"{name}_sum", labels(**label_values))] += value
+        _pending[(f"{name}_count", labels(**label_values))] += 1
+        _start_flusher()
+
+
+def _add(name, label_string, amount):
+    from agily.profiling.models import MetricValue
+
+    series = MetricValue.objects.filter(name=name, labels=label_string)
+
+    if series.update(value=F("value") + amount):
+        return
+
+    try:
+        with transaction.atomic():
+            MetricValue.objects.create(name=name, labels=label_string, value=amount)
+    except IntegrityError:
+        # another process created the row in between
+        series.update(value=F("value") + amount)
+
+
+def flush():
+    """Add the counts of this process to the ``MetricValue`` rows."""
+    global _pending
+
+    with _lock:
+        pending, _pending = _pending, defaultdict(float)
+
+    failed, error = {}, None
+
+    for key, amount in pending.items():
+        if not amount:
+            continue
+        try:
+            _add(*key, amount)
+        except DatabaseError as e:
+            failed[key], error = amount, e
+
+    if failed:
+        # metrics must never break what they measure: kept for the next flush
+        logger.error("Could not store %d of %d metric series", len(failed), len(pending), exc_info=error)
+        with _lock:
+            for key, amount in failed.items():
+                _pending[key] += amount
+
+
+def _flush_forever():
+    while True:
+        time.sleep(settings.METRICS_FLUSH_INTERVAL)
+
+        try:
+            flush()
+        finally:
+            # the thread has a database connection of its own: don't leave it open between flushes
+            connection.close()
+
+
+def _after_fork():
+    global _lock, _pending
+
+    # the parent may have held the lock while forking; its counts are its own to flush
+    _lock = threading.Lock()
+    _pending = defaultdict(float)
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def observe_request(request, timing):
+    match = request.resolver_match
+    view = match.view_name if match else "unresolved"
+
+    observe("agily_http_request_duration_seconds", timing.elapsed(), view=view, method=request.method)
+    inc("agily_db_queries_total", timing.sql_count, view=view)
+    inc("agily_db_query_seconds_total", timing.sql_time, view=view)
+
+
+def handle_cache_read(sender, hit, **kwargs):
+    inc("agily_cache_reads_total", cache=sender, result="hit" if hit else "miss")
+
+
+def handle_attachment_served(sender, size, **kwargs):
+    inc("agily_attachment_bytes_served_total", size)
+
+
+def handle_before_task_publish(sender=None, **kwargs):
+    # sender is the task name
+    inc("agily_celery_tasks_enqueued_total", task=sender)
+
+
+def handle_worker_process_shutdown(**kwargs):
+    flush()
+
+
+def gauges():
+    """[(name, labels, value)] read from the sprints and the project rollups."""
+    Sprint = apps.get_model("sprints", "Sprint")
+    Project = apps.get_model("agily", "Project")
+
+    rows = []
+    states = dict(Sprint.STATE_TYPES)
+
+    for state, n in Sprint.objects.values_list("state").annotate(n=Count("id")).order_by():
+        rows.append(("agily_sprints", labels(state=states.get(state, state).lower()), n))
+
+    today = timezone.localdate()
+    due = Sprint.objects.due_to_start(today).count() + Sprint.objects.due_to_finish(today).count()
+    rows.append(("agily_sprints_due_for_transition", "", due))
+
+    issues = Counter()
+    for counts in Project.objects.values_list("issue_counts", flat=True):
+        for status, severities in counts.items():
+            for severity, n in severities.items():
+                issues[(status, severity)] += n
+
+    for (status, severity), n in sorted(issues.items()):
+        rows.append(("agily_project_issues", labels(status=status, severity=severity), n))
+
+    points = Project.objects.aggregate(total=Sum("total_points"), done=Sum("points_done"))
+    for kind in ("total", "done"):
+        rows.append(("agily_project_story_points", labels(kind=kind), points[kind] or 0))
+
+    return rows
+
+
+def _base_name(name):
+    for suffix in HISTOGRAM_SUFFIXES:
+        if name.endswith(suffix) and name[: -len(suffix)] in METRICS:
+            return name[: -len(suffix)]
+    return name
+
+
+def _sort_key(row):
+    name, label_string, _ = row
+    match = LE_RE.search(label_string)
+
+    if match is None:
+        return name, label_string, 0
+
+    # buckets in increasing order, +Inf last
+    le = match.group(1)
+    return name, LE_RE.sub("", label_string), math.inf if le == "+Inf" else float(le)
+
+
+def _format(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _cumulative(rows):
+    """rows with the bucket counts of the histograms made cumulative, every bucket included."""
+    buckets = defaultdict(Counter)
+    others = []
+
+    for name, label_string, value in rows:
+        match = LE_RE.search(label_string)
+        base = name[: -len("_bucket")]
+
+        if match is None or not name.endswith("_bucket") or base not in HISTOGRAM_BUCKETS:
+            others.append((name, label_string, value))
+            continue
+
+        # the labels around the le value
+        head, tail = label_string[: match.start(1)], label_string[match.end(1) :]
+        buckets[(base, head, tail)][match.group(1)] += value
+
+    for (base, head, tail), counts in buckets.items():
+        total = 0
+        for le in [*map(str, HISTOGRAM_BUCKETS[base]), "+Inf"]:
+            total += counts[le]
+            others.append((f"{base}_bucket", f"{head}{le}{tail}", total))
+
+    return others
+
+
+def render():
+    """Every metric in the Prometheus text format."""
+    from agily.profiling.models import MetricValue
+
+    series = defaultdict(list)
+    rows = _cumulative(MetricValue.objects.values_list("name", "labels", "value")) + gauges()
+
+    for name, label_string, value in sorted(rows, key=_sort_key):
+        sample = f"{name}{{{label_string}}}" if label_string else name
+        series[_base_name(name)].append(f"{sample} {_format(value)}")
+
+    lines = []
+
+    for name, (kind, help_text) in METRICS.items():
+        if series[name]:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", *series[name]]
+
+    return "\n".join(lines) + "\n"
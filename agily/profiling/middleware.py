@@ -0,0 +1,184 @@
+"""
+Request-level observers, each looking at a random fraction of the requests.
+
+``ProfilingMiddleware`` profiles a request that carries a valid token from ``make_token`` in the
+``X-Agily-Profile`` header, a request of a signed in staff member passing ``_profile=1``, or one drawn at random
+with probability ``PROFILING_SAMPLE_RATE``. The query parameter never takes the token, which would end up in
+access logs and Referer headers.
+
+``ServerTimingMiddleware`` is the exception: it times every request, cheaply, for its ``Server-Timing`` header
+(see ``agily.profiling.timing``) and the request metrics (see ``agily.profiling.metrics``).
+
+``QueryObserverMiddleware`` watches the SQL of ``QUERY_OBSERVER_SAMPLE_RATE`` of the requests for repeated
+statements (see ``agily.profiling.queries``), logs them and adds them to the ``QueryFinding`` totals.
+"""
+
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.db import DatabaseError, connection
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from agily.profiling import metrics
+from agily.profiling.models import QueryFinding, RequestProfile
+from agily.profiling.queries import QueryObserver
+from agily.profiling.sampler import Sampler, SQLTimeline
+from agily.profiling.timing import RequestTiming
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Agily-Profile"
+PROFILE_PARAM = "_profile"
+
+_signer = signing.TimestampSigner(salt="agily.profiling")
+
+
+def make_token():
+    return _signer.sign("profile")
+
+
+def check_token(token):
+    try:
+        return _signer.unsign(token, max_age=settings.PROFILING_TOKEN_MAX_AGE) == "profile"
+    except signing.BadSignature:
+        return False
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        trigger = self.trigger(request)
+
+        if trigger is None:
+            return self.get_response(request)
+
+        return self.profile(request, trigger)
+
+    def trigger(self, request):
+        token = request.headers.get(PROFILE_HEADER)
+        flag = request.GET.get(PROFILE_PARAM)
+
+        if token or flag:
+            if ("1" in (token, flag) and request.user.is_staff) or (token and check_token(token)):
+                return RequestProfile.TRIGGER_REQUESTED
+        elif settings.PROFILING_SAMPLE_RATE and random.random() < settings.PROFILING_SAMPLE_RATE:
+            return RequestProfile.TRIGGER_SAMPLED
+
+        return None
+
+    def profile(self, request, trigger):
+        started = time.perf_counter()
+        sampler = Sampler(settings.PROFILING_INTERVAL)
+        timeline = SQLTimeline(started)
+
+        sampler.start()
+        try:
+            with connection.execute_wrapper(timeline):
+                response = self.get_response(request)
+        finally:
+            sampler.stop()
+
+        duration = time.perf_counter() - started
+        match = request.resolver_match
+        user = request.user if request.user.is_authenticated else None
+
+        try:
+            profile = RequestProfile.objects.create(
+                trigger=trigger,
+                user=user,
+                method=request.method,
+                path=request.path[:255],
+                url_name=match.view_name if match else "",
+                status_code=response.status_code,
+                duration=round(duration * 1000, 2),
+                sql_count=timeline.count,
+                sql_time=round(timeline.time * 1000, 2),
+                samples=sampler.samples,
+                stacks=sampler.folded(),
+                queries=timeline.queries,
+            )
+        except DatabaseError:
+            # the profile must never break the request it describes
+            logger.exception("Could not store the profile of %s", request.path)
+        else:
+            if trigger == RequestProfile.TRIGGER_REQUESTED:
+                response["X-Agily-Profile-Id"] = str(profile.pk)
+
+        return response
+
+
+def record_findings(url_name, findings):
+    now = timezone.now()
+
+    for kind, key, shape, count in findings:
+        template, code = shape.locations.get(kind, ("", ""))
+        logger.warning(
+            "%s in %s: %d statements from %s %s: %s", kind, url_name or "?", count, template, code, shape.sql[:200]
+        )
+
+        finding, _ = QueryFinding.objects.get_or_create(
+            kind=kind, url_name=url_name, fingerprint=key, defaults=dict(sql=shape.sql, last_seen_at=now)
+        )
+        QueryFinding.objects.filter(pk=finding.pk).update(
+            requests=F("requests") + 1,
+            queries_total=F("queries_total") + count,
+            queries_max=Greatest(F("queries_max"), Value(count)),
+            template=template[:255],
+            code=code[:255],
+            last_seen_at=now,
+        )
+
+
+class QueryObserverMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.QUERY_OBSERVER_SAMPLE_RATE
+
+        if not rate or random.random() >= rate:
+            return self.get_response(request)
+
+        observer = QueryObserver(settings.QUERY_OBSERVER_THRESHOLD)
+
+        with connection.execute_wrapper(observer):
+            response = self.get_response(request)
+
+        findings = observer.findings()
+
+        if findings:
+            match = request.resolver_match
+            try:
+                record_findings(match.view_name if match else "", findings)
+            except DatabaseError:
+                logger.exception("Could not store the query findings of %s", request.path)
+
+        return response
+
+
+class ServerTimingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = RequestTiming()
+        token = timing.activate()
+
+        try:
+            with connection.execute_wrapper(timing):
+                response = self.get_response(request)
+        finally:
+            timing.deactivate(token)
+
+        response["Server-Timing"] = timing.header()
+
+        metrics.observe_request(request, timing)
+
+        return response
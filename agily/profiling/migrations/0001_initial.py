@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('trigger', models.CharField(choices=[('sampled', 'Sampled'), ('requested', 'Requested')], max_length=10)),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.CharField(max_length=255)),
+                ('url_name', models.CharField(blank=True, max_length=255)),
+                ('status_code', models.PositiveSmallIntegerField()),
+                ('duration', models.FloatField()),
+                ('sql_count', models.PositiveIntegerField(default=0)),
+                ('sql_time', models.FloatField(default=0)),
+                ('samples', models.PositiveIntegerField(default=0)),
+                ('stacks', models.TextField(blank=True)),
+                ('queries', models.JSONField(blank=True, default=list)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'request profile',
+                'verbose_name_plural': 'request profiles',
+                'ordering': ['-duration'],
+                'indexes': [models.Index(fields=['-duration'], name='profiling_r_duratio_891da0_idx'), models.Index(fields=['url_name', '-duration'], name='profiling_r_url_nam_e0560b_idx')],
+            },
+        ),
+    ]
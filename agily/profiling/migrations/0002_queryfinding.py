@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiling', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueryFinding',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('n+1', 'N+1'), ('duplicate', 'Duplicate')], max_length=10)),
+                ('url_name', models.CharField(blank=True, max_length=255)),
+                ('fingerprint', models.CharField(max_length=32)),
+                ('sql', models.TextField()),
+                ('template', models.CharField(blank=True, max_length=255)),
+                ('code', models.CharField(blank=True, max_length=255)),
+                ('requests', models.PositiveBigIntegerField(default=0)),
+                ('queries_total', models.PositiveBigIntegerField(default=0)),
+                ('queries_max', models.PositiveIntegerField(default=0)),
+                ('first_seen_at', models.DateTimeField(auto_now_add=True)),
+                ('last_seen_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'query finding',
+                'verbose_name_plural': 'query findings',
+                'ordering': ['-queries_total'],
+                'unique_together': {('kind', 'url_name', 'fingerprint')},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiling', '0002_queryfinding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricValue',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('labels', models.CharField(blank=True, max_length=255)),
+                ('value', models.FloatField(default=0)),
+            ],
+            options={
+                'verbose_name': 'metric value',
+                'verbose_name_plural': 'metric values',
+                'unique_together': {('name', 'labels')},
+            },
+        ),
+    ]
@@ -0,0 +1,125 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import models
+
+from agily.profiling.queries import KIND_DUPLICATE, KIND_N_PLUS_ONE
+
+
+class RequestProfile(models.Model):
+    """Call stacks sampled while one request ran, and the SQL it sent.
+
+    Written by ``agily.profiling.middleware.ProfilingMiddleware``; times are in milliseconds.
+    """
+
+    TRIGGER_SAMPLED = "sampled"
+    TRIGGER_REQUESTED = "requested"
+
+    TRIGGER_CHOICES = (
+        (TRIGGER_SAMPLED, "Sampled"),
+        (TRIGGER_REQUESTED, "Requested"),
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=255)
+    url_name = models.CharField(max_length=255, blank=True)
+    status_code = models.PositiveSmallIntegerField()
+
+    duration = models.FloatField()
+    sql_count = models.PositiveIntegerField(default=0)
+    sql_time = models.FloatField(default=0)
+
+    # "outer;...;inner count" lines, the folded format flamegraph.pl and speedscope read
+    samples = models.PositiveIntegerField(default=0)
+    stacks = models.TextField(blank=True)
+    # [[started at, duration, sql]], the first queries of the request only when it sent a great many
+    queries = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        ordering = ["-duration"]
+        indexes = [
+            models.Index(fields=["-duration"]),
+            models.Index(fields=["url_name", "-duration"]),
+        ]
+        verbose_name = "request profile"
+        verbose_name_plural = "request profiles"
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration:.0f} ms)"
+
+    def functions(self, limit=40):
+        """[(function, self samples, total samples)] of the functions seen most often at the top of the stack."""
+        own, total = Counter(), Counter()
+
+        for line in self.stacks.splitlines():
+            stack, _, count = line.rpartition(" ")
+            frames = stack.split(";")
+            own[frames[-1]] += int(count)
+            # recursion must not count a sample twice
+            for frame in set(frames):
+                total[frame] += int(count)
+
+        return [(frame, n, total[frame]) for frame, n in own.most_common(limit)]
+
+
+class MetricValue(models.Model):
+    """The cluster wide value of one Prometheus series, fed by ``agily.profiling.metrics``."""
+
+    name = models.CharField(max_length=100)
+    # rendered the way the text format wants them: method="GET",view="issue-list"
+    labels = models.CharField(max_length=255, blank=True)
+    value = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = ["name", "labels"]
+        verbose_name = "metric value"
+        verbose_name_plural = "metric values"
+
+    def __str__(self):
+        return f"{self.name}{{{self.labels}}}"
+
+
+class QueryFinding(models.Model):
+    """A statement some view repeats, with totals over all the requests it was seen in.
+
+    Rows are fed by ``agily.profiling.middleware.QueryObserverMiddleware`` with ``F()`` updates, so every worker
+    adds to the same figures; ``manage.py query_report`` lists them.
+    """
+
+    KIND_CHOICES = (
+        (KIND_N_PLUS_ONE, "N+1"),
+        (KIND_DUPLICATE, "Duplicate"),
+    )
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    url_name = models.CharField(max_length=255, blank=True)
+    fingerprint = models.CharField(max_length=32)
+    sql = models.TextField()
+
+    # where the statement came from when the repetition was last noticed
+    template = models.CharField(max_length=255, blank=True)
+    code = models.CharField(max_length=255, blank=True)
+
+    requests = models.PositiveBigIntegerField(default=0)
+    queries_total = models.PositiveBigIntegerField(default=0)
+    queries_max = models.PositiveIntegerField(default=0)
+
+    first_seen_at = models.DateTimeField(auto_now_add=True)
+    last_seen_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ["-queries_total"]
+        unique_together = ["kind", "url_name", "fingerprint"]
+        verbose_name = "query finding"
+        verbose_name_plural = "query findings"
+
+    def __str__(self):
+        return f"{self.get_kind_display()} in {self.url_name or '?'}"
+
+    @property
+    def queries_avg(self):
+        return self.queries_total / self.requests if self.requests else 0
@@ -0,0 +1,108 @@
+"""
+Finds the statements a request sends over and over.
+
+``QueryObserver`` is a database execute wrapper that fingerprints every statement: Django's SQL already has
+placeholders for the values, so the fingerprint only has to fold ``IN`` lists of any length and whitespace. Two
+kinds of findings come out of a request:
+
+- ``n+1``: one shape sent ``QUERY_OBSERVER_THRESHOLD`` times or more with different parameters, typically a
+  relation read inside a loop;
+- ``duplicate``: the very same statement and parameters sent more than once.
+
+For each of them the observer notes where the statement came from when the repetition is first noticed: the
+template line being rendered, and the innermost frame of the project's own code outside the middlewares.
+"""
+
+import hashlib
+import re
+import sys
+
+from collections import Counter
+
+from django.template.base import Node
+
+IN_LIST_RE = re.compile(r"\bIN \((?:%s, )*%s\)")
+SPACE_RE = re.compile(r"\s+")
+
+KIND_N_PLUS_ONE = "n+1"
+KIND_DUPLICATE = "duplicate"
+
+MAX_SQL_LENGTH = 2000
+
+_render_code = Node.render_annotated.__code__
+
+
+def fingerprint(sql):
+    shape = IN_LIST_RE.sub("IN (...)", SPACE_RE.sub(" ", sql.strip()))
+    return hashlib.md5(shape.encode()).hexdigest()
+
+
+def locate(frame):
+    """(template, code) of the statement executed under frame, e.g. ("stories/x.html:12", "agily.views:80")."""
+    template = code = ""
+
+    while frame is not None and not (template and code):
+        module = frame.f_globals.get("__name__", "")
+
+        # every request passes through the middlewares: they say nothing about where a statement came from
+        if not code and module.startswith("agily.") and "middleware" not in module:
+            code = f"{module}:{frame.f_lineno}"
+
+        if not template and frame.f_code is _render_code:
+            node = frame.f_locals.get("self")
+            origin, token = getattr(node, "origin", None), getattr(node, "token", None)
+            if origin is not None and token is not None:
+                template = f"{origin.template_name or origin.name}:{token.lineno}"
+
+        frame = frame.f_back
+
+    return template, code
+
+
+class Shape:
+    def __init__(self, sql):
+        self.sql = sql[:MAX_SQL_LENGTH]
+        self.count = 0
+        # how often each set of parameters was sent, by hash
+        self.params = Counter()
+        self.locations = {}
+
+
+class QueryObserver:
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.shapes = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        key = fingerprint(sql)
+        shape = self.shapes.get(key)
+
+        if shape is None:
+            shape = self.shapes[key] = Shape(sql)
+
+        sent_with = hash(repr(params))
+        shape.count += 1
+        shape.params[sent_with] += 1
+        sent = shape.params[sent_with]
+
+        # walking the stack is the expensive part: only once per kind and shape
+        if sent == 2 and KIND_DUPLICATE not in shape.locations:
+            shape.locations[KIND_DUPLICATE] = locate(sys._getframe(1))
+        if shape.count == self.threshold and KIND_N_PLUS_ONE not in shape.locations:
+            shape.locations[KIND_N_PLUS_ONE] = locate(sys._getframe(1))
+
+        return execute(sql, params, many, context)
+
+    def findings(self):
+        """[(kind, fingerprint, shape, number of statements)] of the repetitions seen."""
+        findings = []
+
+        for key, shape in self.shapes.items():
+            if shape.count >= self.threshold and len(shape.params) > 1:
+                findings.append((KIND_N_PLUS_ONE, key, shape, shape.count))
+
+            repeated = sum(n - 1 for n in shape.params.values())
+            if repeated:
+                findings.append((KIND_DUPLICATE, key, shape, repeated))
+
+        return findings
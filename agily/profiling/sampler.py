@@ -0,0 +1,86 @@
+"""
+The two recorders behind a request profile.
+
+``Sampler`` is a statistical profiler: a thread looks at the stack of the request's thread every
+``PROFILING_INTERVAL`` seconds and counts the stacks it sees, so the request pays nothing for the functions it
+calls, only a little for the thread switches. ``SQLTimeline`` is a database execute wrapper noting when each
+statement started and how long it took.
+"""
+
+import sys
+import threading
+import time
+
+from collections import Counter
+
+MAX_DEPTH = 128
+MAX_QUERIES = 1000
+MAX_SQL_LENGTH = 2000
+
+
+def frame_name(frame):
+    code = frame.f_code
+    # co_qualname is new in python 3.11
+    return f"{frame.f_globals.get('__name__', '?')}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def fold(frame):
+    """The stack of frame, outermost call first, as one "a;b;c" string."""
+    names = []
+
+    while frame is not None and len(names) < MAX_DEPTH:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+
+    return ";".join(reversed(names))
+
+
+class Sampler:
+    def __init__(self, interval, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[fold(frame)] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    @property
+    def samples(self):
+        return sum(self.stacks.values())
+
+    def folded(self):
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+class SQLTimeline:
+    def __init__(self, started=None):
+        self.started = started or time.perf_counter()
+        self.count = 0
+        self.time = 0
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.count += 1
+            self.time += duration
+
+            if len(self.queries) < MAX_QUERIES:
+                offset = started - self.started
+                self.queries.append([round(offset * 1000, 2), round(duration * 1000, 2), sql[:MAX_SQL_LENGTH]])
@@ -0,0 +1,14 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from agily.taskapp.celery import app
+
+from agily.profiling.models import RequestProfile
+
+
+@app.task(ignore_result=True)
+def prune_profiles():
+    cutoff = timezone.now() - timedelta(days=settings.PROFILING_RETENTION_DAYS)
+    RequestProfile.objects.filter(created_at__lt=cutoff).delete()
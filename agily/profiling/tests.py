@@ -0,0 +1,160 @@
+import time
+
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from agily.models import Issue, Project
+from agily.profiling import metrics
+from agily.profiling.middleware import PROFILE_HEADER, PROFILE_PARAM, make_token, record_findings
+from agily.profiling.models import QueryFinding, RequestProfile
+from agily.profiling.queries import KIND_DUPLICATE, KIND_N_PLUS_ONE, QueryObserver, Shape, fingerprint
+from agily.profiling.sampler import Sampler
+from agily.users.tests.factories import UserFactory
+from agily.workspaces.factories import WorkspaceFactory
+
+
+class ProfilingTest(TestCase):
+    def setUp(self):
+        self.user = UserFactory.create(is_staff=True)
+        self.client.force_login(self.user)
+
+    def test_requested_profile(self):
+        response = self.client.get(reverse("project-list"), HTTP_X_AGILY_PROFILE=make_token())
+
+        profile = RequestProfile.objects.get(pk=response[f"{PROFILE_HEADER}-Id"])
+        self.assertEqual(profile.url_name, "project-list")
+        self.assertEqual(profile.trigger, RequestProfile.TRIGGER_REQUESTED)
+        self.assertEqual(profile.sql_count, len(profile.queries))
+        self.assertGreater(profile.sql_count, 0)
+
+        response = self.client.get(reverse("profiling:profile-detail", args=[profile.pk]))
+        self.assertContains(response, "SQL timeline")
+
+    def test_only_valid_tokens_and_sampled_requests_are_profiled(self):
+        self.client.get(reverse("project-list"), HTTP_X_AGILY_PROFILE="forged")
+        self.assertFalse(RequestProfile.objects.exists())
+
+        # the token is only taken from the header, the query flag needs a staff session
+        self.client.logout()
+        self.client.get(reverse("project-list"), {PROFILE_PARAM: make_token()})
+        self.client.get(reverse("project-list"), {PROFILE_PARAM: "1"})
+        self.assertFalse(RequestProfile.objects.exists())
+
+        self.client.force_login(self.user)
+        self.client.get(reverse("project-list"), {PROFILE_PARAM: "1"})
+        self.assertEqual(RequestProfile.objects.get().trigger, RequestProfile.TRIGGER_REQUESTED)
+        RequestProfile.objects.all().delete()
+
+        with override_settings(PROFILING_SAMPLE_RATE=1.0):
+            self.client.get(reverse("project-list"))
+        self.assertEqual(RequestProfile.objects.get().trigger, RequestProfile.TRIGGER_SAMPLED)
+
+    def test_sampler(self):
+        sampler = Sampler(0.001)
+        sampler.start()
+        deadline = time.monotonic() + 5
+        while not sampler.samples and time.monotonic() < deadline:
+            sum(range(1000))
+        sampler.stop()
+
+        self.assertGreater(sampler.samples, 0)
+        # ProfilingTest.test_sampler from python 3.11, test_sampler before
+        self.assertRegex(sampler.folded(), r"agily\.profiling\.tests\.(ProfilingTest\.)?test_sampler")
+
+    def test_functions(self):
+        profile = RequestProfile(stacks="main;view;render 3\nmain;view 1\nmain;view;query;view 2")
+        # view is counted once per sample even where it recurses
+        self.assertEqual(profile.functions(), [("render", 3, 3), ("view", 3, 6)])
+
+
+class QueryObserverTest(TestCase):
+    def setUp(self):
+        workspace = WorkspaceFactory.create()
+        for n in range(3):
+            project = Project.objects.create(name=f"Project {n}", workspace=workspace)
+            Issue.objects.create(project=project, title=f"Issue {n}")
+
+    def test_findings(self):
+        observer = QueryObserver(threshold=3)
+
+        with connection.execute_wrapper(observer):
+            names = [issue.project.name for issue in Issue.objects.all()]
+            Issue.objects.count()
+            Issue.objects.count()
+
+        findings = {kind: (count, shape.locations[kind]) for kind, _, shape, count in observer.findings()}
+        self.assertEqual(len(names), 3)
+        self.assertEqual(findings[KIND_N_PLUS_ONE][0], 3)
+        self.assertTrue(findings[KIND_N_PLUS_ONE][1][1].startswith("agily.profiling.tests:"))
+        self.assertEqual(findings[KIND_DUPLICATE][0], 1)
+
+    def test_fingerprint_folds_in_lists(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s)"), fingerprint("SELECT * FROM t\n WHERE id IN (%s)")
+        )
+
+    def test_report(self):
+        record_findings("issue-list", [(KIND_N_PLUS_ONE, "abc", Shape("SELECT 1"), 4)])
+        record_findings("issue-list", [(KIND_N_PLUS_ONE, "abc", Shape("SELECT 1"), 6)])
+
+        finding = QueryFinding.objects.get()
+        self.assertEqual((finding.requests, finding.queries_total, finding.queries_max), (2, 10, 6))
+
+        out = StringIO()
+        call_command("query_report", stdout=out)
+        self.assertIn("N+1       issue-list: 5.0 statements per request (max 6) in 2 requests", out.getvalue())
+
+
+class ServerTimingTest(TestCase):
+    def test_header(self):
+        project = Project.objects.create(name="Web", workspace=WorkspaceFactory.create())
+        self.client.force_login(UserFactory.create())
+
+        response = self.client.get(reverse("issue-list", args=[project.pk]))
+
+        metrics = dict(metric.split(";", 1) for metric in response["Server-Timing"].split(", "))
+        self.assertEqual(set(metrics), {"db", "tpl", "cache", "view"})
+        self.assertRegex(metrics["db"], r'dur=[\d.]+;desc="SQL \(\d+ queries\)"')
+        self.assertNotEqual(metrics["tpl"], 'dur=0.0;desc="Templates"')
+        # the facets and the generation they are cached under
+        self.assertEqual(metrics["cache"], 'desc="Cache 0 hits / 2 misses"')
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        # what the other tests' requests counted
+        metrics._pending.clear()
+
+    def test_metrics(self):
+        Project.objects.create(name="Web", workspace=WorkspaceFactory.create(), issue_counts={"open": {"high": 2}})
+        self.client.force_login(UserFactory.create())
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+
+        self.client.get(reverse("project-list"))
+        metrics.handle_before_task_publish(sender="agily.tasks.compact_history")
+        metrics.flush()
+
+        self.client.force_login(UserFactory.create(is_staff=True))
+        response = self.client.get("/metrics")
+        lines = response.content.decode().splitlines()
+
+        self.assertIn("# TYPE agily_http_request_duration_seconds histogram", lines)
+        self.assertIn('agily_http_request_duration_seconds_count{method="GET",view="project-list"} 1', lines)
+        self.assertIn('agily_http_request_duration_seconds_bucket{le="+Inf",method="GET",view="project-list"} 1', lines)
+        self.assertIn('agily_http_request_duration_seconds_bucket{le="10",method="GET",view="project-list"} 1', lines)
+        self.assertIn('agily_celery_tasks_enqueued_total{task="agily.tasks.compact_history"} 1', lines)
+        self.assertIn('agily_project_issues{severity="high",status="open"} 2', lines)
+
+    def test_failed_series_are_kept(self):
+        metrics.inc("agily_attachment_bytes_served_total", 10)
+
+        with mock.patch.object(metrics, "_add", side_effect=DatabaseError("locked")), self.assertLogs(metrics.logger):
+            metrics.flush()
+        metrics.flush()
+
+        self.assertIn("agily_attachment_bytes_served_total 10", metrics.render().splitlines())
@@ -0,0 +1,74 @@
+"""
+Where the time of a request goes, for its ``Server-Timing`` header.
+
+``ServerTimingMiddleware`` makes a ``RequestTiming`` current for the request and wraps the database's execute
+with it; the template backend of ``agily.profiling.backends`` adds the rendering time of the templates and the
+``cache_read`` signal the cache hits and misses.
+"""
+
+import time
+
+from contextvars import ContextVar
+
+_current = ContextVar("request_timing", default=None)
+
+
+def current():
+    """The ``RequestTiming`` of the request being served, or None."""
+    return _current.get()
+
+
+class RequestTiming:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0
+        self.template_time = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # templates rendered while rendering another one are part of its time already
+        self.rendering = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_count += 1
+            self.sql_time += time.perf_counter() - started
+
+    def activate(self):
+        return _current.set(self)
+
+    @staticmethod
+    def deactivate(token):
+        _current.reset(token)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def header(self):
+        def ms(seconds):
+            return f"{seconds * 1000:.1f}"
+
+        total = self.elapsed()
+
+        return ", ".join(
+            [
+                f'db;dur={ms(self.sql_time)};desc="SQL ({self.sql_count} queries)"',
+                f'tpl;dur={ms(self.template_time)};desc="Templates"',
+                f'cache;desc="Cache {self.cache_hits} hits / {self.cache_misses} misses"',
+                f'view;dur={ms(total)};desc="Total"',
+            ]
+        )
+
+
+def handle_cache_read(sender, hit, **kwargs):
+    timing = current()
+
+    if timing is not None:
+        if hit:
+            timing.cache_hits += 1
+        else:
+            timing.cache_misses += 1
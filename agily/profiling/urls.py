@@ -0,0 +1,11 @@
+from django.urls import path
+
+from .views import profile_detail, profile_list, profile_stacks
+
+app_name = "profiling"
+
+urlpatterns = [
+    path("<int:pk>/", profile_detail, name="profile-detail"),
+    path("<int:pk>/stacks/", profile_stacks, name="profile-stacks"),
+    path("", profile_list, name="profile-list"),
+]
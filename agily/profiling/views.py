@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.db import transaction
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404, render
+from django.utils.crypto import constant_time_compare
+
+from agily.profiling import metrics
+from agily.profiling.middleware import PROFILE_HEADER, PROFILE_PARAM, make_token
+from agily.profiling.models import RequestProfile
+
+PROFILE_LIST_SIZE = 100
+
+staff_required = user_passes_test(lambda user: user.is_staff)
+
+
+@login_required
+@staff_required
+def profile_list(request):
+    """The slowest profiled requests, of one URL name when asked."""
+    profiles = RequestProfile.objects.defer("stacks", "queries").select_related("user")
+    url_name = request.GET.get("url_name", "")
+
+    if url_name:
+        profiles = profiles.filter(url_name=url_name)
+
+    url_names = RequestProfile.objects.order_by("url_name").values_list("url_name", flat=True).distinct()
+    context = {
+        "profiles": profiles[:PROFILE_LIST_SIZE],
+        "url_names": url_names,
+        "url_name": url_name,
+        "token": make_token(),
+        "profile_header": PROFILE_HEADER,
+        "profile_param": PROFILE_PARAM,
+    }
+
+    return render(request, "profiling/profile_list.html", context)
+
+
+@login_required
+@staff_required
+def profile_detail(request, pk):
+    profile = get_object_or_404(RequestProfile, pk=pk)
+    return render(request, "profiling/profile_detail.html", {"profile": profile, "functions": profile.functions()})
+
+
+@login_required
+@staff_required
+def profile_stacks(request, pk):
+    profile = get_object_or_404(RequestProfile, pk=pk)
+
+    response = HttpResponse(profile.stacks, content_type="text/plain; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="profile-{profile.pk}.folded"'
+
+    return response
+
+
+@transaction.non_atomic_requests
+def metrics_view(request):
+    """The Prometheus metrics, for staff or a scraper sending ``METRICS_TOKEN`` as its bearer token."""
+    token = settings.METRICS_TOKEN
+    provided = request.headers.get("Authorization", "").replace("Bearer ", "", 1)
+
+    if not (request.user.is_staff or (token and constant_time_compare(token, provided))):
+        return HttpResponse(status=403)
+
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,172 @@
+"""
+Issue search and facets.
+
+Every filter maps onto an indexed column: status and severity rank lead the issue indexes, project, assignee and
+requester are foreign keys, and the text search uses the FULLTEXT index on title and description under MySQL
+(other databases fall back to ``icontains``). The facet counts are one GROUP BY per facet, cached under the
+workspace's issue generation so any issue change in the workspace invalidates them.
+"""
+
+import hashlib
+import re
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import BooleanField, Count, F, Func, Q, Value
+
+from agily import signals
+from agily.models import Issue, Project
+from agily.workspaces.generations import get_generation
+
+GENERATION_SCOPE = "issues"
+
+FACETS = ("status", "severity", "project", "assignee", "requester")
+
+# what each facet filters and groups on
+FACET_FIELDS = {
+    "status": "status",
+    "severity": "severity_rank",
+    "project": "project_id",
+    "assignee": "assignee_id",
+    "requester": "requester_id",
+}
+
+WORD_RE = re.compile(r"\w+")
+
+
+class FullTextMatch(Func):
+    """MATCH (fields) AGAINST (query IN BOOLEAN MODE), usable as a filter."""
+
+    output_field = BooleanField()
+
+    def __init__(self, query, *fields):
+        super().__init__(*[F(field) for field in fields], Value(query))
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        *columns, query = [compiler.compile(expression) for expression in self.get_source_expressions()]
+
+        sql = "MATCH ({}) AGAINST ({} IN BOOLEAN MODE)".format(", ".join(sql for sql, _ in columns), query[0])
+        params = [param for _, column_params in columns for param in column_params] + list(query[1])
+
+        return sql, params
+
+
+def boolean_query(text):
+    """Every word required, as a prefix: "login err" -> "+login* +err*"."""
+    return " ".join(f"+{word}*" for word in WORD_RE.findall(text))
+
+
+def search_text(queryset, text):
+    words = WORD_RE.findall(text)
+
+    if not words:
+        return queryset
+
+    if connection.vendor == "mysql":
+        return queryset.filter(FullTextMatch(boolean_query(text), "title", "description"))
+
+    for word in words:
+        queryset = queryset.filter(Q(title__icontains=word) | Q(description__icontains=word))
+
+    return queryset
+
+
+def _facet_value(facet, value):
+    if facet == "severity":
+        return Issue.SEVERITY_RANKS.get(value)
+    if facet == "status":
+        return value if value in dict(Issue.STATUS_CHOICES) else None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def selected_facets(params):
+    """{facet: value} of the facets params filter on, with values checked and converted."""
+    selected = {}
+
+    for facet in FACETS:
+        value = _facet_value(facet, params.get(facet))
+        if value is not None:
+            selected[facet] = value
+
+    return selected
+
+
+def apply_facets(queryset, selected, exclude=None):
+    filters = {FACET_FIELDS[facet]: value for facet, value in selected.items() if facet != exclude}
+    return queryset.filter(**filters)
+
+
+def filter_issues(queryset, params):
+    return search_text(apply_facets(queryset, selected_facets(params)), params.get("q", ""))
+
+
+def _cache_key(workspace_id, scope, params):
+    # the facet part of params in a stable order, plus the text
+    selected = sorted(selected_facets(params).items())
+    fingerprint = hashlib.md5(repr((scope, selected, params.get("q", "").strip())).encode()).hexdigest()
+
+    return f"issue-facets:{workspace_id}:{get_generation(workspace_id, GENERATION_SCOPE)}:{fingerprint}"
+
+
+def count_facets(queryset, params):
+    """{facet: {value: count}}, each facet counted with the other facets applied but not its own.
+
+    That way the other values of a facet keep showing how many issues picking them would give.
+    """
+    selected = selected_facets(params)
+    queryset = search_text(queryset, params.get("q", ""))
+    counts = {}
+
+    for facet in FACETS:
+        field = FACET_FIELDS[facet]
+        rows = apply_facets(queryset, selected, exclude=facet).values_list(field).annotate(n=Count("id")).order_by()
+        counts[facet] = {value: n for value, n in rows if value is not None}
+
+    return counts
+
+
+def facets(queryset, params, workspace_id, scope=""):
+    """The facets to render for the issues of queryset (one workspace) filtered by params.
+
+    {facet: [(value, label, count, selected)]}, most frequent first. scope tells apart the querysets of the
+    same workspace that are cached separately (e.g. a project's list).
+    """
+    key = _cache_key(workspace_id, scope, params)
+    counts = cache.get(key)
+    signals.cache_read.send(sender="issue-facets", hit=counts is not None)
+
+    if counts is None:
+        counts = count_facets(queryset, params)
+        cache.set(key, counts, settings.ISSUE_FACETS_CACHE_TIMEOUT)
+
+    labels = {
+        "status": dict(Issue.STATUS_CHOICES),
+        "severity": {rank: dict(Issue.SEVERITY_CHOICES)[name] for name, rank in Issue.SEVERITY_RANKS.items()},
+        "project": dict(Project.objects.filter(pk__in=counts["project"]).values_list("pk", "name")),
+    }
+    users = get_user_model().objects.in_bulk(set(counts["assignee"]) | set(counts["requester"]))
+    labels["assignee"] = labels["requester"] = {pk: str(user) for pk, user in users.items()}
+
+    selected = selected_facets(params)
+    # links carry the severity by name, like the form
+    names = {"severity": {rank: name for name, rank in Issue.SEVERITY_RANKS.items()}}
+    result = {}
+
+    for facet in FACETS:
+        entries = [
+            (
+                names.get(facet, {}).get(value, value),
+                labels[facet].get(value, value),
+                n,
+                selected.get(facet) == value,
+            )
+            for value, n in counts[facet].items()
+        ]
+        result[facet] = sorted(entries, key=lambda entry: (-entry[2], str(entry[1])))
+
+    return result
@@ -0,0 +1,16 @@
+from django.dispatch import Signal
+
+# sent for the bulk paths that bypass the per row save/delete signals; the arguments are named after them
+
+# instances: the objects just inserted with bulk_create
+post_bulk_create = Signal()
+
+# pks: the rows just tombstoned / brought back by SoftDeleteQuerySet
+post_soft_delete = Signal()
+post_restore = Signal()
+
+# hit: whether a read of the cache found its key; sent by the code reading it, for the request timings
+cache_read = Signal()
+
+# size: bytes of attachment content a worker sent (not counting what a proxy sends for it)
+attachment_served = Signal()
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agily', '0005_alter_project_name_alter_project_unique_together'),
+        ('sprints', '0010_historicalsprint_project_sprint_project'),
+        ('workspaces', '0005_auto_20240302_1301'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sprint',
+            index=models.Index(fields=['state', 'starts_at', 'ends_at'], name='sprints_spr_state_68188a_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agily', '0006_soft_delete'),
+        ('sprints', '0011_sprint_state_schedule_index'),
+        ('workspaces', '0007_workspace_deleted_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicalsprint',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sprint',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='sprint',
+            index=models.Index(fields=['workspace', 'deleted_at'], name='sprints_spr_workspa_b9d1fa_idx'),
+        ),
+    ]
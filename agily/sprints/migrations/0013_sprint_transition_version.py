@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sprints", "0012_soft_delete"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="sprint",
+            name="transition_version",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,15 +1,30 @@
-import copy
+from datetime import datetime, time, timedelta
 
 from django.db import models
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.text import slugify
 
 from simple_history.models import HistoricalRecords
 
-from agily.models import ModelWithProgress, Project
+from agily.activity.tracking import TrackedModel
+from agily.models import ModelWithProgress, Project, SoftDeleteManager, SoftDeleteModel, SoftDeleteQuerySet
 
 
-class Sprint(ModelWithProgress):
+class SprintQuerySet(SoftDeleteQuerySet):
+    # both lookups are served by the (state, starts_at, ends_at) index, so the periodic sweep only reads the
+    # sprints that actually have to change
+
+    def due_to_start(self, today):
+        return self.filter(state=Sprint.STATE_UNSTARTED, starts_at__lte=today).exclude(ends_at__lt=today)
+
+    def due_to_finish(self, today):
+        return self.filter(state__in=[Sprint.STATE_UNSTARTED, Sprint.STATE_STARTED], ends_at__lt=today)
+
+
+class Sprint(TrackedModel, SoftDeleteModel, ModelWithProgress):
     """ """
 
     STATE_UNSTARTED = 0
@@ -31,6 +46,8 @@ class Sprint(ModelWithProgress):
             models.Index(fields=["starts_at"]),
             models.Index(fields=["ends_at"]),
             models.Index(fields=["title"]),
+            models.Index(fields=["state", "starts_at", "ends_at"]),
+            models.Index(fields=["workspace", "deleted_at"]),
         ]
         verbose_name = "sprint"
         verbose_name_plural = "sprints"
@@ -44,7 +61,22 @@ class Sprint(ModelWithProgress):
 
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="sprints", null=True, blank=True)
 
-    history = HistoricalRecords()
+    # bumped by every new schedule: only the transition task carrying the current version schedules the next one
+    transition_version = models.PositiveIntegerField(default=0, editable=False)
+
+    history = HistoricalRecords(excluded_fields=["transition_version"])
+
+    objects = SoftDeleteManager.from_queryset(SprintQuerySet)()
+    all_objects = SprintQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the loaded dates so the post_save handler can tell when the schedule has to change
+        instance._loaded_dates = (instance.__dict__.get("starts_at"), instance.__dict__.get("ends_at"))
+        # and when the active sprint of a project may have changed
+        instance._loaded_project = (instance.__dict__.get("project_id"), instance.__dict__.get("state"))
+        return instance
 
     def __str__(self):
         return self.title
@@ -58,8 +90,59 @@ class Sprint(ModelWithProgress):
     def is_started(self):
         return self.state == self.STATE_STARTED
 
+    def dates_changed(self):
+        return getattr(self, "_loaded_dates", None) != (self.starts_at, self.ends_at)
+
+    def project_changed(self):
+        return getattr(self, "_loaded_project", None) != (self.project_id, self.state)
+
+    def expected_state(self, today=None):
+        """The state this sprint should be in according to its dates."""
+        today = today or timezone.localdate()
+
+        if self.ends_at is not None and self.ends_at < today:
+            return self.STATE_DONE
+
+        if self.starts_at is not None and self.starts_at <= today:
+            return self.STATE_STARTED
+
+        return self.STATE_UNSTARTED
+
+    def next_transition_at(self, today=None):
+        """Aware datetime of the next midnight at which this sprint changes state, or None."""
+        today = today or timezone.localdate()
+        state = self.expected_state(today)
+
+        if state == self.STATE_UNSTARTED and self.starts_at is not None:
+            day = self.starts_at
+        elif state != self.STATE_DONE and self.ends_at is not None:
+            day = self.ends_at + timedelta(days=1)
+        else:
+            return None
+
+        return timezone.make_aware(datetime.combine(day, time.min))
+
     def duplicate(self):
-        cloned = copy.copy(self)
-        cloned.pk = None
-        cloned.title = "Copy of " + self.title
-        cloned.save()
+        from agily.cloning import clone_sprints
+
+        return clone_sprints([self])[0]
+
+
+@receiver(post_save, sender=Sprint)
+def handle_sprint_post_save(sender, **kwargs):
+    from .tasks import transition_sprint
+
+    if not kwargs.get("raw", False):
+        instance = kwargs["instance"]
+
+        # rollup saves don't touch the dates, so they don't need a new schedule
+        if kwargs.get("created") or instance.dates_changed():
+            instance._loaded_dates = (instance.starts_at, instance.ends_at)
+            transition_sprint.delay(instance.id)
+
+        if instance.project_changed():
+            from agily.tasks import queue_project_rollups
+
+            previous_project_id = getattr(instance, "_loaded_project", (None, None))[0]
+            instance._loaded_project = (instance.project_id, instance.state)
+            queue_project_rollups([instance.project_id, previous_project_id])
@@ -1,32 +1,101 @@
-from datetime import date
+from django.db import transaction
+from django.utils import timezone
 
 from agily.taskapp.celery import app
 
+from agily.cloning import update_rollups
 from agily.sprints.models import Sprint
 
 
 @app.task(ignore_result=True)
 def update_state():
-    # move to state=started all sprints that have began
-    Sprint.objects.filter(state=Sprint.STATE_UNSTARTED, ends_at__gte=date.today()).update(state=Sprint.STATE_STARTED)
-    # move to state=done all sprints that have finished
-    Sprint.objects.exclude(state=Sprint.STATE_DONE).filter(ends_at__lt=date.today()).update(state=Sprint.STATE_DONE)
+    # safety net for transitions whose eta task got lost: only the sprints that are due are touched.
+    # Finish first so a sprint whose whole date range is in the past goes straight to done
+    today = timezone.localdate()
+    due_to_finish = Sprint.objects.due_to_finish(today)
+    due_to_start = Sprint.objects.due_to_start(today)
+
+    # queryset updates skip the post_save handler that refreshes the projects' active sprint
+    project_ids = set(due_to_finish.values_list("project_id", flat=True))
+    project_ids.update(due_to_start.values_list("project_id", flat=True))
+
+    due_to_finish.update(state=Sprint.STATE_DONE)
+    due_to_start.update(state=Sprint.STATE_STARTED)
+
+    update_rollups(project_ids=project_ids)
 
 
 @app.task(ignore_result=True)
-def duplicate_sprints(sprint_ids):
-    for pk in sprint_ids:
+def transition_sprint(sprint_id, version=None):
+    """Apply the state the dates of the sprint call for and schedule the next transition.
+
+    Without a version (new dates, a restore...) a new schedule starts: the tasks left from the previous one carry an
+    older version and stop when they run, instead of rescheduling themselves alongside it.
+    """
+    with transaction.atomic():
         try:
-            sprint = Sprint.objects.get(pk=pk)
+            sprint = Sprint.objects.select_for_update().get(pk=sprint_id)
         except Sprint.DoesNotExist:
-            continue
+            return
+
+        if version is not None and version != sprint.transition_version:
+            return
+
+        today = timezone.localdate()
+        state = sprint.expected_state(today)
+
+        if state != sprint.state:
+            # a queryset update: this must not look like a date change to the post_save handler
+            Sprint.objects.filter(pk=sprint.pk).update(state=state)
+            update_rollups(project_ids=[sprint.project_id])
+
+        eta = sprint.next_transition_at(today)
+        # eager mode ignores the eta and would run the next transition right away, over and over
+        if eta is None or app.conf.task_always_eager:
+            return
+
+        version = sprint.transition_version + 1
+        Sprint.objects.filter(pk=sprint.pk).update(transition_version=version)
+        transaction.on_commit(lambda: transition_sprint.apply_async((sprint.pk, version), eta=eta))
+
+
+@app.task(ignore_result=True)
+def duplicate_sprints(sprint_ids):
+    from agily.cloning import clone_sprints
 
-        sprint.duplicate()
+    clone_sprints(Sprint.objects.filter(id__in=sprint_ids).order_by("pk"))
 
 
 @app.task(ignore_result=True)
 def remove_sprints(sprint_ids):
-    Sprint.objects.filter(id__in=sprint_ids).delete()
+    from agily.stories.models import Story
+
+    sprints = Sprint.objects.filter(id__in=sprint_ids)
+
+    project_ids = set(sprints.values_list("project_id", flat=True))
+    # the stories leave the sprint, as they did when it was deleted: restore_sprints takes them back
+    Story.objects.filter(sprint_id__in=sprint_ids).update(sprint=None)
+    sprints.soft_delete()
+
+    update_rollups(project_ids=project_ids)
+
+
+@app.task(ignore_result=True)
+def restore_sprints(sprint_ids, stories=None):
+    """Bring the sprints back, with the stories (``{sprint id: [story ids]}``) they had that are still without one."""
+    from agily.stories.models import Story
+
+    sprints = Sprint.all_objects.filter(id__in=sprint_ids)
+
+    project_ids = set(sprints.values_list("project_id", flat=True))
+    sprints.restore()
+    Story.objects.reattach("sprint_id", sprint_ids, stories or {})
+
+    update_rollups(sprint_ids=sprint_ids, project_ids=project_ids)
+
+    # transitions that came due while the sprints were removed
+    for sprint_id in sprint_ids:
+        transition_sprint.delay(sprint_id)
 
 
 @app.task(ignore_result=True)
@@ -42,8 +111,6 @@ def reset_sprint(story_ids):
     for sprint in Sprint.objects.filter(id__in=sprint_ids):
         sprint.update_points_and_progress()
 
-    update_state.delay()
-
 
 @app.task(ignore_result=True)
 def handle_sprint_change(epic_id):
@@ -53,4 +120,3 @@ def handle_sprint_change(epic_id):
         return
 
     sprint.update_points_and_progress()
-    update_state.delay()
@@ -1 +1,70 @@
-# Create your tests here.
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from agily.sprints.models import Sprint
+from agily.sprints.tasks import transition_sprint, update_state
+from agily.workspaces.factories import WorkspaceFactory
+
+
+class SprintStateTest(TestCase):
+    def setUp(self):
+        self.workspace = WorkspaceFactory.create()
+        self.today = timezone.localdate()
+
+    def create_sprint(self, starts_in, ends_in):
+        return Sprint.objects.create(
+            title="Sprint",
+            workspace=self.workspace,
+            starts_at=self.today + timedelta(days=starts_in),
+            ends_at=self.today + timedelta(days=ends_in),
+        )
+
+    def test_expected_state(self):
+        self.assertEqual(self.create_sprint(2, 10).expected_state(), Sprint.STATE_UNSTARTED)
+        self.assertEqual(self.create_sprint(-2, 10).expected_state(), Sprint.STATE_STARTED)
+        self.assertEqual(self.create_sprint(-10, -1).expected_state(), Sprint.STATE_DONE)
+
+    def test_next_transition_at(self):
+        sprint = self.create_sprint(2, 10)
+        self.assertEqual(sprint.next_transition_at().date(), sprint.starts_at)
+
+        sprint = self.create_sprint(-2, 10)
+        self.assertEqual(sprint.next_transition_at().date(), sprint.ends_at + timedelta(days=1))
+
+        self.assertIsNone(self.create_sprint(-10, -1).next_transition_at())
+
+    def test_state_is_applied_on_save(self):
+        sprint = self.create_sprint(-2, 10)
+        sprint.refresh_from_db()
+        self.assertEqual(sprint.state, Sprint.STATE_STARTED)
+
+        sprint.ends_at = self.today - timedelta(days=1)
+        sprint.save()
+        sprint.refresh_from_db()
+        self.assertEqual(sprint.state, Sprint.STATE_DONE)
+
+    def test_stale_transition_does_nothing(self):
+        sprint = self.create_sprint(-2, 10)
+        Sprint.objects.filter(pk=sprint.pk).update(state=Sprint.STATE_UNSTARTED, transition_version=3)
+
+        # scheduled for the dates the sprint had before
+        transition_sprint(sprint.pk, version=2)
+        self.assertEqual(Sprint.objects.get(pk=sprint.pk).state, Sprint.STATE_UNSTARTED)
+
+        transition_sprint(sprint.pk, version=3)
+        self.assertEqual(Sprint.objects.get(pk=sprint.pk).state, Sprint.STATE_STARTED)
+
+    def test_update_state_only_touches_due_sprints(self):
+        future = self.create_sprint(2, 10)
+        due = self.create_sprint(-2, 10)
+        finished = self.create_sprint(-10, -1)
+        Sprint.objects.update(state=Sprint.STATE_UNSTARTED)
+
+        update_state()
+
+        states = dict(Sprint.objects.values_list("id", "state"))
+        self.assertEqual(states[future.id], Sprint.STATE_UNSTARTED)
+        self.assertEqual(states[due.id], Sprint.STATE_STARTED)
+        self.assertEqual(states[finished.id], Sprint.STATE_DONE)
@@ -12,8 +12,9 @@ from agily.sprints.forms import SprintGroupByForm, SprintForm
 from agily.sprints.models import Sprint
 from agily.sprints.tasks import duplicate_sprints, remove_sprints, reset_sprint
 from agily.stories.forms import StoryFilterForm
+from agily.stories.models import Story
 from agily.stories.tasks import story_set_assignee, story_set_state
-from agily.utils import get_clean_next_url, get_referer_url
+from agily.utils import get_clean_next_url, get_referer_url, remember_removal
 from agily.views import BaseListView
 
 
@@ -26,6 +27,7 @@ class SprintDetailView(DetailView):
         queryset = (
             self.get_object()
             .story_set.select_related("requester", "assignee", "epic", "state")
+            .prefetch_related("tags")
             .order_by("epic__priority", "priority")
         )
 
@@ -60,7 +62,10 @@ class SprintDetailView(DetailView):
         url = get_referer_url(self.request)
 
         if self.request.POST.get("remove") == "yes":
-            remove_sprints.delay([self.get_object().id])
+            ids = [self.get_object().id]
+            stories = Story.objects.filter(sprint_id__in=ids).ids_by("sprint_id")
+            remove_sprints.delay(ids)
+            remember_removal(self.request, "sprints", ids, stories=stories)
             url = reverse_lazy("sprints:sprint-list", args=[self.kwargs["workspace"]])
 
         elif self.request.POST.get("sprint-reset") == "yes":
@@ -108,7 +113,9 @@ class SprintList(BaseListView):
 
         # Remove sprints in bulk
         if self.request.POST.get("remove") == "yes":
+            stories = Story.objects.filter(sprint_id__in=sprint_ids).ids_by("sprint_id")
             remove_sprints.delay(sprint_ids)
+            remember_removal(self.request, "sprints", sprint_ids, stories=stories)
 
         # Duplicate sprints in bulk
         if self.request.POST.get("duplicate") == "yes":
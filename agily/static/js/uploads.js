@@ -0,0 +1,115 @@
+// Resumable chunked uploads (see agily/attachments/uploads.py).
+//
+// Forms with a data-chunked-upload="<upload create url>" attribute send their selected files in chunks before
+// submitting; each finished upload is posted as a hidden "uploads" field instead of the file itself. A failed
+// chunk asks the server how far it got and carries on from there.
+(function () {
+  var TUS_VERSION = '1.0.0';
+  var RETRIES = 5;
+
+  function csrfToken(form) {
+    var input = form.querySelector('input[name="csrfmiddlewaretoken"]');
+    return input ? input.value : '';
+  }
+
+  function request(method, url, token, headers, body) {
+    headers = Object.assign({'Tus-Resumable': TUS_VERSION, 'X-CSRFToken': token}, headers);
+    return fetch(url, {method: method, headers: headers, body: body, credentials: 'same-origin'}).then(function (response) {
+      if (!response.ok) {
+        throw new Error(method + ' ' + url + ': ' + response.status);
+      }
+      return response;
+    });
+  }
+
+  function wait(ms) {
+    return new Promise(function (resolve) { setTimeout(resolve, ms); });
+  }
+
+  function sendChunks(url, token, file, offset, chunkSize, retries) {
+    if (offset >= file.size) {
+      return Promise.resolve();
+    }
+
+    var chunk = file.slice(offset, offset + chunkSize);
+    var headers = {'Content-Type': 'application/offset+octet-stream', 'Upload-Offset': String(offset)};
+
+    return request('PATCH', url, token, headers, chunk).then(function (response) {
+      return sendChunks(url, token, file, Number(response.headers.get('Upload-Offset')), chunkSize, RETRIES);
+    }, function (error) {
+      if (retries <= 0) {
+        throw error;
+      }
+      // ask where the server stands and resume from there
+      return wait(1000 * (RETRIES - retries + 1)).then(function () {
+        return request('HEAD', url, token, {});
+      }).then(function (response) {
+        return sendChunks(url, token, file, Number(response.headers.get('Upload-Offset')), chunkSize, retries - 1);
+      }, function () {
+        return sendChunks(url, token, file, offset, chunkSize, retries - 1);
+      });
+    });
+  }
+
+  function upload(createUrl, token, file) {
+    var headers = {
+      'Upload-Length': String(file.size),
+      'Upload-Metadata': 'filename ' + btoa(unescape(encodeURIComponent(file.name))),
+    };
+
+    return request('POST', createUrl, token, headers).then(function (response) {
+      var url = response.headers.get('Location');
+      var chunkSize = Number(response.headers.get('Upload-Chunk-Max'));
+
+      return sendChunks(url, token, file, 0, chunkSize, RETRIES).then(function () {
+        // the upload id is the last segment of its url
+        return url.replace(/\/$/, '').split('/').pop();
+      });
+    });
+  }
+
+  function handleSubmit(event) {
+    var form = event.target;
+    var inputs = Array.prototype.slice.call(form.querySelectorAll('input[type="file"]'));
+    var files = [];
+
+    inputs.forEach(function (input) {
+      files = files.concat(Array.prototype.slice.call(input.files));
+    });
+
+    if (files.length === 0) {
+      return;
+    }
+
+    event.preventDefault();
+
+    var token = csrfToken(form);
+    var buttons = form.querySelectorAll('button[type="submit"]');
+    buttons.forEach(function (button) { button.classList.add('is-loading'); });
+
+    files.reduce(function (previous, file) {
+      return previous.then(function () {
+        return upload(form.dataset.chunkedUpload, token, file).then(function (id) {
+          var hidden = document.createElement('input');
+          hidden.type = 'hidden';
+          hidden.name = 'uploads';
+          hidden.value = id;
+          form.appendChild(hidden);
+        });
+      });
+    }, Promise.resolve()).then(function () {
+      // the bytes are on the server already: do not send them again with the form
+      inputs.forEach(function (input) { input.value = ''; });
+      form.submit();
+    }, function (error) {
+      buttons.forEach(function (button) { button.classList.remove('is-loading'); });
+      alert('Upload failed, please try again. (' + error.message + ')');
+    });
+  }
+
+  document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('form[data-chunked-upload]').forEach(function (form) {
+      form.addEventListener('submit', handleSubmit);
+    });
+  });
+})();
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attachments', '0001_initial'),
+        ('stories', '0015_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storyattachment',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='attachments.blob'),
+        ),
+        migrations.AddField(
+            model_name='storyattachment',
+            name='name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
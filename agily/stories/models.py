@@ -1,7 +1,9 @@
-import copy
+import threading
+
+from contextlib import contextmanager
 
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.urls import reverse
@@ -10,7 +12,27 @@ from simple_history.models import HistoricalRecords
 
 from tagulous.models import TagField
 
-from agily.models import BaseModel, ModelWithProgress, Project
+from agily.activity.tracking import TrackedModel
+from agily.attachments.models import AttachmentModel
+from agily.models import BaseModel, ModelWithProgress, Project, SoftDeleteManager, SoftDeleteModel, SoftDeleteQuerySet
+
+_signals = threading.local()
+
+
+@contextmanager
+def story_signals_suppressed():
+    """Skip the per story rollup tasks of the save/delete handlers; the caller recomputes the parents itself."""
+    previous = getattr(_signals, "suppressed", False)
+    _signals.suppressed = True
+
+    try:
+        yield
+    finally:
+        _signals.suppressed = previous
+
+
+def story_signals_enabled():
+    return not getattr(_signals, "suppressed", False)
 
 
 class StateModel(models.Model):
@@ -44,7 +66,7 @@ class StoryState(StateModel):
     pass
 
 
-class Epic(ModelWithProgress):
+class Epic(TrackedModel, SoftDeleteModel, ModelWithProgress):
     """ """
 
     class Meta:
@@ -53,6 +75,7 @@ class Epic(ModelWithProgress):
         indexes = [
             models.Index(fields=["title", "priority"]),
             models.Index(fields=["title"]),
+            models.Index(fields=["workspace", "deleted_at"]),
         ]
         verbose_name = "epic"
         verbose_name_plural = "epics"
@@ -78,13 +101,9 @@ class Epic(ModelWithProgress):
         return False
 
     def duplicate(self):
-        cloned = copy.copy(self)
-        cloned.pk = None
-        cloned.title = "Copy of " + self.title
-        cloned.save()
+        from agily.cloning import clone_epics
 
-        for tag in self.tags.values_list("name", flat=True):
-            cloned.tags.add(tag)
+        return clone_epics([self])[0]
 
     def update_state(self):
         # set epic as started when it has one or more started stories
@@ -99,7 +118,62 @@ class Epic(ModelWithProgress):
         self.save()
 
 
-class Story(BaseModel):
+class StoryQuerySet(SoftDeleteQuerySet):
+    def parent_ids(self):
+        """The (epic ids, sprint ids, project ids) the stories belong to, read with a single query."""
+        rows = self.order_by().values_list("epic_id", "sprint_id", "project_id").distinct()
+
+        epic_ids, sprint_ids, project_ids = set(), set(), set()
+        for epic_id, sprint_id, project_id in rows:
+            epic_ids.add(epic_id)
+            sprint_ids.add(sprint_id)
+            project_ids.add(project_id)
+
+        epic_ids.discard(None)
+        sprint_ids.discard(None)
+        project_ids.discard(None)
+
+        return epic_ids, sprint_ids, project_ids
+
+    def ids_by(self, field):
+        """{parent id: [story ids]} grouped by ``field`` (epic_id, sprint_id), with string keys to fit a session."""
+        ids = {}
+        for story_id, parent_id in self.order_by().values_list("id", field):
+            ids.setdefault(str(parent_id), []).append(story_id)
+
+        return ids
+
+    def reattach(self, field, parent_ids, ids):
+        """Give back the parents in parent_ids their stories from an ``ids_by`` map, unless they have moved since."""
+        parent_ids = {str(pk) for pk in parent_ids}
+
+        for parent_id, story_ids in ids.items():
+            if parent_id in parent_ids:
+                self.filter(id__in=story_ids, **{field: None}).update(**{field: parent_id})
+
+    def delete(self):
+        """Hard delete the stories and recompute every epic, sprint and project they were in once.
+
+        The parents are read before the rows are gone, and the per story ``handle_story_change`` tasks the
+        post_delete handler would enqueue (only to find the story missing) are skipped.
+        """
+        from agily.cloning import update_rollups
+
+        with transaction.atomic():
+            epic_ids, sprint_ids, project_ids = self.parent_ids()
+
+            with story_signals_suppressed():
+                deleted = super().delete()
+
+            update_rollups(epic_ids=epic_ids, sprint_ids=sprint_ids, project_ids=project_ids)
+
+        return deleted
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+class Story(TrackedModel, SoftDeleteModel, BaseModel):
     """ """
 
     class Meta:
@@ -108,6 +182,7 @@ class Story(BaseModel):
         indexes = [
             models.Index(fields=["title", "priority"]),
             models.Index(fields=["title"]),
+            models.Index(fields=["workspace", "deleted_at"]),
         ]
         verbose_name = "story"
         verbose_name_plural = "stories"
@@ -134,6 +209,9 @@ class Story(BaseModel):
 
     history = HistoricalRecords()
 
+    objects = SoftDeleteManager.from_queryset(StoryQuerySet)()
+    all_objects = StoryQuerySet.as_manager()
+
     def get_absolute_url(self):
         return reverse("stories:story-detail", args=[self.workspace.slug, str(self.id)])
 
@@ -144,21 +222,14 @@ class Story(BaseModel):
         return False
 
     def duplicate(self):
-        cloned = copy.copy(self)
-        cloned.pk = None
-        cloned.title = "Copy of " + self.title
-        cloned.save()
-
-        for task in self.task_set.all():
-            task.duplicate(story=cloned)
+        from agily.cloning import clone_stories
 
-        for tag in self.tags.values_list("name", flat=True):
-            cloned.tags.add(tag)
+        return clone_stories([self])[0]
 
 
 @receiver(pre_save, sender=Story)
 def handle_story_pre_save(sender, **kwargs):
-    if not kwargs.get("raw", False):
+    if not kwargs.get("raw", False) and story_signals_enabled():
         instance = kwargs["instance"]
 
         if instance.id is None:
@@ -197,12 +268,23 @@ def handle_story_pre_save(sender, **kwargs):
             # one story less
             handle_sprint_change.apply_async((previous_sprint.id,), countdown=10)
 
+        if instance.id is not None:
+            from agily.tasks import queue_project_rollups
+
+            previous_project_id = (
+                Story._base_manager.filter(pk=instance.id).values_list("project_id", flat=True).first()
+            )
+
+            # the new project is updated by the post_save handler, like the epic and sprint
+            if previous_project_id != instance.project_id:
+                queue_project_rollups([previous_project_id])
+
 
 @receiver(post_save, sender=Story)
 def handle_story_post_save(sender, **kwargs):
     from .tasks import handle_story_change
 
-    if not kwargs.get("raw", False):
+    if not kwargs.get("raw", False) and story_signals_enabled():
         instance = kwargs["instance"]
         handle_story_change.delay(instance.id)
 
@@ -211,7 +293,7 @@ def handle_story_post_save(sender, **kwargs):
 def handle_story_post_delete(sender, **kwargs):
     from .tasks import handle_story_change
 
-    if not kwargs.get("raw", False):
+    if not kwargs.get("raw", False) and story_signals_enabled():
         instance = kwargs["instance"]
         handle_story_change.delay(instance.id)
 
@@ -225,27 +307,20 @@ class Task(BaseModel):
         return reverse("stories:task-view", args=[str(self.id)])
 
     def duplicate(self, parent=None):
-        cloned = copy.copy(self)
-        cloned.pk = None
-        cloned.title = self.title
-
-        if parent is not None:
-            cloned.story = parent
+        from agily.cloning import clone
 
-        cloned.save()
+        changes = dict(story_id=parent.pk) if parent is not None else {}
+        return clone(Task, [self], changes=lambda task: changes)[0]
 
 
-class StoryAttachment(models.Model):
+class StoryAttachment(AttachmentModel):
     story = models.ForeignKey(Story, on_delete=models.CASCADE, related_name="attachments")
     file = models.FileField(upload_to="story_attachments/%Y/%m/%d/")
     description = models.CharField(max_length=255, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return self.file.name.split("/")[-1]
-
-    def filename(self):
-        return self.file.name.split("/")[-1]
+        return self.filename()
 
     def get_absolute_url(self):
         return self.file.url
@@ -1,34 +1,33 @@
+from agily.cloning import clone_epics, clone_stories, update_rollups
 from agily.taskapp.celery import app
 
 from .models import Epic, EpicState, Story, StoryState
-from agily.sprints.tasks import update_state as update_sprint_state
 
 
 @app.task(ignore_result=True)
 def duplicate_stories(story_ids):
-    for pk in story_ids:
-        try:
-            story = Story.objects.get(pk=pk)
-        except Story.DoesNotExist:
-            continue
-
-        story.duplicate()
+    clone_stories(Story.objects.filter(id__in=story_ids).order_by("pk"))
 
 
 @app.task(ignore_result=True)
 def remove_stories(story_ids):
-    Story.objects.filter(id__in=story_ids).delete()
+    stories = Story.objects.filter(id__in=story_ids)
 
-    for epic in Epic.objects.filter(story__id__in=story_ids).distinct():
-        epic.update_state()
-        epic.update_points_and_progress()
+    # read the parents first: once tombstoned (or deleted) the stories no longer lead to them
+    epic_ids, sprint_ids, project_ids = stories.parent_ids()
+    stories.soft_delete()
 
-    from agily.sprints.models import Sprint
+    update_rollups(epic_ids=epic_ids, sprint_ids=sprint_ids, project_ids=project_ids)
 
-    for sprint in Sprint.objects.filter(story__id__in=story_ids).distinct():
-        sprint.update_points_and_progress()
 
-    update_sprint_state.delay()
+@app.task(ignore_result=True)
+def restore_stories(story_ids):
+    stories = Story.all_objects.filter(id__in=story_ids)
+
+    epic_ids, sprint_ids, project_ids = stories.parent_ids()
+    stories.restore()
+
+    update_rollups(epic_ids=epic_ids, sprint_ids=sprint_ids, project_ids=project_ids)
 
 
 @app.task(ignore_result=True)
@@ -48,23 +47,26 @@ def story_set_state(story_ids, state_slug):
         story.state = state
         story.save()
 
-    update_sprint_state.delay()
-
 
 @app.task(ignore_result=True)
 def duplicate_epics(epic_ids):
-    for pk in epic_ids:
-        try:
-            epic = Epic.objects.get(pk=pk)
-        except Epic.DoesNotExist:
-            continue
-
-        epic.duplicate()
+    clone_epics(Epic.objects.filter(id__in=epic_ids).order_by("pk"))
 
 
 @app.task(ignore_result=True)
 def remove_epics(epic_ids):
-    Epic.objects.filter(id__in=epic_ids).delete()
+    # the stories leave the epic, as they did when it was deleted: restore_epics takes them back
+    Story.objects.filter(epic_id__in=epic_ids).update(epic=None)
+    Epic.objects.filter(id__in=epic_ids).soft_delete()
+
+
+@app.task(ignore_result=True)
+def restore_epics(epic_ids, stories=None):
+    """Bring the epics back, with the stories (``{epic id: [story ids]}``) they had that are still without one."""
+    Epic.all_objects.filter(id__in=epic_ids).restore()
+    Story.objects.reattach("epic_id", epic_ids, stories or {})
+
+    update_rollups(epic_ids=epic_ids)
 
 
 @app.task(ignore_result=True)
@@ -117,7 +119,9 @@ def handle_story_change(story_id):
 
     if story.sprint is not None:
         story.sprint.update_points_and_progress()
-        update_sprint_state.delay()
+
+    if story.project is not None:
+        story.project.update_rollups()
 
 
 @app.task(ignore_result=True)
@@ -154,5 +158,3 @@ def story_set_sprint(story_ids, sprint_id):
     for story in Story.objects.filter(id__in=story_ids):
         story.sprint = sprint
         story.save()
-
-    update_sprint_state.delay()
@@ -1,7 +1,23 @@
-from django.test import TestCase
+import gzip
+import json
+import tempfile
+
+from datetime import timedelta
+from unittest import mock
+
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 
+from agily.cloning import update_rollups
+from agily.history import maintain
+from agily.sprints.models import Sprint
 from agily.stories.factories import StoryFactory
+from agily.stories.models import Epic, EpicState, Story, Task
+from agily.stories.tasks import duplicate_stories, remove_stories, restore_stories
+from agily.users.tests.factories import UserFactory
+from agily.workspaces.deletion import purge_deleted
 from agily.workspaces.factories import WorkspaceFactory
 
 
@@ -17,3 +33,162 @@ class StoryViewsTest(TestCase):
     def test_detail(self):
         response = self.client.get(self.story.get_absolute_url())
         self.assertEqual(response.status_code, 302)
+
+
+class StoryDuplicateTest(TestCase):
+    def setUp(self):
+        self.workspace = WorkspaceFactory.create()
+        self.epic = Epic.objects.create(title="Epic", workspace=self.workspace, state=EpicState.objects.first())
+        self.story = StoryFactory.create(workspace=self.workspace, epic=self.epic, points=3, tags="backend, ui")
+        Task.objects.bulk_create([Task(title="Task 1", story=self.story), Task(title="Task 2", story=self.story)])
+
+    def test_duplicate_story(self):
+        cloned = self.story.duplicate()
+
+        self.assertEqual(cloned.title, "Copy of " + self.story.title)
+        self.assertEqual(cloned.task_set.count(), 2)
+        self.assertEqual(sorted(cloned.tags.values_list("name", flat=True)), ["backend", "ui"])
+        self.assertEqual(cloned.history.count(), 1)
+
+        self.epic.refresh_from_db()
+        self.assertEqual(self.epic.story_count, 2)
+
+    def test_duplicate_stories_task(self):
+        duplicate_stories([self.story.id])
+        self.assertEqual(Story.objects.filter(epic=self.epic).count(), 2)
+        self.assertEqual(Story.tags.tag_model.objects.get(name="ui").count, 2)
+
+    def test_duplicate_epic_and_sprint_without_stories(self):
+        sprint = Sprint.objects.create(title="Sprint", workspace=self.workspace)
+        Story.objects.filter(pk=self.story.pk).update(sprint=sprint)
+        update_rollups(epic_ids=[self.epic.pk], sprint_ids=[sprint.pk])
+
+        for original in (Epic.objects.get(pk=self.epic.pk), Sprint.objects.get(pk=sprint.pk)):
+            self.assertEqual((original.story_count, original.total_points), (1, 3))
+
+            cloned = original.duplicate()
+            cloned.refresh_from_db()
+            self.assertEqual((cloned.story_count, cloned.total_points, cloned.progress), (0, 0, 0))
+
+
+class StorySoftDeleteTest(TestCase):
+    def setUp(self):
+        self.workspace = WorkspaceFactory.create()
+        self.epic = Epic.objects.create(title="Epic", workspace=self.workspace, state=EpicState.objects.first())
+        self.story = StoryFactory.create(workspace=self.workspace, epic=self.epic, points=3)
+        Task.objects.bulk_create([Task(title="Task", story=self.story)])
+
+    def test_remove_and_restore(self):
+        remove_stories([self.story.id])
+
+        self.assertFalse(Story.objects.filter(pk=self.story.pk).exists())
+        self.assertTrue(Story.all_objects.get(pk=self.story.pk).is_deleted())
+        self.epic.refresh_from_db()
+        self.assertEqual(self.epic.story_count, 0)
+
+        restore_stories([self.story.id])
+
+        self.assertTrue(Story.objects.filter(pk=self.story.pk).exists())
+        self.epic.refresh_from_db()
+        self.assertEqual(self.epic.story_count, 1)
+
+    def test_remove_and_restore_parents(self):
+        sprint = Sprint.objects.create(title="Sprint", workspace=self.workspace)
+        Story.objects.filter(pk=self.story.pk).update(sprint=sprint)
+        moved = StoryFactory.create(workspace=self.workspace, epic=self.epic)
+        other_epic = Epic.objects.create(title="Other", workspace=self.workspace, state=EpicState.objects.first())
+        self.client.force_login(UserFactory.create())
+
+        epic_list = reverse("stories:epic-list", args=[self.workspace.slug])
+        self.client.post(epic_list, {f"epic-{self.epic.pk}": "on", "remove": "yes"})
+        self.assertEqual(Story.objects.filter(epic__isnull=False).count(), 0)
+
+        # a story given another epic meanwhile stays there
+        Story.objects.filter(pk=moved.pk).update(epic=other_epic)
+        self.client.post(reverse("workspaces:undo-remove"))
+        self.assertEqual(Story.objects.get(pk=self.story.pk).epic, self.epic)
+        self.assertEqual(Story.objects.get(pk=moved.pk).epic, other_epic)
+        self.epic.refresh_from_db()
+        self.assertEqual(self.epic.story_count, 1)
+
+        self.client.post(reverse("sprints:sprint-detail", args=[self.workspace.slug, sprint.pk]), {"remove": "yes"})
+        self.assertIsNone(Story.objects.get(pk=self.story.pk).sprint)
+
+        self.client.post(reverse("workspaces:undo-remove"))
+        self.assertEqual(Story.objects.get(pk=self.story.pk).sprint, sprint)
+
+    def test_purge(self):
+        remove_stories([self.story.id])
+
+        purge_deleted(timezone.now() - timedelta(days=1))
+        self.assertTrue(Story.all_objects.filter(pk=self.story.pk).exists())
+
+        purge_deleted(timezone.now() + timedelta(seconds=1))
+        self.assertFalse(Story.all_objects.filter(pk=self.story.pk).exists())
+        self.assertFalse(Task.objects.filter(story_id=self.story.pk).exists())
+
+    def test_bulk_delete(self):
+        other = StoryFactory.create(workspace=self.workspace, epic=self.epic, points=2)
+
+        with mock.patch("agily.stories.tasks.handle_story_change.delay") as handle_story_change:
+            Story.objects.filter(pk__in=[self.story.pk, other.pk]).delete()
+
+        handle_story_change.assert_not_called()
+        self.epic.refresh_from_db()
+        self.assertEqual(self.epic.story_count, 0)
+        self.assertEqual(self.epic.total_points, 0)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class HistoryRetentionTest(TestCase):
+    def setUp(self):
+        workspace = WorkspaceFactory.create()
+        self.epic = Epic.objects.create(title="Epic", workspace=workspace, state=EpicState.objects.first())
+
+        for points in (1, 2, 3):
+            self.epic.total_points = points
+            self.epic.save()
+
+        self.epic.title = "Renamed"
+        self.epic.save()
+
+        self.epic.story_count = 4
+        self.epic.save()
+
+    @override_settings(HISTORY_KEEP_LATEST=None, HISTORY_KEEP_DAYS=None)
+    def test_collapse_rollup_only_snapshots(self):
+        self.assertEqual(self.epic.history.count(), 6)
+
+        last, collapsed, archived = maintain("stories.Epic")
+
+        self.assertIsNone(last)
+        self.assertEqual((collapsed, archived), (2, 0))
+        snapshots = self.epic.history.order_by("history_date").values_list("title", "total_points")
+        self.assertEqual(list(snapshots), [("Epic", 0), ("Epic", 1), ("Renamed", 3), ("Renamed", 3)])
+
+    @override_settings(HISTORY_KEEP_LATEST=None, HISTORY_KEEP_DAYS=None)
+    def test_collapse_sprint_snapshots(self):
+        # sprints have a field their history leaves out
+        sprint = Sprint.objects.create(title="Sprint", workspace=self.epic.workspace)
+        for points in (1, 2, 3):
+            sprint.total_points = points
+            sprint.save()
+
+        last, collapsed, archived = maintain("sprints.Sprint")
+
+        self.assertEqual((collapsed, archived), (1, 0))
+        snapshots = sprint.history.order_by("history_date").values_list("total_points", flat=True)
+        self.assertEqual(list(snapshots), [0, 1, 3])
+
+    @override_settings(HISTORY_KEEP_LATEST=2, HISTORY_KEEP_DAYS=0, HISTORY_ARCHIVE_PATH="archive")
+    def test_archive_expired_snapshots(self):
+        last, collapsed, archived = maintain("stories.Epic", now=timezone.now() + timedelta(seconds=1))
+
+        self.assertEqual((collapsed, archived), (2, 2))
+        self.assertEqual(self.epic.history.count(), 2)
+
+        directories, files = default_storage.listdir("archive/stories.historicalepic")
+        with default_storage.open("archive/stories.historicalepic/" + files[0]) as f:
+            rows = [json.loads(line) for line in gzip.decompress(f.read()).splitlines()]
+
+        self.assertEqual([row["total_points"] for row in rows], [0, 1])
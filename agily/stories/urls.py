@@ -11,6 +11,7 @@ from .views import (
     StoryUpdateView,
     upload_story_attachment,
     download_story_attachment,
+    download_story_attachments,
     delete_story_attachment,
 )
 
@@ -27,5 +28,6 @@ urlpatterns = [
     path("stories/", StoryList.as_view(), name="story-list"),
     path('stories/<int:pk>/attachments/upload/', upload_story_attachment, name='story-attachment-upload'),
     path('attachment/<int:pk>/download/', download_story_attachment, name='story-attachment-download'),
+    path('stories/<int:pk>/attachments/download/', download_story_attachments, name='story-attachments-download'),
     path('stories/attachment/<int:pk>/delete/', delete_story_attachment, name='story-attachment-delete'),
 ]
@@ -2,17 +2,19 @@ from itertools import groupby
 
 from django.contrib.auth.decorators import login_required
 from django.db.models import Max, F
-from django.http import HttpResponseRedirect, FileResponse, Http404
+from django.http import HttpResponseRedirect
 from django.urls import reverse_lazy, reverse
 from django.utils.decorators import method_decorator
 from django.views.generic.detail import DetailView
 from django.views.generic.edit import CreateView, UpdateView
 from django.shortcuts import get_object_or_404, redirect, render
 from django.contrib import messages
-import mimetypes
-import os
-from django.utils.encoding import smart_str
 
+from agily.activity.models import ChangeEvent
+from agily.attachments.archives import serve_zip
+from agily.attachments.bulk import create_attachments
+from agily.attachments.downloads import serve_attachment
+from agily.attachments.uploads import attach
 from agily.views import BaseListView
 from agily.sprints.models import Sprint
 from agily.stories.forms import EpicFilterForm, EpicGroupByForm, StoryFilterForm, EpicForm, StoryForm, StoryAttachmentForm
@@ -30,7 +32,9 @@ from agily.stories.tasks import (
     story_set_sprint,
     story_set_epic,
 )
-from agily.utils import get_clean_next_url, get_referer_url
+from agily.utils import get_clean_next_url, get_referer_url, remember_removal
+
+TIMELINE_SIZE = 10
 
 
 @method_decorator(login_required, name="dispatch")
@@ -74,7 +78,10 @@ class EpicDetailView(DetailView):
         params = self.request.POST
 
         if params.get("remove") == "yes":
-            remove_epics.delay([self.get_object().id])
+            ids = [self.get_object().id]
+            stories = Story.objects.filter(epic_id__in=ids).ids_by("epic_id")
+            remove_epics.delay(ids)
+            remember_removal(self.request, "epics", ids, stories=stories)
             url = reverse_lazy("stories:epic-list", args=[self.kwargs["workspace"]])
             return HttpResponseRedirect(url)
 
@@ -166,9 +173,8 @@ class StoryCreateView(StoryBaseView, CreateView):
         if form.is_valid():
             response = self.form_valid(form)
             # Handle file attachments
-            files = self.request.FILES.getlist('files')
-            for f in files:
-                StoryAttachment.objects.create(story=form.instance, file=f)
+            create_attachments(StoryAttachment, self.request.FILES.getlist("files"), story=form.instance)
+            attach(StoryAttachment, self.request.user, self.request.POST.getlist("uploads"), story=form.instance)
             return response
         else:
             return self.form_invalid(form)
@@ -209,9 +215,8 @@ class StoryUpdateView(StoryBaseView, UpdateView):
         if form.is_valid():
             response = self.form_valid(form)
             # Handle file attachments
-            files = self.request.FILES.getlist('files')
-            for f in files:
-                StoryAttachment.objects.create(story=form.instance, file=f)
+            create_attachments(StoryAttachment, self.request.FILES.getlist("files"), story=form.instance)
+            attach(StoryAttachment, self.request.user, self.request.POST.getlist("uploads"), story=form.instance)
             return response
         else:
             return self.form_invalid(form)
@@ -315,7 +320,9 @@ class EpicList(BaseListView):
 
         if len(epic_ids) > 0:
             if params.get("remove") == "yes":
+                stories = Story.objects.filter(epic_id__in=epic_ids).ids_by("epic_id")
                 remove_epics.delay(epic_ids)
+                remember_removal(self.request, "epics", epic_ids, stories=stories)
 
             if params.get("duplicate") == "yes":
                 duplicate_epics.delay(epic_ids)
@@ -386,6 +393,7 @@ class StoryList(BaseListView):
         if len(story_ids) > 0:
             if params.get("remove") == "yes":
                 remove_stories.delay(story_ids)
+                remember_removal(self.request, "stories", story_ids)
 
             elif params.get("duplicate") == "yes":
                 duplicate_stories.delay(story_ids)
@@ -424,13 +432,18 @@ class StoryDetailView(DetailView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["current_workspace"] = self.kwargs["workspace"]
+        events = ChangeEvent.objects.for_object(self.object).select_related("user")
+        context["events"], _ = events.page(size=TIMELINE_SIZE)
+        context["attachments"] = list(self.object.attachments.select_related("blob"))
         return context
 
     def post(self, *args, **kwargs):
         params = self.request.POST
 
         if params.get("remove") == "yes":
-            remove_stories.delay([self.get_object().id])
+            ids = [self.get_object().id]
+            remove_stories.delay(ids)
+            remember_removal(self.request, "stories", ids)
             url = reverse_lazy("stories:story-list", args=[self.kwargs["workspace"]])
             return HttpResponseRedirect(url)
 
@@ -440,6 +453,12 @@ class StoryDetailView(DetailView):
 
 def upload_story_attachment(request, workspace, pk):
     story = get_object_or_404(Story, pk=pk, workspace__slug=workspace)
+    if request.method == "POST" and request.POST.getlist("uploads"):
+        # files already sent through the resumable upload endpoint
+        description = request.POST.get("description", "")[:255]
+        attach(StoryAttachment, request.user, request.POST.getlist("uploads"), story=story, description=description)
+        messages.success(request, "Attachment uploaded successfully.")
+        return redirect(reverse("stories:story-detail", args=[workspace, pk]))
     if request.method == "POST":
         form = StoryAttachmentForm(request.POST, request.FILES)
         if form.is_valid():
@@ -454,21 +473,15 @@ def upload_story_attachment(request, workspace, pk):
 
 
 def download_story_attachment(request, workspace, pk):
-    from .models import StoryAttachment
-    try:
-        attachment = StoryAttachment.objects.get(pk=pk)
-    except StoryAttachment.DoesNotExist:
-        raise Http404
-
-    file_handle = attachment.file.open('rb')
-    filename = os.path.basename(attachment.file.name)
-    response = FileResponse(file_handle, content_type='application/octet-stream')
-    response['Content-Disposition'] = f'attachment; filename="{smart_str(filename)}"'
-    response['Content-Length'] = attachment.file.size
-    response['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
-    response['Pragma'] = 'no-cache'
-    response['Expires'] = '0'
-    return response
+    attachment = get_object_or_404(StoryAttachment, pk=pk)
+    return serve_attachment(request, attachment)
+
+
+@login_required
+def download_story_attachments(request, workspace, pk):
+    story = get_object_or_404(Story, pk=pk, workspace__slug=workspace)
+    attachments = story.attachments.order_by("uploaded_at", "pk")
+    return serve_zip(attachments, f"story-{story.pk}-attachments.zip", dedupe=request.GET.get("dedupe") == "1")
 
 
 def delete_story_attachment(request, workspace, pk):
@@ -0,0 +1,22 @@
+from django.contrib import admin
+
+from .models import TaskStat
+
+
+class TaskStatAdmin(admin.ModelAdmin):
+    list_display = (
+        "name",
+        "count",
+        "failures",
+        "latency_avg",
+        "latency_max",
+        "runtime_avg",
+        "runtime_max",
+        "queries_avg",
+        "queries_max",
+        "last_run_at",
+    )
+    search_fields = ["name"]
+
+
+admin.site.register(TaskStat, TaskStatAdmin)
@@ -32,6 +32,11 @@ class CeleryConfig(AppConfig):
         app.autodiscover_tasks(lambda: settings.INSTALLED_APPS, force=True)
         app.conf.task_always_eager = settings.CELERY_ALWAYS_EAGER
 
+        if getattr(settings, "TASK_STATS_ENABLED", True):
+            from agily.taskapp import instrumentation
+
+            instrumentation.install()
+
 
 @app.task(bind=True)
 def debug_task(self):
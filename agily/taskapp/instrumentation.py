@@ -0,0 +1,177 @@
+"""
+Per task name runtime figures collected from celery signals.
+
+``before_task_publish`` stamps every message with the time it was sent, ``task_prerun`` measures how long it
+waited in the queue and starts counting SQL queries, ``task_postrun`` records runtime, query count and outcome.
+
+Figures are buffered in the process and added to ``TaskStat`` rows every ``TASK_STATS_FLUSH_INTERVAL`` seconds,
+so the bookkeeping costs a handful of queries per interval instead of a few per task.
+"""
+
+import logging
+import threading
+import time
+
+from collections import defaultdict
+from datetime import datetime
+
+from celery import signals, states
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PUBLISHED_AT_HEADER = "agily_published_at"
+
+_lock = threading.Lock()
+_running = {}
+_pending = defaultdict(dict)
+_last_flush = time.monotonic()
+
+
+class QueryCounter:
+    """Database execute wrapper that only counts the statements going through it."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _to_timestamp(value):
+    if value is None:
+        return None
+
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+
+    if isinstance(value, datetime):
+        return value.timestamp()
+
+    return float(value)
+
+
+def queue_latency(request, now=None):
+    """Seconds a task spent waiting for a worker, or None when it was not published through the broker.
+
+    Tasks sent with a countdown/eta are measured from the moment they became due, not from publishing.
+    """
+    published_at = _to_timestamp(getattr(request, PUBLISHED_AT_HEADER, None))
+
+    if published_at is None:
+        return None
+
+    due_at = max(published_at, _to_timestamp(getattr(request, "eta", None)) or 0)
+
+    return max((now or time.time()) - due_at, 0)
+
+
+def record(name, runtime, queries, latency=None, failed=False):
+    with _lock:
+        stat = _pending[name]
+        stat["count"] = stat.get("count", 0) + 1
+        stat["failures"] = stat.get("failures", 0) + int(failed)
+        stat["runtime_total"] = stat.get("runtime_total", 0) + runtime
+        stat["runtime_max"] = max(stat.get("runtime_max", 0), runtime)
+        stat["queries_total"] = stat.get("queries_total", 0) + queries
+        stat["queries_max"] = max(stat.get("queries_max", 0), queries)
+
+        if latency is not None:
+            stat["latency_count"] = stat.get("latency_count", 0) + 1
+            stat["latency_total"] = stat.get("latency_total", 0) + latency
+            stat["latency_max"] = max(stat.get("latency_max", 0), latency)
+
+
+def flush(force=False):
+    """Add the buffered figures to the ``TaskStat`` table."""
+    global _last_flush, _pending
+
+    interval = getattr(settings, "TASK_STATS_FLUSH_INTERVAL", 10)
+
+    with _lock:
+        if not _pending or (not force and time.monotonic() - _last_flush < interval):
+            return
+
+        pending, _pending = _pending, defaultdict(dict)
+        _last_flush = time.monotonic()
+
+    from agily.taskapp.models import TaskStat
+
+    now = timezone.now()
+
+    for name, stat in pending.items():
+        changes = dict(
+            count=F("count") + stat["count"],
+            failures=F("failures") + stat["failures"],
+            runtime_total=F("runtime_total") + stat["runtime_total"],
+            runtime_max=Greatest(F("runtime_max"), Value(stat["runtime_max"])),
+            queries_total=F("queries_total") + stat["queries_total"],
+            queries_max=Greatest(F("queries_max"), Value(stat["queries_max"])),
+            last_run_at=now,
+        )
+
+        if "latency_count" in stat:
+            changes.update(
+                latency_count=F("latency_count") + stat["latency_count"],
+                latency_total=F("latency_total") + stat["latency_total"],
+                latency_max=Greatest(F("latency_max"), Value(stat["latency_max"])),
+            )
+
+        if stat["failures"]:
+            changes["last_failure_at"] = now
+
+        try:
+            TaskStat.objects.get_or_create(name=name)
+            TaskStat.objects.filter(name=name).update(**changes)
+        except DatabaseError:
+            # stats must never break the task that produced them
+            logger.exception("Could not store task stats for %s", name)
+
+
+def handle_before_task_publish(sender=None, headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault(PUBLISHED_AT_HEADER, time.time())
+
+
+def handle_task_prerun(task_id=None, task=None, **kwargs):
+    counter = QueryCounter()
+    connection.execute_wrappers.append(counter)
+
+    with _lock:
+        _running[task_id] = (time.monotonic(), queue_latency(task.request), counter)
+
+
+def handle_task_postrun(task_id=None, task=None, state=None, **kwargs):
+    with _lock:
+        try:
+            started_at, latency, counter = _running.pop(task_id)
+        except KeyError:
+            return
+
+    try:
+        connection.execute_wrappers.remove(counter)
+    except ValueError:
+        pass
+
+    record(task.name, time.monotonic() - started_at, counter.count, latency=latency, failed=state == states.FAILURE)
+    flush()
+
+
+def handle_worker_process_shutdown(**kwargs):
+    flush(force=True)
+
+
+def install():
+    signals.before_task_publish.connect(handle_before_task_publish, weak=False)
+    signals.task_prerun.connect(handle_task_prerun, weak=False)
+    signals.task_postrun.connect(handle_task_postrun, weak=False)
+    signals.worker_process_shutdown.connect(handle_worker_process_shutdown, weak=False)
+    signals.worker_shutdown.connect(handle_worker_process_shutdown, weak=False)
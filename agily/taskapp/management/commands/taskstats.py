@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from agily.taskapp.instrumentation import flush
+from agily.taskapp.models import TaskStat
+
+SORT_KEYS = {
+    "name": lambda stat: stat.name,
+    "count": lambda stat: -stat.count,
+    "failures": lambda stat: -stat.failures,
+    "latency": lambda stat: -stat.latency_avg,
+    "runtime": lambda stat: -stat.runtime_avg,
+    "queries": lambda stat: -stat.queries_avg,
+}
+
+
+class Command(BaseCommand):
+    help = "Summarize queue latency, runtime, query count and failures per celery task"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sort", choices=sorted(SORT_KEYS), default="runtime")
+        parser.add_argument("--reset", action="store_true", help="Delete the collected stats after printing them")
+
+    def handle(self, *args, **options):
+        flush(force=True)
+
+        stats = sorted(TaskStat.objects.all(), key=SORT_KEYS[options["sort"]])
+
+        if not stats:
+            self.stdout.write("No task stats collected yet.")
+            return
+
+        header = f"{'task':<48} {'runs':>8} {'fail':>6} {'wait avg':>9} {'wait max':>9} "
+        header += f"{'run avg':>9} {'run max':>9} {'sql avg':>8} {'sql max':>8}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+
+        for stat in stats:
+            self.stdout.write(
+                f"{stat.name:<48} {stat.count:>8} {stat.failures:>6} "
+                f"{stat.latency_avg:>8.3f}s {stat.latency_max:>8.3f}s "
+                f"{stat.runtime_avg:>8.3f}s {stat.runtime_max:>8.3f}s "
+                f"{stat.queries_avg:>8.1f} {stat.queries_max:>8}"
+            )
+
+        if options["reset"]:
+            TaskStat.objects.all().delete()
+            self.stdout.write(self.style.SUCCESS("Task stats reset."))
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskStat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('count', models.PositiveBigIntegerField(default=0)),
+                ('failures', models.PositiveBigIntegerField(default=0)),
+                ('latency_count', models.PositiveBigIntegerField(default=0)),
+                ('latency_total', models.FloatField(default=0)),
+                ('latency_max', models.FloatField(default=0)),
+                ('runtime_total', models.FloatField(default=0)),
+                ('runtime_max', models.FloatField(default=0)),
+                ('queries_total', models.PositiveBigIntegerField(default=0)),
+                ('queries_max', models.PositiveIntegerField(default=0)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('last_failure_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'task stat',
+                'verbose_name_plural': 'task stats',
+                'ordering': ['name'],
+            },
+        ),
+    ]
@@ -0,0 +1,64 @@
+from django.db import models
+
+
+class TaskStat(models.Model):
+    """Aggregated runtime figures for one celery task name.
+
+    Rows are fed by the signal handlers in ``agily.taskapp.instrumentation``; every worker buffers its own
+    numbers and adds them here with ``F()`` updates, so the table holds the totals of the whole cluster.
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+
+    count = models.PositiveBigIntegerField(default=0)
+    failures = models.PositiveBigIntegerField(default=0)
+
+    # seconds between the task being published (or its eta) and a worker picking it up
+    latency_count = models.PositiveBigIntegerField(default=0)
+    latency_total = models.FloatField(default=0)
+    latency_max = models.FloatField(default=0)
+
+    # seconds spent running the task body
+    runtime_total = models.FloatField(default=0)
+    runtime_max = models.FloatField(default=0)
+
+    queries_total = models.PositiveBigIntegerField(default=0)
+    queries_max = models.PositiveIntegerField(default=0)
+
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    last_failure_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["name"]
+        verbose_name = "task stat"
+        verbose_name_plural = "task stats"
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def latency_avg(self):
+        return self.latency_total / self.latency_count if self.latency_count else 0
+
+    @property
+    def runtime_avg(self):
+        return self.runtime_total / self.count if self.count else 0
+
+    @property
+    def queries_avg(self):
+        return self.queries_total / self.count if self.count else 0
+
+    def as_dict(self):
+        return dict(
+            name=self.name,
+            count=self.count,
+            failures=self.failures,
+            latency_avg=round(self.latency_avg, 4),
+            latency_max=round(self.latency_max, 4),
+            runtime_avg=round(self.runtime_avg, 4),
+            runtime_max=round(self.runtime_max, 4),
+            queries_avg=round(self.queries_avg, 2),
+            queries_max=self.queries_max,
+            last_run_at=self.last_run_at and self.last_run_at.isoformat(),
+            last_failure_at=self.last_failure_at and self.last_failure_at.isoformat(),
+        )
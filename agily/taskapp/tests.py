@@ -0,0 +1,46 @@
+import time
+
+from io import StringIO
+from types import SimpleNamespace
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from agily.stories.tasks import handle_epic_change
+from agily.taskapp.instrumentation import PUBLISHED_AT_HEADER, queue_latency
+from agily.taskapp.models import TaskStat
+
+
+@override_settings(TASK_STATS_FLUSH_INTERVAL=0)
+class TaskInstrumentationTest(TestCase):
+    def test_records_runtime_and_queries(self):
+        handle_epic_change.delay(0)
+
+        stat = TaskStat.objects.get(name="agily.stories.tasks.handle_epic_change")
+        self.assertEqual(stat.count, 1)
+        self.assertEqual(stat.failures, 0)
+        self.assertEqual(stat.queries_max, 1)
+
+    @override_settings(TASK_STATS_TOKEN="secret")
+    def test_metrics_token_is_only_read_from_the_header(self):
+        url = reverse("task-metrics")
+
+        self.assertEqual(self.client.get(url, {"token": "secret"}).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION="Bearer secret").status_code, 200)
+
+    def test_queue_latency_is_measured_from_eta(self):
+        now = time.time()
+        request = SimpleNamespace(**{PUBLISHED_AT_HEADER: now - 30, "eta": None})
+        self.assertAlmostEqual(queue_latency(request, now=now), 30)
+
+        request.eta = now - 5
+        self.assertAlmostEqual(queue_latency(request, now=now), 5)
+
+        self.assertIsNone(queue_latency(SimpleNamespace(), now=now))
+
+    def test_taskstats_command(self):
+        handle_epic_change.delay(0)
+        out = StringIO()
+        call_command("taskstats", stdout=out)
+        self.assertIn("agily.stories.tasks.handle_epic_change", out.getvalue())
@@ -0,0 +1,7 @@
+from django.urls import path
+
+from agily.taskapp.views import task_metrics
+
+urlpatterns = [
+    path("metrics/", task_metrics, name="task-metrics"),
+]
@@ -0,0 +1,45 @@
+import logging
+
+from django.db import transaction
+
+from agily.taskapp.celery import app
+
+logger = logging.getLogger(__name__)
+
+
+@app.task(ignore_result=True)
+def compact_history():
+    from agily.history import HISTORY_MODELS
+
+    for label in HISTORY_MODELS:
+        maintain_history.delay(label)
+
+
+@app.task(ignore_result=True)
+def maintain_history(label, after=None):
+    from agily.history import maintain
+
+    # one batch of objects per task: the next batch is queued behind whatever else is waiting
+    last, collapsed, archived = maintain(label, after=after)
+
+    if collapsed or archived:
+        logger.info("History of %s: %d snapshots collapsed, %d archived", label, collapsed, archived)
+
+    if last is not None:
+        maintain_history.delay(label, after=last)
+
+
+@app.task(ignore_result=True)
+def update_project_rollups(project_ids):
+    from agily.models import Project
+
+    for project in Project.objects.filter(id__in=project_ids):
+        project.update_rollups()
+
+
+def queue_project_rollups(project_ids):
+    """Recompute the rollups of the given projects once the current transaction commits."""
+    project_ids = sorted({pk for pk in project_ids if pk})
+
+    if project_ids:
+        transaction.on_commit(lambda: update_project_rollups.delay(project_ids))
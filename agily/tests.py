@@ -0,0 +1,142 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from agily.models import Issue, Project
+from agily.sprints.models import Sprint
+from agily.stories.models import Story, StoryState
+from agily.users.tests.factories import UserFactory
+from agily.workspaces.factories import WorkspaceFactory
+
+
+class IssueListTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.workspace = WorkspaceFactory.create()
+        self.project = Project.objects.create(name="Web", workspace=self.workspace)
+        other = Project.objects.create(name="Other", workspace=WorkspaceFactory.create())
+        Issue.objects.create(project=other, title="elsewhere", severity="critical")
+
+        for n, severity in enumerate(["low", "critical", "medium", "high", "critical"]):
+            Issue.objects.create(project=self.project, title=f"{severity} {n}", severity=severity)
+
+        self.client.force_login(UserFactory.create())
+
+    def test_severity_rank(self):
+        issue = Issue.objects.get(title="low 0")
+        self.assertEqual(issue.severity_rank, 3)
+
+        issue.severity = "high"
+        issue.save(update_fields=["severity"])
+        self.assertEqual(Issue.objects.get(pk=issue.pk).severity_rank, 1)
+
+    def test_keyset_pages(self):
+        issues = Issue.objects.filter(project=self.project)
+        first, cursor = issues.page(size=3)
+        second, last_cursor = issues.page(cursor, size=3)
+
+        self.assertEqual([issue.title for issue in first], ["critical 4", "critical 1", "high 3"])
+        self.assertEqual([issue.title for issue in second], ["medium 2", "low 0"])
+        self.assertIsNone(last_cursor)
+
+    def test_global_list_is_scoped_to_the_workspace(self):
+        session = self.client.session
+        session["current_workspace"] = self.workspace.slug
+        session.save()
+
+        response = self.client.get(reverse("global-issue-list"))
+
+        self.assertEqual(len(response.context["issues"]), 5)
+        self.assertNotContains(response, "elsewhere")
+
+    def test_search_and_facets(self):
+        Issue.objects.filter(title="high 3").update(description="Login button does nothing")
+        url = reverse("issue-list", args=[self.project.pk])
+
+        response = self.client.get(url, {"q": "login"})
+        self.assertEqual([issue.title for issue in response.context["issues"]], ["high 3"])
+
+        response = self.client.get(url, {"severity": "critical"}, HTTP_HX_REQUEST="true")
+        self.assertTemplateUsed(response, "projects/_issue_results.html")
+        self.assertEqual(len(response.context["issues"]), 2)
+        severities = {entry["label"]: entry["count"] for entry in response.context["facets"]["severity"]}
+        # a facet is counted without its own filter
+        self.assertEqual(severities, {"Critical": 2, "High": 1, "Medium": 1, "Low": 1})
+        self.assertEqual(response.context["facets"]["status"][0]["count"], 2)
+
+        # cached until an issue of the workspace changes
+        with self.assertNumQueries(7):
+            self.client.get(url, {"severity": "critical"}, HTTP_HX_REQUEST="true")
+        # bumped once the new issue is committed
+        with self.captureOnCommitCallbacks(execute=True):
+            Issue.objects.create(project=self.project, title="another", severity="critical")
+        response = self.client.get(url, {"severity": "critical"}, HTTP_HX_REQUEST="true")
+        self.assertEqual(response.context["facets"]["status"][0]["count"], 3)
+
+
+class ProjectRollupTest(TestCase):
+    def setUp(self):
+        self.workspace = WorkspaceFactory.create()
+        self.project = Project.objects.create(name="Web", workspace=self.workspace)
+
+    def test_rollups_follow_changes(self):
+        done, _ = StoryState.objects.update_or_create(slug="dn", defaults={"stype": StoryState.STATE_DONE})
+        todo, _ = StoryState.objects.update_or_create(slug="pl", defaults={"stype": StoryState.STATE_UNSTARTED})
+        Story.objects.create(title="a", workspace=self.workspace, project=self.project, state=done, points=3)
+        Story.objects.create(title="b", workspace=self.workspace, project=self.project, state=todo, points=5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Issue.objects.create(project=self.project, title="crash", severity="critical")
+            issue = Issue.objects.create(project=self.project, title="typo", severity="low")
+        with self.captureOnCommitCallbacks(execute=True):
+            issue.status = "closed"
+            issue.save()
+
+        today = timezone.localdate()
+        sprint = Sprint.objects.create(
+            title="Sprint 1",
+            workspace=self.workspace,
+            project=self.project,
+            starts_at=today - timedelta(days=1),
+            ends_at=today + timedelta(days=6),
+        )
+
+        self.project.refresh_from_db()
+        self.assertEqual((self.project.points_done, self.project.total_points, self.project.progress), (3, 8, 37))
+        self.assertEqual(self.project.issue_counts, {"open": {"critical": 1}, "closed": {"low": 1}})
+        self.assertEqual(self.project.active_sprint, sprint)
+
+        self.client.force_login(UserFactory.create())
+        # the request's savepoint and its release, session, user, and the project with its sprint
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse("project-detail", args=[self.project.pk]))
+        self.assertContains(response, "Sprint 1")
+        self.assertEqual(response.context["project"].issue_table()[0], ("Open", [1, 0, 0, 0], 1))
+
+    def test_remove_and_restore(self):
+        state, _ = StoryState.objects.update_or_create(slug="pl", defaults={"stype": StoryState.STATE_UNSTARTED})
+        story = Story.objects.create(title="a", workspace=self.workspace, project=self.project, state=state)
+        sprint = Sprint.objects.create(title="Sprint 1", workspace=self.workspace, project=self.project)
+        issue = Issue.objects.create(project=self.project, title="crash")
+        removed_before = Issue.objects.create(project=self.project, title="typo")
+        Issue.objects.filter(pk=removed_before.pk).soft_delete()
+
+        self.client.force_login(UserFactory.create())
+        response = self.client.post(reverse("project-detail", args=[self.project.pk]), {"remove": "yes"})
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_login(UserFactory.create(is_staff=True))
+        self.client.post(reverse("project-detail", args=[self.project.pk]), {"remove": "yes"})
+        self.assertFalse(Project.objects.filter(pk=self.project.pk).exists())
+        self.assertFalse(Story.objects.filter(pk=story.pk).exists())
+        self.assertFalse(Sprint.objects.filter(pk=sprint.pk).exists())
+
+        self.client.post(reverse("workspaces:undo-remove"))
+        self.assertTrue(Project.objects.filter(pk=self.project.pk).exists())
+        self.assertTrue(Story.objects.filter(pk=story.pk).exists())
+        self.assertTrue(Sprint.objects.filter(pk=sprint.pk).exists())
+        # only what went with the project comes back
+        self.assertEqual(list(Issue.objects.filter(project=self.project)), [issue])
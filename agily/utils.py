@@ -1,5 +1,9 @@
 from urllib.parse import unquote_plus, parse_qsl, urlencode, urlparse, urlunparse
 
+from django.contrib import messages
+
+UNDO_SESSION_KEY = "undo_removal"
+
 
 def get_clean_next_url(request, fallback_url):
     post_next_url = None
@@ -27,3 +31,39 @@ def get_clean_next_url(request, fallback_url):
 
 def get_referer_url(request):
     return request.META.get("HTTP_REFERER")
+
+
+def batched(queryset, batch_size):
+    """Yield lists of at most batch_size objects from queryset, paginating on the primary key.
+
+    Unlike OFFSET pagination every batch is an index range scan, and unlike ``iterator()`` no cursor is held
+    open between batches, so callers can write (and commit) while they go.
+    """
+    last_pk = None
+
+    while True:
+        page = queryset.order_by("pk")
+
+        if last_pk is not None:
+            page = page.filter(pk__gt=last_pk)
+
+        batch = list(page[:batch_size])
+
+        if not batch:
+            return
+
+        yield batch
+
+        last_pk = batch[-1].pk
+
+
+def remember_removal(request, kind, ids, **restore_kwargs):
+    """Keep the ids of the objects just removed in the session and offer to bring them back.
+
+    ``restore_kwargs`` are passed on to the restore task along with the ids.
+    """
+    ids = [int(pk) for pk in ids]
+    request.session[UNDO_SESSION_KEY] = dict(kind=kind, ids=ids, kwargs=restore_kwargs)
+
+    noun = kind if len(ids) != 1 else kind[:-1]
+    messages.success(request, f"{len(ids)} {noun} removed.", extra_tags="undo")
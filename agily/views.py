@@ -1,16 +1,21 @@
 from django.views.generic import ListView, DetailView, CreateView, UpdateView
 from django.urls import reverse_lazy
+from .attachments.archives import serve_zip
+from .attachments.bulk import create_attachments
+from .attachments.downloads import serve_attachment
+from .attachments.uploads import attach
 from .models import Project, Issue, IssueAttachment
+from .search import facets as search_facets, filter_issues, selected_facets
+from .utils import remember_removal
+from .workspaces.models import Workspace
+from .workspaces.tasks import remove_projects
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.utils.decorators import method_decorator
-from django.db.models import Q, Count, Max, Case, When
+from django.db.models import Q, Count, Max
 from django.shortcuts import render, get_object_or_404, redirect
 from .forms import IssueForm, IssueGlobalForm, ProjectForm, IssueAttachmentForm, IssueAttachmentFormSet, MultiIssueAttachmentForm
-from django.http import HttpResponseForbidden, FileResponse
+from django.http import HttpResponseForbidden
 from django.contrib import messages
-from django.db import models
-import os
-from django.utils.encoding import smart_str
 
 
 class BaseListView(ListView):
@@ -99,32 +104,112 @@ class ProjectDetailView(DetailView):
     template_name = "projects/project_detail.html"
     context_object_name = "project"
 
+    def get_queryset(self):
+        # the dashboard only shows the rollups kept on the row: a single query renders it
+        return Project.objects.select_related("workspace", "active_sprint")
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # the column headers of project.issue_table, most severe first
+        severities = sorted(Issue.SEVERITY_CHOICES, key=lambda choice: Issue.SEVERITY_RANKS[choice[0]])
+        context["severities"] = [label for _, label in severities]
+        return context
+
+    def post(self, request, *args, **kwargs):
+        # removing a project takes its stories, sprints and issues along: staff only, like adding one
+        if request.POST.get("remove") != "yes" or not request.user.is_staff:
+            return HttpResponseForbidden()
+
+        ids = [self.get_object().id]
+        remove_projects.delay(ids)
+        remember_removal(request, "projects", ids)
+        return redirect("project-list")
+
 @method_decorator(login_required, name="dispatch")
 class IssueListView(ListView):
+    """The issues of a project, or without ``project_id`` those of every project of the current workspace, ranked
+    by severity a keyset page at a time (see ``IssueQuerySet.page``), with the search and facets of
+    ``agily.search``.
+    """
+
     model = Issue
     template_name = "projects/issue_list.html"
     context_object_name = "issues"
 
+    def get(self, request, *args, **kwargs):
+        self.project = None
+        self.facets_scope = ""
+
+        if "project_id" in self.kwargs:
+            self.project = get_object_or_404(Project, id=self.kwargs["project_id"])
+            self.workspace_id = self.project.workspace_id
+            self.issues = Issue.objects.filter(project_id=self.project.pk)
+            self.facets_scope = f"project-{self.project.pk}"
+        else:
+            workspace_slug = request.session.get("current_workspace")
+            self.workspace_id = None
+            self.issues = Issue.objects.none()
+            if workspace_slug:
+                self.workspace_id = Workspace.objects.filter(slug=workspace_slug).values_list("id", flat=True).first()
+            if self.workspace_id is not None:
+                # a short list of ids, so each project's part is a range of the (project, ...) indexes
+                project_ids = Project.objects.filter(workspace_id=self.workspace_id).values_list("id", flat=True)
+                self.issues = Issue.objects.filter(project_id__in=list(project_ids))
+
+        return super().get(request, *args, **kwargs)
+
     def get_queryset(self):
-        project_id = self.kwargs["project_id"]
-        qs = Issue.objects.filter(project_id=project_id)
-        issue_id = self.request.GET.get("id")
-        if issue_id:
+        qs = filter_issues(self.issues, self.request.GET).select_related("project", "requester", "assignee")
+        issue_id = self.request.GET.get("id", "")
+        if issue_id.isdigit():
             qs = qs.filter(id=issue_id)
-        # Order by severity: critical > high > medium > low, then by created_at desc
-        severity_order = Case(
-            When(severity="critical", then=0),
-            When(severity="high", then=1),
-            When(severity="medium", then=2),
-            When(severity="low", then=3),
-            default=4,
-            output_field=models.IntegerField(),
-        )
-        return qs.order_by(severity_order, "-created_at")
+        return qs
+
+    def get_facets(self):
+        if self.workspace_id is None:
+            return {}
+
+        params = self.request.GET
+        facets = search_facets(self.issues, params, self.workspace_id, self.facets_scope)
+        links = {}
+
+        for facet, entries in facets.items():
+            links[facet] = []
+            for value, label, count, selected in entries:
+                query = params.copy()
+                query.pop("after", None)
+                # a selected value links back to the list without it
+                if selected:
+                    query.pop(facet, None)
+                else:
+                    query[facet] = value
+                links[facet].append({"label": label, "count": count, "selected": selected, "query": query.urlencode()})
+
+        return links
+
+    def is_fragment(self):
+        # filtering and paging swap the results only; boosted navigation still wants the whole page
+        return bool(self.request.headers.get("HX-Request") and not self.request.headers.get("HX-Boosted"))
+
+    def get_template_names(self):
+        if self.is_fragment():
+            return ["projects/_issue_results.html"]
+        return super().get_template_names()
 
     def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context["project"] = get_object_or_404(Project, id=self.kwargs["project_id"])
+        issues, next_cursor = self.object_list.page(self.request.GET.get("after"))
+        context = super().get_context_data(object_list=issues, **kwargs)
+
+        context["project"] = self.project
+        context["global_issues"] = self.project is None
+        context["facets"] = self.get_facets()
+        # the fragment also refreshes the hidden facet fields of the search form
+        context["oob"] = self.is_fragment()
+        context["selected_facets"] = [(facet, self.request.GET[facet]) for facet in selected_facets(self.request.GET)]
+        if next_cursor:
+            params = self.request.GET.copy()
+            params["after"] = next_cursor
+            context["next_page_query"] = params.urlencode()
         return context
 
 @method_decorator(login_required, name="dispatch")
@@ -153,8 +238,9 @@ class IssueCreateView(CreateView):
         if attachment_form.is_valid():
             files = self.request.FILES.getlist("files")
             description = attachment_form.cleaned_data.get("description", "")
-            for f in files:
-                IssueAttachment.objects.create(issue=self.object, file=f, description=description)
+            create_attachments(IssueAttachment, files, issue=self.object, description=description)
+            uploads = self.request.POST.getlist("uploads")
+            attach(IssueAttachment, self.request.user, uploads, issue=self.object, description=description)
         return response
 
     def get_success_url(self):
@@ -166,31 +252,9 @@ class IssueDetailView(DetailView):
     template_name = "projects/issue_detail.html"
     context_object_name = "issue"
 
-@method_decorator(login_required, name="dispatch")
-class IssueGlobalListView(ListView):
-    model = Issue
-    template_name = "projects/issue_list.html"
-    context_object_name = "issues"
-
-    def get_queryset(self):
-        qs = Issue.objects.all()
-        issue_id = self.request.GET.get("id")
-        if issue_id:
-            qs = qs.filter(id=issue_id)
-        severity_order = Case(
-            When(severity="critical", then=0),
-            When(severity="high", then=1),
-            When(severity="medium", then=2),
-            When(severity="low", then=3),
-            default=4,
-            output_field=models.IntegerField(),
-        )
-        return qs.order_by(severity_order, "-created_at")
-
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["project"] = None
-        context["global_issues"] = True
+        context["attachments"] = list(self.object.attachments.select_related("blob"))
         return context
 
 @method_decorator(login_required, name="dispatch")
@@ -218,8 +282,9 @@ class IssueGlobalCreateView(CreateView):
         if attachment_form.is_valid():
             files = self.request.FILES.getlist("files")
             description = attachment_form.cleaned_data.get("description", "")
-            for f in files:
-                IssueAttachment.objects.create(issue=self.object, file=f, description=description)
+            create_attachments(IssueAttachment, files, issue=self.object, description=description)
+            uploads = self.request.POST.getlist("uploads")
+            attach(IssueAttachment, self.request.user, uploads, issue=self.object, description=description)
         return response
 
     def get_success_url(self):
@@ -228,6 +293,12 @@ class IssueGlobalCreateView(CreateView):
 @login_required
 def upload_issue_attachment(request, pk):
     issue = get_object_or_404(Issue, pk=pk)
+    if request.method == "POST" and request.POST.getlist("uploads"):
+        # files already sent through the resumable upload endpoint
+        description = request.POST.get("description", "")[:255]
+        attach(IssueAttachment, request.user, request.POST.getlist("uploads"), issue=issue, description=description)
+        messages.success(request, "Attachment uploaded successfully.")
+        return redirect("issue-detail", project_id=issue.project_id, pk=issue.pk)
     if request.method == "POST":
         form = IssueAttachmentForm(request.POST, request.FILES)
         if form.is_valid():
@@ -235,7 +306,7 @@ def upload_issue_attachment(request, pk):
             attachment.issue = issue
             attachment.save()
             messages.success(request, "Attachment uploaded successfully.")
-            return redirect("issue-detail", pk=issue.pk)
+            return redirect("issue-detail", project_id=issue.project_id, pk=issue.pk)
     else:
         form = IssueAttachmentForm()
     return render(request, "projects/issue_attachment_form.html", {"form": form, "issue": issue})
@@ -243,12 +314,13 @@ def upload_issue_attachment(request, pk):
 @login_required
 def download_issue_attachment(request, pk):
     attachment = get_object_or_404(IssueAttachment, pk=pk)
-    file_handle = attachment.file.open('rb')
-    response = FileResponse(file_handle)
-    filename = os.path.basename(attachment.file.name)
-    response['Content-Disposition'] = f'attachment; filename="{smart_str(filename)}"'
-    response['Content-Length'] = attachment.file.size
-    return response
+    return serve_attachment(request, attachment)
+
+@login_required
+def download_issue_attachments(request, pk):
+    issue = get_object_or_404(Issue, pk=pk)
+    attachments = issue.attachments.order_by("uploaded_at", "pk")
+    return serve_zip(attachments, f"issue-{issue.pk}-attachments.zip", dedupe=request.GET.get("dedupe") == "1")
 
 @login_required
 def delete_issue_attachment(request, pk):
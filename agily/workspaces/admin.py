@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Workspace
+from .models import Workspace, WorkspaceJob
 
 
 class WorkspaceAdmin(admin.ModelAdmin):
@@ -10,3 +10,12 @@ class WorkspaceAdmin(admin.ModelAdmin):
 
 
 admin.site.register(Workspace, WorkspaceAdmin)
+
+
+class WorkspaceJobAdmin(admin.ModelAdmin):
+    list_display = ("kind", "description", "status", "progress", "done", "total", "created_at", "finished_at")
+    list_filter = ("kind", "status")
+    readonly_fields = ("workspace", "target_workspace")
+
+
+admin.site.register(WorkspaceJob, WorkspaceJobAdmin)
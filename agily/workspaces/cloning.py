@@ -0,0 +1,120 @@
+"""
+Deep copy of a workspace: projects, epics, sprints, stories, tasks, tags and attachment references.
+
+Every model is streamed in primary key batches of ``WORKSPACE_JOB_BATCH_SIZE`` rows, each committed on its
+own, so memory stays bounded and no lock is held for the whole copy. Only the id maps of projects, epics and
+sprints live for the whole job; story ids are remapped batch by batch. Attachments share the stored file of
+their original, only the rows are copied.
+"""
+
+import logging
+
+from django.conf import settings
+from django.db import transaction
+
+from agily.cloning import clone, copy_tags, copy_tasks, update_rollups
+from agily.models import Project
+from agily.sprints.models import Sprint
+from agily.stories.models import Epic, Story, StoryAttachment
+from agily.utils import batched
+
+logger = logging.getLogger(__name__)
+
+
+def _batch_size():
+    return getattr(settings, "WORKSPACE_JOB_BATCH_SIZE", 500)
+
+
+def _copy(job, model, queryset, changes, pk_map=None, after_batch=None):
+    for batch in batched(queryset, _batch_size()):
+        with transaction.atomic():
+            clones = clone(model, batch, changes=changes)
+            batch_map = {obj.pk: cloned.pk for obj, cloned in zip(batch, clones)}
+
+            if after_batch is not None:
+                after_batch(batch_map)
+
+        if pk_map is not None:
+            pk_map.update(batch_map)
+
+        job.advance(len(batch))
+
+
+def _copy_story_children(story_map):
+    copy_tags(Story, story_map)
+    copy_tasks(story_map)
+
+    attachments = StoryAttachment.objects.filter(story_id__in=list(story_map)).order_by("pk")
+    clone(StoryAttachment, attachments, changes=lambda attachment: dict(story_id=story_map[attachment.story_id]))
+
+
+def clone_workspace(job):
+    """Copy the content of job.workspace into job.target_workspace, reporting progress on job."""
+    from agily.sprints.tasks import transition_sprint
+
+    source, target = job.workspace, job.target_workspace
+
+    projects = Project.objects.filter(workspace=source)
+    epics = Epic.objects.filter(workspace=source)
+    sprints = Sprint.objects.filter(workspace=source)
+    stories = Story.objects.filter(workspace=source)
+
+    job.start(sum(queryset.count() for queryset in (projects, epics, sprints, stories)))
+
+    try:
+        project_map, epic_map, sprint_map = {}, {}, {}
+
+        # issues aren't cloned and the active sprint is the source's: update_rollups sets both at the end
+        _copy(
+            job,
+            Project,
+            projects,
+            lambda project: dict(workspace_id=target.pk, active_sprint_id=None, issue_counts={}),
+            pk_map=project_map,
+        )
+
+        _copy(
+            job,
+            Epic,
+            epics,
+            lambda epic: dict(workspace_id=target.pk),
+            pk_map=epic_map,
+            after_batch=lambda batch_map: copy_tags(Epic, batch_map),
+        )
+
+        _copy(
+            job,
+            Sprint,
+            sprints,
+            lambda sprint: dict(
+                workspace_id=target.pk, project_id=project_map.get(sprint.project_id, sprint.project_id)
+            ),
+            pk_map=sprint_map,
+        )
+
+        _copy(
+            job,
+            Story,
+            stories,
+            lambda story: dict(
+                workspace_id=target.pk,
+                project_id=project_map.get(story.project_id, story.project_id),
+                epic_id=epic_map.get(story.epic_id, story.epic_id),
+                sprint_id=sprint_map.get(story.sprint_id, story.sprint_id),
+            ),
+            after_batch=_copy_story_children,
+        )
+    except Exception as e:
+        logger.exception("Could not clone workspace %s into %s", source, target)
+        job.finish(error=str(e))
+        raise
+
+    update_rollups(project_ids=project_map.values())
+
+    # the copied sprints skipped the post_save handler that schedules their next state transition
+    for sprint_id in (
+        Sprint.objects.filter(workspace=target).exclude(state=Sprint.STATE_DONE).values_list("pk", flat=True)
+    ):
+        transition_sprint.delay(sprint_id)
+
+    job.finish()
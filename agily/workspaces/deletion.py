@@ -0,0 +1,208 @@
+"""
+Batched removal of workspaces and projects.
+
+A plain ``Workspace.delete()`` collects and deletes every story, epic, sprint, project, issue, attachment and
+history row in one transaction, sending per row signals on the way. Here the children are removed leaf-first in
+batches of ``WORKSPACE_JOB_BATCH_SIZE`` rows, each batch in its own short transaction, with raw DELETEs: the
+dependants every batch would cascade to (tasks, attachments, tag links, history rows) are deleted explicitly
+right before it, so no signal or collector work is needed. Attachment blobs lose a reference per deleted row,
+files from before blobs go once their last row is gone.
+"""
+
+import logging
+
+from collections import Counter
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F, Q
+
+from agily.activity.models import ChangeEvent
+from agily.attachments.models import Blob
+from agily.cloning import update_rollups
+from agily.models import Issue, IssueAttachment, Project
+from agily.sprints.models import Sprint
+from agily.stories.models import Epic, Story, StoryAttachment, Task
+from agily.workspaces.models import Workspace
+
+logger = logging.getLogger(__name__)
+
+
+def _batch_size():
+    return getattr(settings, "WORKSPACE_JOB_BATCH_SIZE", 500)
+
+
+def _raw_delete(queryset):
+    # QuerySet._raw_delete: a single DELETE ... WHERE, no collector and no signals
+    return queryset._raw_delete(queryset.db)
+
+
+def delete_tag_links(model, object_ids, field_name="tags"):
+    """Delete the tag through-rows of the given objects and keep the tagulous counters right."""
+    field = model._meta.get_field(field_name)
+    links = field.remote_field.through.objects.filter(**{field.m2m_field_name() + "_id__in": object_ids})
+
+    decrements = Counter(links.values_list(field.m2m_reverse_field_name() + "_id", flat=True))
+
+    if not decrements:
+        return
+
+    _raw_delete(links)
+
+    for amount in set(decrements.values()):
+        tag_ids = [tag_id for tag_id, count in decrements.items() if count == amount]
+        field.tag_model.objects.filter(pk__in=tag_ids).update(count=F("count") - amount)
+
+    # tagulous drops unprotected tags nobody uses any more
+    field.tag_model.objects.filter(pk__in=list(decrements), count__lte=0, protected=False).delete()
+
+
+def delete_history(model, object_ids):
+    if hasattr(model, "history"):
+        _raw_delete(model.history.model.objects.filter(id__in=object_ids))
+
+
+def delete_files(names):
+    """Delete the stored files no attachment row refers to any more (cloned workspaces share them)."""
+    names = set(names)
+    names -= set(StoryAttachment.objects.filter(file__in=names).values_list("file", flat=True))
+    names -= set(IssueAttachment.objects.filter(file__in=names).values_list("file", flat=True))
+
+    for name in names:
+        try:
+            default_storage.delete(name)
+        except OSError:
+            logger.warning("Could not delete attachment file %s", name)
+
+
+class Deletion:
+    """Removes the rows of a queryset in batches, running the dependant cleanup of every batch first."""
+
+    def __init__(self, job=None):
+        self.job = job
+        self.files = []
+
+    def delete_attachments(self, queryset):
+        rows = list(queryset.values_list("file", "blob_id"))
+
+        # blobs are shared and counted, collect_blobs deletes them; older rows own their file
+        Blob.objects.release(Counter(blob_id for name, blob_id in rows if blob_id is not None))
+        self.files.extend(name for name, blob_id in rows if blob_id is None)
+
+        _raw_delete(queryset)
+
+    def before_stories(self, ids):
+        self.delete_attachments(StoryAttachment.objects.filter(story_id__in=ids))
+        _raw_delete(Task._base_manager.filter(story_id__in=ids))
+        delete_tag_links(Story, ids)
+        delete_history(Story, ids)
+
+    def before_epics(self, ids):
+        # stories of other workspaces are only detached, as on_delete=SET_NULL would do
+        Story._base_manager.filter(epic_id__in=ids).update(epic=None)
+        delete_tag_links(Epic, ids)
+        delete_history(Epic, ids)
+
+    def before_sprints(self, ids):
+        Story._base_manager.filter(sprint_id__in=ids).update(sprint=None)
+        Project._base_manager.filter(active_sprint_id__in=ids).update(active_sprint=None)
+        delete_history(Sprint, ids)
+
+    def before_issues(self, ids):
+        self.delete_attachments(IssueAttachment.objects.filter(issue_id__in=ids))
+
+    def run(self, queryset, before=None):
+        model = queryset.model
+
+        while True:
+            with transaction.atomic():
+                ids = list(queryset.order_by("pk").values_list("pk", flat=True)[: _batch_size()])
+
+                if not ids:
+                    return
+
+                if before is not None:
+                    before(ids)
+
+                _raw_delete(model._base_manager.filter(pk__in=ids))
+
+            if self.files:
+                delete_files(self.files)
+                self.files = []
+
+            if self.job is not None:
+                self.job.advance(len(ids))
+
+    def run_all(self, steps):
+        self.job.start(sum(queryset.count() for queryset, before in steps))
+
+        try:
+            for queryset, before in steps:
+                self.run(queryset, before)
+        except Exception as e:
+            logger.exception("Could not finish %s", self.job)
+            self.job.finish(error=str(e))
+            raise
+
+
+def delete_workspace(job):
+    workspace_id = job.workspace_id
+    deletion = Deletion(job)
+
+    in_workspace = Q(workspace_id=workspace_id) | Q(project__workspace_id=workspace_id)
+
+    deletion.run_all(
+        [
+            (Story._base_manager.filter(in_workspace), deletion.before_stories),
+            (Epic._base_manager.filter(workspace_id=workspace_id), deletion.before_epics),
+            (Sprint._base_manager.filter(in_workspace), deletion.before_sprints),
+            (Issue._base_manager.filter(project__workspace_id=workspace_id), deletion.before_issues),
+            (Project._base_manager.filter(workspace_id=workspace_id), None),
+        ]
+    )
+
+    # the activity feed is bookkeeping, not part of the job's progress
+    Deletion().run(ChangeEvent.objects.filter(workspace_id=workspace_id))
+
+    # what is left (members, jobs pointing at it) is small enough for the regular collector
+    Workspace.all_objects.filter(pk=workspace_id).delete()
+    job.finish()
+
+
+def delete_project(job, project_id):
+    deletion = Deletion(job)
+
+    # the epics are workspace wide and outlive the project: remember them to fix their rollups afterwards
+    epic_ids = set(Story._base_manager.filter(project_id=project_id).values_list("epic_id", flat=True).distinct())
+
+    deletion.run_all(
+        [
+            (Story._base_manager.filter(project_id=project_id), deletion.before_stories),
+            (Sprint._base_manager.filter(project_id=project_id), deletion.before_sprints),
+            (Issue._base_manager.filter(project_id=project_id), deletion.before_issues),
+            (Project._base_manager.filter(pk=project_id), None),
+        ]
+    )
+
+    update_rollups(epic_ids=epic_ids)
+    job.finish()
+
+
+def purge_deleted(cutoff):
+    """Hard delete the rows tombstoned before cutoff."""
+    from agily.workspaces.models import WorkspaceJob
+
+    deletion = Deletion()
+
+    # tombstoned rows were already left out of the rollups when they were removed
+    deletion.run(Story.all_objects.filter(deleted_at__lt=cutoff), deletion.before_stories)
+    deletion.run(Epic.all_objects.filter(deleted_at__lt=cutoff), deletion.before_epics)
+    deletion.run(Sprint.all_objects.filter(deleted_at__lt=cutoff), deletion.before_sprints)
+    deletion.run(Issue.all_objects.filter(deleted_at__lt=cutoff), deletion.before_issues)
+
+    for project in Project.all_objects.filter(deleted_at__lt=cutoff):
+        job = WorkspaceJob.objects.create(
+            kind=WorkspaceJob.KIND_DELETE, workspace_id=project.workspace_id, description=project.name
+        )
+        delete_project(job, project.id)
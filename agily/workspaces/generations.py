@@ -0,0 +1,46 @@
+"""
+Per-workspace cache generations.
+
+Values cached from a workspace's rows put its generation in their key. Bumping the generation when those rows
+change makes every entry built from the old rows unreachable at once, without knowing or deleting their keys;
+the cache evicts them as they expire.
+"""
+
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from agily import signals
+
+
+def _key(workspace_id, scope):
+    return f"generation:{scope}:{workspace_id}"
+
+
+def get_generation(workspace_id, scope):
+    key = _key(workspace_id, scope)
+    generation = cache.get(key)
+    signals.cache_read.send(sender="generation", hit=generation is not None)
+
+    if generation is None:
+        # never set, or evicted: start from the clock so an evicted generation is never handed out again
+        cache.add(key, time.time_ns() // 1000, None)
+        generation = cache.get(key)
+
+    return generation
+
+
+def _bump(workspace_ids, scope):
+    for workspace_id in workspace_ids:
+        try:
+            cache.incr(_key(workspace_id, scope))
+        except ValueError:
+            # nothing cached under any generation of this workspace yet
+            pass
+
+
+def bump_generation(workspace_ids, scope):
+    # once the change is committed: a read in between would cache the old rows under the new generation
+    workspace_ids = set(workspace_ids)
+    transaction.on_commit(lambda: _bump(workspace_ids, scope))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspaces', '0006_workspacejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workspace',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='workspacejob',
+            name='kind',
+            field=models.CharField(choices=[('clone', 'Clone'), ('delete', 'Delete')], max_length=20),
+        ),
+    ]
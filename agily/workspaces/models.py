@@ -2,6 +2,18 @@ import copy
 
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
+
+class WorkspaceQuerySet(models.QuerySet):
+    def mark_deleted(self):
+        """Hide the workspaces right away; ``remove_workspaces`` deletes their content afterwards."""
+        return self.filter(deleted_at__isnull=True).update(deleted_at=timezone.now())
+
+
+class WorkspaceManager(models.Manager.from_queryset(WorkspaceQuerySet)):
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
 
 
 class Workspace(models.Model):
@@ -18,6 +30,12 @@ class Workspace(models.Model):
     created_at = models.DateTimeField(auto_now=True, db_index=True)
     updated_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
+    # set when a removal is requested: the workspace disappears at once, its rows are deleted in the background
+    deleted_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    objects = WorkspaceManager()
+    all_objects = WorkspaceQuerySet.as_manager()
+
     class Meta:
         unique_together = ("slug", "owner")
         get_latest_by = "created_at"
@@ -29,8 +47,116 @@ class Workspace(models.Model):
         return self.name
 
     def duplicate(self):
+        """Create an empty copy of this workspace (same owner and members) under a free slug.
+
+        The content is copied by ``agily.workspaces.cloning.clone_workspace``.
+        """
         cloned = copy.copy(self)
         cloned.pk = None
-        cloned.name = "Copy of " + self.name
-        cloned.slug = self.slug + "-copy"
+        cloned.name = ("Copy of " + self.name)[:100]
+        cloned.slug = unique_slug(self.slug + "-copy")
         cloned.save()
+
+        cloned.members.set(self.members.all())
+
+        return cloned
+
+
+def unique_slug(slug):
+    """First of slug, slug-2, slug-3... not used by any workspace."""
+    slug = slug[:90]
+    taken = set(Workspace.all_objects.filter(slug__startswith=slug).values_list("slug", flat=True))
+
+    candidate, suffix = slug, 1
+    while candidate in taken:
+        suffix += 1
+        candidate = f"{slug}-{suffix}"
+
+    return candidate
+
+
+class WorkspaceJob(models.Model):
+    """Progress of a long running background job over a workspace."""
+
+    KIND_CLONE = "clone"
+    KIND_DELETE = "delete"
+
+    KIND_CHOICES = (
+        (KIND_CLONE, "Clone"),
+        (KIND_DELETE, "Delete"),
+    )
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+
+    STATUS_CHOICES = (
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    )
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+
+    # SET_NULL: a job has to outlive the workspaces it works on
+    workspace = models.ForeignKey(Workspace, null=True, blank=True, on_delete=models.SET_NULL, related_name="+")
+    target_workspace = models.ForeignKey(Workspace, null=True, blank=True, on_delete=models.SET_NULL, related_name="+")
+    description = models.CharField(max_length=255, blank=True)
+
+    total = models.PositiveIntegerField(default=0)
+    done = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        get_latest_by = "created_at"
+        ordering = ["-created_at"]
+        verbose_name = "workspace job"
+        verbose_name_plural = "workspace jobs"
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.description} ({self.get_status_display()})"
+
+    @property
+    def progress(self):
+        if self.status == self.STATUS_DONE:
+            return 100
+
+        return int(float(self.done) / (self.total or 1) * 100)
+
+    def start(self, total):
+        self.status = self.STATUS_RUNNING
+        self.total = total
+        self.done = 0
+        self.save(update_fields=["status", "total", "done", "updated_at"])
+
+    def advance(self, amount):
+        # an UPDATE, not a save: it runs after every batch and must not clobber other columns
+        WorkspaceJob.objects.filter(pk=self.pk).update(done=models.F("done") + amount, updated_at=timezone.now())
+        self.done += amount
+
+    def finish(self, error=None):
+        self.status = self.STATUS_FAILED if error else self.STATUS_DONE
+        self.error = error or ""
+        self.finished_at = timezone.now()
+        self.save(update_fields=["status", "error", "finished_at", "updated_at"])
+
+    def as_dict(self):
+        return dict(
+            id=self.id,
+            kind=self.kind,
+            status=self.status,
+            description=self.description,
+            workspace=self.workspace_id,
+            target_workspace=self.target_workspace_id,
+            total=self.total,
+            done=self.done,
+            progress=self.progress,
+            error=self.error,
+        )
@@ -1,19 +1,112 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
 from agily.taskapp.celery import app
 
-from agily.workspaces.models import Workspace
+from agily.workspaces.models import Workspace, WorkspaceJob
 
 
 @app.task(ignore_result=True)
 def duplicate_workspaces(workspace_ids):
-    for pk in workspace_ids:
-        try:
-            workspace = Workspace.objects.get(pk=pk)
-        except Workspace.DoesNotExist:
-            continue
+    for workspace in Workspace.objects.filter(id__in=workspace_ids):
+        job = WorkspaceJob.objects.create(
+            kind=WorkspaceJob.KIND_CLONE,
+            workspace=workspace,
+            target_workspace=workspace.duplicate(),
+            description=workspace.name,
+        )
+        clone_workspace.delay(job.id)
+
+
+@app.task(ignore_result=True)
+def clone_workspace(job_id):
+    from agily.workspaces.cloning import clone_workspace as clone_workspace_content
+
+    try:
+        job = WorkspaceJob.objects.select_related("workspace", "target_workspace").get(pk=job_id)
+    except WorkspaceJob.DoesNotExist:
+        return
 
-        workspace.duplicate()
+    if job.workspace is None or job.target_workspace is None:
+        job.finish(error="The workspace was removed before it could be cloned")
+        return
+
+    clone_workspace_content(job)
 
 
 @app.task(ignore_result=True)
 def remove_workspaces(workspace_ids):
-    Workspace.objects.filter(id__in=workspace_ids).delete()
+    from agily.workspaces.deletion import delete_workspace
+
+    # callers normally hide the workspaces with mark_deleted() before enqueueing this
+    Workspace.all_objects.filter(id__in=workspace_ids).mark_deleted()
+
+    for workspace in Workspace.all_objects.filter(id__in=workspace_ids):
+        job = WorkspaceJob.objects.create(
+            kind=WorkspaceJob.KIND_DELETE, workspace=workspace, description=workspace.name
+        )
+        delete_workspace(job)
+
+
+def _project_content(project_ids, deleted_at=None):
+    """(stories, sprints, issues) of the projects: the live ones, or the ones tombstoned at deleted_at."""
+    from agily.models import Issue
+    from agily.sprints.models import Sprint
+    from agily.stories.models import Story
+
+    models = (Story, Sprint, Issue)
+
+    if deleted_at is None:
+        return [model.objects.filter(project_id__in=project_ids) for model in models]
+
+    return [model.all_objects.filter(project_id__in=project_ids, deleted_at=deleted_at) for model in models]
+
+
+@app.task(ignore_result=True)
+def remove_projects(project_ids):
+    """Tombstone the projects with their stories, sprints and issues, all at the same time."""
+    from agily.cloning import update_rollups
+    from agily.models import Project
+    from agily.stories.models import Story
+
+    deleted_at = timezone.now()
+    # epics and sprints of other projects may hold some of the stories
+    epic_ids, sprint_ids, _ = Story.objects.filter(project_id__in=project_ids).parent_ids()
+
+    for queryset in _project_content(project_ids):
+        queryset.soft_delete(deleted_at)
+    Project.objects.filter(id__in=project_ids).soft_delete(deleted_at)
+
+    update_rollups(epic_ids=epic_ids, sprint_ids=sprint_ids)
+
+
+@app.task(ignore_result=True)
+def restore_projects(project_ids):
+    """Bring the projects back with the content ``remove_projects`` removed along with them, and only that."""
+    from agily.cloning import update_rollups
+    from agily.models import Project
+    from agily.sprints.tasks import transition_sprint
+
+    for project in Project.all_objects.filter(id__in=project_ids, deleted_at__isnull=False):
+        stories, sprints, issues = _project_content([project.id], project.deleted_at)
+        epic_ids, sprint_ids, _ = stories.parent_ids()
+        restored_sprint_ids = list(sprints.values_list("id", flat=True))
+
+        for queryset in (stories, sprints, issues):
+            queryset.restore()
+        Project.all_objects.filter(pk=project.pk).restore()
+
+        update_rollups(epic_ids=epic_ids, sprint_ids=sprint_ids, project_ids=[project.id])
+
+        # transitions that came due while the sprints were removed
+        for sprint_id in restored_sprint_ids:
+            transition_sprint.delay(sprint_id)
+
+
+@app.task(ignore_result=True)
+def purge_deleted():
+    from agily.workspaces.deletion import purge_deleted as purge
+
+    purge(timezone.now() - timedelta(days=settings.SOFT_DELETE_RETENTION_DAYS))
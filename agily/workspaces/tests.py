@@ -1 +1,136 @@
-# Create your tests here.
+import tempfile
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from agily.models import Project
+from agily.sprints.models import Sprint
+from agily.stories.factories import StoryFactory
+from agily.stories.models import Epic, EpicState, Story, StoryAttachment, Task
+from agily.users.tests.factories import UserFactory
+from agily.workspaces.deletion import Deletion
+from agily.workspaces.factories import WorkspaceFactory
+from agily.workspaces.models import Workspace, WorkspaceJob
+from agily.workspaces.tasks import duplicate_workspaces, remove_workspaces
+
+
+class WorkspaceCloneTest(TestCase):
+    def setUp(self):
+        self.workspace = WorkspaceFactory.create(slug="team")
+        project = Project.objects.create(name="Project", workspace=self.workspace)
+        epic = Epic.objects.create(
+            title="Epic", workspace=self.workspace, state=EpicState.objects.first(), tags="backend"
+        )
+        sprint = Sprint.objects.create(title="Sprint", workspace=self.workspace, project=project)
+
+        for _ in range(3):
+            story = StoryFactory.create(workspace=self.workspace, project=project, epic=epic, sprint=sprint)
+            Task.objects.bulk_create([Task(title="Task", story=story)])
+            StoryAttachment.objects.create(story=story, file="story_attachments/shared.png")
+
+    def test_duplicate_workspace_copies_content(self):
+        WorkspaceFactory.create(slug="team-copy")
+
+        with self.settings(WORKSPACE_JOB_BATCH_SIZE=2):
+            duplicate_workspaces([self.workspace.id])
+
+        cloned = Workspace.objects.get(slug="team-copy-2")
+        job = WorkspaceJob.objects.get(target_workspace=cloned)
+        self.assertEqual(job.status, WorkspaceJob.STATUS_DONE)
+        self.assertEqual((job.done, job.total), (6, 6))
+
+        stories = Story.objects.filter(workspace=cloned)
+        self.assertEqual(stories.count(), 3)
+        self.assertEqual(set(stories.values_list("epic__workspace", flat=True)), {cloned.id})
+        self.assertEqual(set(stories.values_list("sprint__workspace", flat=True)), {cloned.id})
+        self.assertEqual(set(stories.values_list("project__workspace", flat=True)), {cloned.id})
+        self.assertEqual(Task.objects.filter(story__workspace=cloned).count(), 3)
+        self.assertEqual(StoryAttachment.objects.filter(story__workspace=cloned).count(), 3)
+        self.assertEqual(list(Epic.objects.get(workspace=cloned).tags.values_list("name", flat=True)), ["backend"])
+
+    def test_duplicate_workspace_recomputes_project_rollups(self):
+        sprint = Sprint.objects.get(workspace=self.workspace)
+        today = timezone.localdate()
+        Sprint.objects.filter(pk=sprint.pk).update(
+            state=Sprint.STATE_STARTED, starts_at=today - timedelta(days=1), ends_at=today + timedelta(days=1)
+        )
+        Project.objects.filter(workspace=self.workspace).update(
+            active_sprint=sprint, issue_counts={"open": {"high": 1}}
+        )
+        WorkspaceFactory.create(slug="team-copy")
+
+        duplicate_workspaces([self.workspace.id])
+
+        cloned = Workspace.objects.get(slug="team-copy-2")
+        project = Project.objects.get(workspace=cloned)
+        self.assertEqual(project.issue_counts, {})
+        self.assertEqual(project.active_sprint, Sprint.objects.get(workspace=cloned, state=Sprint.STATE_STARTED))
+
+    def test_jobs_are_only_shown_to_members(self):
+        job = WorkspaceJob.objects.create(kind=WorkspaceJob.KIND_CLONE, target_workspace=self.workspace)
+        url = reverse("workspaces:workspace-job", args=[job.pk])
+
+        self.client.force_login(UserFactory.create())
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        member = UserFactory.create()
+        self.workspace.members.add(member)
+        self.client.force_login(member)
+        self.assertEqual(self.client.get(url).json()["status"], WorkspaceJob.STATUS_PENDING)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), WORKSPACE_JOB_BATCH_SIZE=2)
+class WorkspaceRemoveTest(TestCase):
+    def setUp(self):
+        self.workspace = WorkspaceFactory.create(slug="team")
+        self.project = project = Project.objects.create(name="Project", workspace=self.workspace)
+        epic = Epic.objects.create(title="Epic", workspace=self.workspace, state=EpicState.objects.first(), tags="x")
+        self.name = default_storage.save("story_attachments/file.txt", ContentFile(b"data"))
+
+        for _ in range(3):
+            story = StoryFactory.create(workspace=self.workspace, project=project, epic=epic, tags="x")
+            Task.objects.bulk_create([Task(title="Task", story=story)])
+            StoryAttachment.objects.create(story=story, file=self.name)
+
+    def test_remove_workspace(self):
+        Workspace.objects.filter(id=self.workspace.id).mark_deleted()
+        self.assertFalse(Workspace.objects.filter(id=self.workspace.id).exists())
+
+        remove_workspaces([self.workspace.id])
+
+        self.assertFalse(Workspace.all_objects.filter(id=self.workspace.id).exists())
+        self.assertFalse(Story.history.filter(workspace_id=self.workspace.id).exists())
+        self.assertEqual(Task.objects.count(), 0)
+        self.assertEqual(StoryAttachment.objects.count(), 0)
+        self.assertFalse(Story.tags.tag_model.objects.filter(name="x").exists())
+        self.assertFalse(default_storage.exists(self.name))
+
+        job = WorkspaceJob.objects.get(kind=WorkspaceJob.KIND_DELETE)
+        self.assertEqual((job.status, job.done, job.total), (WorkspaceJob.STATUS_DONE, 5, 5))
+
+    def test_remove_started_sprint(self):
+        sprint = Sprint.objects.create(
+            title="Sprint", workspace=self.workspace, project=self.project, state=Sprint.STATE_STARTED
+        )
+        Project.objects.filter(pk=self.project.pk).update(active_sprint=sprint)
+
+        deletion = Deletion()
+        deletion.run(Sprint._base_manager.filter(pk=sprint.pk), deletion.before_sprints)
+
+        self.assertIsNone(Project.objects.get(pk=self.project.pk).active_sprint_id)
+        # the batches of a real removal commit one by one: nothing may point at the deleted sprint
+        connection.check_constraints()
+
+    def test_remove_clone_keeps_shared_files(self):
+        duplicate_workspaces([self.workspace.id])
+        cloned = Workspace.objects.get(slug="team-copy")
+
+        remove_workspaces([cloned.id])
+
+        self.assertEqual(StoryAttachment.objects.count(), 3)
+        self.assertTrue(default_storage.exists(self.name))
@@ -1,6 +1,14 @@
 from django.urls import path
 
-from .views import WorkspaceCreateView, WorkspaceDetailView, WorkspaceList, WorkspaceUpdateView, WorkspaceSelectView
+from .views import (
+    WorkspaceCreateView,
+    WorkspaceDetailView,
+    WorkspaceList,
+    WorkspaceUpdateView,
+    WorkspaceSelectView,
+    undo_remove,
+    workspace_job,
+)
 
 app_name = "workspaces"
 
@@ -9,5 +17,7 @@ urlpatterns = [
     path("<int:pk>/", WorkspaceDetailView.as_view(), name="workspace-detail"),
     path("<int:pk>/edit/", WorkspaceUpdateView.as_view(), name="workspace-edit"),
     path("select/", WorkspaceSelectView.as_view(), name="workspace-select"),
+    path("jobs/<int:pk>/", workspace_job, name="workspace-job"),
+    path("undo/", undo_remove, name="undo-remove"),
     path("", WorkspaceList.as_view(), name="workspace-list"),
 ]
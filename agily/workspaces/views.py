@@ -1,6 +1,7 @@
 from urllib.parse import parse_qsl
 
 from django.contrib.auth.decorators import login_required
+from django.db.models import Q
 from django.http import HttpResponseRedirect, JsonResponse
 from django.urls import reverse_lazy, reverse, NoReverseMatch
 from django.utils.decorators import method_decorator
@@ -8,11 +9,11 @@ from django.utils.text import slugify
 from django.views.generic import ListView
 from django.views.generic.detail import DetailView
 from django.views.generic.edit import CreateView, UpdateView
-from django.shortcuts import render, redirect
+from django.shortcuts import get_object_or_404, render, redirect
 
-from ..utils import get_clean_next_url
-from .models import Workspace
-from .tasks import duplicate_workspaces, remove_workspaces
+from ..utils import UNDO_SESSION_KEY, get_clean_next_url, get_referer_url
+from .models import Workspace, WorkspaceJob
+from .tasks import duplicate_workspaces, remove_workspaces, restore_projects
 
 
 @method_decorator(login_required, name="dispatch")
@@ -34,7 +35,9 @@ class WorkspaceDetailView(DetailView):
         url = self.request.get_full_path()
 
         if params.get("remove") == "yes":
-            remove_workspaces.delay([self.get_object().id])
+            workspace_ids = [self.get_object().id]
+            Workspace.objects.filter(id__in=workspace_ids).mark_deleted()
+            remove_workspaces.delay(workspace_ids)
             url = reverse_lazy("workspaces:workspace-list", args=[kwargs["workspace"]])
 
         if self.request.headers.get("X-Fetch") == "true":
@@ -118,6 +121,7 @@ class WorkspaceList(BaseListView):
 
         if len(workspace_ids) > 0:
             if params.get("remove") == "yes":
+                Workspace.objects.filter(id__in=workspace_ids).mark_deleted()
                 remove_workspaces.delay(workspace_ids)
 
             if params.get("duplicate") == "yes":
@@ -189,6 +193,29 @@ class WorkspaceUpdateView(WorkspaceBaseView, UpdateView):
         return self.form_valid(form)
 
 
+@login_required
+def workspace_job(request, pk):
+    # only the jobs over a workspace the user owns or is a member of, removed ones included
+    workspaces = Workspace.all_objects.filter(Q(owner=request.user) | Q(members=request.user))
+    jobs = WorkspaceJob.objects.filter(Q(workspace__in=workspaces) | Q(target_workspace__in=workspaces))
+    job = get_object_or_404(jobs, pk=pk)
+    return JsonResponse(job.as_dict())
+
+
+@login_required
+def undo_remove(request):
+    from agily.sprints.tasks import restore_sprints
+    from agily.stories.tasks import restore_epics, restore_stories
+
+    restore = dict(stories=restore_stories, epics=restore_epics, sprints=restore_sprints, projects=restore_projects)
+    removal = request.session.pop(UNDO_SESSION_KEY, None) if request.method == "POST" else None
+
+    if removal and removal.get("kind") in restore:
+        restore[removal["kind"]].delay(removal["ids"], **removal.get("kwargs", {}))
+
+    return HttpResponseRedirect(get_clean_next_url(request, get_referer_url(request) or "/"))
+
+
 @login_required
 def workspace_index(request):
     default_workspace = request.user.workspace_set.order_by("id").first()
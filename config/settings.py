@@ -69,6 +69,9 @@ LOCAL_APPS = (
     "agily.workspaces",
     "agily.sprints",
     "agily.stories",
+    "agily.activity",
+    "agily.attachments",
+    "agily.profiling",
 )
 
 # See: https://docs.djangoproject.com/en/dev/ref/settings/#installed-apps
@@ -78,6 +81,7 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 # ------------------------------------------------------------------------------
 MIDDLEWARE = (
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    "agily.profiling.middleware.ServerTimingMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -86,6 +90,8 @@ MIDDLEWARE = (
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "simple_history.middleware.HistoryRequestMiddleware",
     "agily.workspaces.middlewares.WorkspaceMiddleware",
+    "agily.profiling.middleware.QueryObserverMiddleware",
+    "agily.profiling.middleware.ProfilingMiddleware",
 )
 
 # MIGRATIONS CONFIGURATION
@@ -131,6 +137,49 @@ DATABASES["default"]["OPTIONS"] = {
     "init_command": "SET sql_mode='STRICT_TRANS_TABLES'",
 }
 
+# CACHE CONFIGURATION
+# ------------------------------------------------------------------------------
+# per process memory by default. Cached issue facets are invalidated by bumping a generation in this cache, so
+# with several workers each one only sees its own bumps: the counts a worker shows can then lag behind the issues
+# by up to ISSUE_FACETS_CACHE_TIMEOUT. Point it at a cache the workers share to avoid that, e.g. memcached
+# (pymemcache://127.0.0.1:11211) or redis (redis://localhost:6379/1), with their client library installed
+CACHES = {
+    "default": env.cache("DJANGO_CACHE_URL", default="locmemcache://"),
+}
+
+# how long the issue facet counts are kept; with a shared cache any issue change in the workspace invalidates them
+# before that
+ISSUE_FACETS_CACHE_TIMEOUT = env.int("ISSUE_FACETS_CACHE_TIMEOUT", default=600)
+
+# PROFILING
+# ------------------------------------------------------------------------------
+# fraction of the requests profiled without being asked to (agily.profiling.middleware), e.g. 0.001
+PROFILING_SAMPLE_RATE = env.float("PROFILING_SAMPLE_RATE", default=0.0)
+# seconds between two looks at the stack of a profiled request
+PROFILING_INTERVAL = env.float("PROFILING_INTERVAL", default=0.005)
+# seconds the tokens shown on the profile list stay valid
+PROFILING_TOKEN_MAX_AGE = env.int("PROFILING_TOKEN_MAX_AGE", default=3600)
+PROFILING_RETENTION_DAYS = env.int("PROFILING_RETENTION_DAYS", default=7)
+# fraction of the requests watched for N+1 and duplicate queries, see manage.py query_report
+QUERY_OBSERVER_SAMPLE_RATE = env.float("QUERY_OBSERVER_SAMPLE_RATE", default=0.0)
+# times one statement shape has to be sent with different parameters to count as an N+1
+QUERY_OBSERVER_THRESHOLD = env.int("QUERY_OBSERVER_THRESHOLD", default=5)
+
+# METRICS
+# ------------------------------------------------------------------------------
+# seconds each process keeps its counts before a background thread adds them to the totals behind /metrics; 0
+# starts no thread (the tests flush by hand)
+METRICS_FLUSH_INTERVAL = env.int("METRICS_FLUSH_INTERVAL", default=0 if ENVIRONMENT == "test" else 10)
+# bearer token Prometheus scrapes /metrics with; staff signed in may always look
+METRICS_TOKEN = env("METRICS_TOKEN", default="")
+
+# HEALTH CHECKS
+# ------------------------------------------------------------------------------
+# seconds between the background probes of the database, broker and storage behind /health/ready/
+HEALTH_CHECK_INTERVAL = env.int("HEALTH_CHECK_INTERVAL", default=15)
+# seconds a probe waits to connect before counting as failed
+HEALTH_CHECK_TIMEOUT = env.int("HEALTH_CHECK_TIMEOUT", default=3)
+
 
 # GENERAL CONFIGURATION
 # ------------------------------------------------------------------------------
@@ -160,7 +209,8 @@ USE_TZ = True
 TEMPLATES = [
     {
         # See: https://docs.djangoproject.com/en/dev/ref/settings/#std:setting-TEMPLATES-BACKEND
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # Django's backend, timing the rendering for the Server-Timing header
+        "BACKEND": "agily.profiling.backends.DjangoTemplates",
         # See: https://docs.djangoproject.com/en/dev/ref/settings/#template-dirs
         "DIRS": [
             str(APPS_DIR.path("templates")),
@@ -221,6 +271,28 @@ MEDIA_ROOT = str(APPS_DIR("media"))
 # See: https://docs.djangoproject.com/en/dev/ref/settings/#media-url
 MEDIA_URL = "/media/"
 
+# let the front proxy send attachment downloads: "nginx" (X-Accel-Redirect to ATTACHMENT_SENDFILE_PREFIX + file
+# name, an internal location aliased to MEDIA_ROOT) or "apache" (X-Sendfile with the file path); empty to stream
+# them from django
+ATTACHMENT_SENDFILE = env("ATTACHMENT_SENDFILE", default="")
+ATTACHMENT_SENDFILE_PREFIX = env("ATTACHMENT_SENDFILE_PREFIX", default="/protected/")
+
+# resumable uploads (agily.attachments.uploads): largest file, largest single PATCH body, where partial uploads
+# are staged (same filesystem as MEDIA_ROOT, so finished ones are moved rather than copied) and how long an
+# abandoned one is kept
+ATTACHMENT_UPLOAD_MAX_SIZE = env.int("ATTACHMENT_UPLOAD_MAX_SIZE", default=2 * 1024**3)
+ATTACHMENT_UPLOAD_CHUNK_MAX = env.int("ATTACHMENT_UPLOAD_CHUNK_MAX", default=8 * 1024**2)
+ATTACHMENT_UPLOAD_STAGING_DIR = env("ATTACHMENT_UPLOAD_STAGING_DIR", default=str(ROOT_DIR("uploads")))
+ATTACHMENT_UPLOAD_EXPIRY_HOURS = env.int("ATTACHMENT_UPLOAD_EXPIRY_HOURS", default=24)
+
+# threads writing the files of a multi-file attachment submission, per process (agily.attachments.bulk)
+ATTACHMENT_WRITE_WORKERS = env.int("ATTACHMENT_WRITE_WORKERS", default=4)
+
+# longest side, in pixels, of the image and PDF previews shown on detail pages (agily.attachments.previews)
+ATTACHMENT_PREVIEW_SIZE = env.int("ATTACHMENT_PREVIEW_SIZE", default=320)
+# files larger than this get no preview (0: no limit)
+ATTACHMENT_PREVIEW_MAX_BYTES = env.int("ATTACHMENT_PREVIEW_MAX_BYTES", default=50 * 1024 * 1024)
+
 # URL Configuration
 # ------------------------------------------------------------------------------
 ROOT_URLCONF = "config.urls"
@@ -272,6 +344,24 @@ CELERY_QUEUES = {
 }
 
 CELERY_ROUTES = {}
+
+# per task latency/runtime/query stats, see agily.taskapp.instrumentation
+TASK_STATS_ENABLED = env.bool("TASK_STATS_ENABLED", default=True)
+TASK_STATS_FLUSH_INTERVAL = env.int("TASK_STATS_FLUSH_INTERVAL", default=10)
+TASK_STATS_TOKEN = env("TASK_STATS_TOKEN", default="")
+
+# rows per batch (and per transaction) for workspace clone/remove jobs
+WORKSPACE_JOB_BATCH_SIZE = env.int("WORKSPACE_JOB_BATCH_SIZE", default=500)
+
+# removed stories, epics, sprints, projects and issues can be restored for this many days before being purged
+SOFT_DELETE_RETENTION_DAYS = env.int("SOFT_DELETE_RETENTION_DAYS", default=7)
+
+# simple_history retention, see agily.history: snapshots beyond the newest HISTORY_KEEP_LATEST of an object and
+# older than HISTORY_KEEP_DAYS are archived to HISTORY_ARCHIVE_PATH in the default storage and deleted
+HISTORY_KEEP_LATEST = env.int("HISTORY_KEEP_LATEST", default=50)
+HISTORY_KEEP_DAYS = env.int("HISTORY_KEEP_DAYS", default=180)
+HISTORY_ARCHIVE_PATH = env("HISTORY_ARCHIVE_PATH", default="history")
+HISTORY_BATCH_SIZE = env.int("HISTORY_BATCH_SIZE", default=500)
 # END CELERY
 
 
@@ -344,7 +434,14 @@ COMMENTS_XTD_MAX_THREAD_LEVEL = 2
 CELERY_ALWAYS_EAGER = env.bool("CELERY_ALWAYS_EAGER", default=False)
 
 CELERYBEAT_SCHEDULE = {
-    "sprints-update-state": {"task": "agily.sprints.tasks.update_state", "schedule": crontab(hour="*/1")},
+    # sprints switch state through eta tasks scheduled on save; this daily sweep only catches lost ones
+    "sprints-update-state": {"task": "agily.sprints.tasks.update_state", "schedule": crontab(minute=5, hour=0)},
+    "purge-deleted": {"task": "agily.workspaces.tasks.purge_deleted", "schedule": crontab(minute=30, hour=3)},
+    "compact-history": {"task": "agily.tasks.compact_history", "schedule": crontab(minute=0, hour=4)},
+    "collect-blobs": {"task": "agily.attachments.tasks.collect_blobs", "schedule": crontab(minute=30, hour=4)},
+    "collect-orphans": {"task": "agily.attachments.tasks.collect_orphans", "schedule": crontab(minute=0, hour=5)},
+    "expire-uploads": {"task": "agily.attachments.tasks.expire_uploads", "schedule": crontab(minute=15)},
+    "prune-profiles": {"task": "agily.profiling.tasks.prune_profiles", "schedule": crontab(minute=30, hour=5)},
 }
 
 # Tagulous settings
@@ -5,10 +5,12 @@ from django.contrib import admin
 from django.contrib.auth import views as auth_views
 from django.views import defaults as default_views
 
+from agily.profiling.views import metrics_view
 from agily.workspaces.views import workspace_index
 from agily.views import (
-    ProjectListView, ProjectCreateView, ProjectDetailView, IssueListView, IssueCreateView, IssueDetailView, IssueGlobalListView, IssueGlobalCreateView,
-    upload_issue_attachment, download_issue_attachment, delete_issue_attachment
+    ProjectListView, ProjectCreateView, ProjectDetailView, IssueListView, IssueCreateView, IssueDetailView,
+    IssueGlobalCreateView,
+    upload_issue_attachment, download_issue_attachment, download_issue_attachments, delete_issue_attachment
 )
 
 
@@ -17,13 +19,18 @@ urlpatterns = [
     re_path(settings.ADMIN_URL, admin.site.urls),
     # health checks
     re_path(r"^health/", include("agily.health_checks.urls")),
+    re_path(r"^tasks/", include("agily.taskapp.urls")),
+    path("profiles/", include("agily.profiling.urls", namespace="profiling")),
+    path("metrics", metrics_view, name="metrics"),
     path("login/", auth_views.LoginView.as_view(), name="login"),
     path("logout/", auth_views.LogoutView.as_view(), {"next_page": "/"}, name="logout"),
     # User management
     re_path(r"^users/", include("agily.users.urls")),
+    path("attachments/", include("agily.attachments.urls", namespace="attachments")),
     # App
     path(r"<workspace>/", include("agily.stories.urls", namespace="stories")),
     path(r"<workspace>/sprints/", include("agily.sprints.urls", namespace="sprints")),
+    path(r"<workspace>/activity/", include("agily.activity.urls", namespace="activity")),
     path("workspaces/", include("agily.workspaces.urls", namespace="workspaces")),
     path(r"", workspace_index, name="workspace_index"),  # disabled for now, until we finish all the features
     path("projects/", ProjectListView.as_view(), name="project-list"),
@@ -32,10 +39,11 @@ urlpatterns = [
     path("projects/<int:project_id>/issues/", IssueListView.as_view(), name="issue-list"),
     path("projects/<int:project_id>/issues/add/", IssueCreateView.as_view(), name="issue-add"),
     path("projects/<int:project_id>/issues/<int:pk>/", IssueDetailView.as_view(), name="issue-detail"),
-    path("issues/", IssueGlobalListView.as_view(), name="global-issue-list"),
+    path("issues/", IssueListView.as_view(), name="global-issue-list"),
     path("issues/add/", IssueGlobalCreateView.as_view(), name="global-issue-add"),
     path("issues/<int:pk>/attachments/upload/", upload_issue_attachment, name="upload-issue-attachment"),
     path("issues/attachment/<int:pk>/download/", download_issue_attachment, name="download-issue-attachment"),
+    path("issues/<int:pk>/attachments/download/", download_issue_attachments, name="download-issue-attachments"),
     path("issues/attachment/<int:pk>/delete/", delete_issue_attachment, name="delete-issue-attachment"),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 